@@ -0,0 +1,179 @@
+"""Generates a synthetic proq corpus for the benchmarks."""
+
+import random
+from pathlib import Path
+
+import yaml
+
+INCLUDES_DIR = "includes"
+
+PROQ_TEMPLATE = """\
+---
+title: Sum of the multiples of {k} - {index}
+tags: [synthetic, benchmark]
+---
+
+# Problem Statement
+
+Given space separated integers on each line, print the sum of the numbers on
+the line which are multiples of {k}.
+{includes}
+# Solution
+
+```python test.py -r 'python test.py'
+import sys
+<template>
+def solve(line):
+    <los>...</los>
+    <sol>return sum(n for n in map(int, line.split()) if n % {k} == 0)</sol>
+</template>
+<suffix_invisible>
+{{% include '{includes_dir}/suffix.py.jinja' %}}
+```
+
+# Public Test Cases
+
+{public_test_cases}
+# Private Test Cases
+
+{private_test_cases}"""
+
+SUFFIX = """\
+for line in sys.stdin:
+    print(solve(line))
+"""
+
+TEST_CASE_TEMPLATE = """\
+## Input {i}
+
+```
+{input}
+```
+
+## Output {i}
+
+```
+{output}
+```
+
+"""
+
+
+def get_test_case(rng: random.Random, k: int, input_size: int) -> tuple[str, str]:
+    """Returns the input and the expected output of a test case.
+
+    The input has `input_size` numbers spread over lines of at most 20 numbers.
+    """
+    numbers = [rng.randrange(1000) for _ in range(input_size)]
+    lines = [numbers[i : i + 20] for i in range(0, len(numbers), 20)] or [[]]
+    stdin = "\n".join(" ".join(map(str, line)) for line in lines)
+    output = "\n".join(str(sum(n for n in line if n % k == 0)) for line in lines)
+    return stdin, output
+
+
+def get_test_cases(rng, k, n_test_cases, input_size, start=1):
+    return "".join(
+        TEST_CASE_TEMPLATE.format(i=i, input=stdin, output=output)
+        for i, (stdin, output) in enumerate(
+            (get_test_case(rng, k, input_size) for _ in range(n_test_cases)),
+            start=start,
+        )
+    )
+
+
+def write_includes(output_dir: Path, n_includes: int):
+    """Writes the shared suffix and the statement snippets included by the proqs.
+
+    Each snippet includes the next one, so that the proqs exercise nested
+    includes as well.
+    """
+    includes_dir = output_dir / INCLUDES_DIR
+    includes_dir.mkdir(parents=True, exist_ok=True)
+    (includes_dir / "suffix.py.jinja").write_text(SUFFIX)
+    for i in range(n_includes):
+        include_next = (
+            f"{{% include '{INCLUDES_DIR}/note_{i + 1}.md.jinja' %}}\n"
+            if i + 1 < n_includes
+            else ""
+        )
+        (includes_dir / f"note_{i}.md.jinja").write_text(
+            f"\n**Note {i}:** The numbers are non-negative integers.\n" + include_next
+        )
+
+
+def nest(items: list, depth: int, branching: int = 2, title: str = "Section "):
+    """Splits the items into a tree of sections of the given depth."""
+    if depth <= 0 or len(items) <= 1:
+        return items
+    size = -(-len(items) // branching)
+    return [
+        {
+            "title": f"{title}{i + 1}",
+            "content": nest(
+                items[start : start + size], depth - 1, branching, f"{title}{i + 1}."
+            ),
+        }
+        for i, start in enumerate(range(0, len(items), size))
+    ]
+
+
+def generate_corpus(
+    output_dir: str,
+    n_files: int = 10,
+    n_test_cases: int = 5,
+    input_size: int = 100,
+    n_includes: int = 1,
+    depth: int = 2,
+    seed: int = 0,
+) -> Path:
+    """Writes a synthetic proq corpus and its nested proq config file.
+
+    Args:
+        output_dir (str): The directory to write the corpus in.
+        n_files (int): The number of proq files.
+        n_test_cases (int): The number of public and of private test cases
+            of each proq.
+        input_size (int): The number of integers in the input of a test case.
+        n_includes (int): The length of the chain of jinja includes in the
+            problem statement of each proq.
+        depth (int): The nesting depth of the sections in the config file.
+        seed (int): The seed of the random test case inputs.
+
+    Returns:
+        config_file (Path): The nested proq config file listing all the proqs.
+    """
+    rng = random.Random(seed)
+    output_dir = Path(output_dir)
+    proqs_dir = output_dir / "proqs"
+    proqs_dir.mkdir(parents=True, exist_ok=True)
+    write_includes(proqs_dir, n_includes)
+    includes = (
+        f"\n{{% include '{INCLUDES_DIR}/note_0.md.jinja' %}}\n" if n_includes else ""
+    )
+    proq_files = []
+    for index in range(n_files):
+        k = rng.randrange(2, 10)
+        proq_file = proqs_dir / f"proq_{index:04d}.md"
+        proq_file.write_text(
+            PROQ_TEMPLATE.format(
+                k=k,
+                index=index,
+                includes=includes,
+                includes_dir=INCLUDES_DIR,
+                public_test_cases=get_test_cases(rng, k, n_test_cases, input_size),
+                private_test_cases=get_test_cases(rng, k, n_test_cases, input_size),
+            )
+        )
+        proq_files.append(proq_file)
+    leaves = [
+        {"title": f"Problem {i + 1}", "content": str(proq_file.relative_to(output_dir))}
+        for i, proq_file in enumerate(proq_files)
+    ]
+    config_file = output_dir / "corpus.yaml"
+    config_file.write_text(
+        yaml.safe_dump(
+            {"title": "Benchmark Corpus", "content": nest(leaves, depth)},
+            sort_keys=False,
+        )
+    )
+    return config_file
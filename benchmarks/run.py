@@ -0,0 +1,174 @@
+"""Benchmarks the parse, evaluate, correct and export paths of proqtor.
+
+Usage:
+    python benchmarks/run.py run --output results.json [--n_files 20 ...]
+    python benchmarks/run.py compare baseline.json results.json
+    python benchmarks/run.py generate corpus_dir [--n_files 20 ...]
+"""
+
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+
+import fire
+from corpus import generate_corpus
+
+from proqtor.cache_utils import set_caching, set_parse_caching
+from proqtor.cli.export import proq_export
+from proqtor.core import ProQ, load_nested_proq_from_file
+
+
+def get_git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def time_it(func, repeat: int) -> dict:
+    """Summarizes the wall times in seconds of `repeat` runs after a warm up run."""
+    with redirect_stdout(io.StringIO()):
+        func()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "times": times,
+    }
+
+
+def get_benchmarks(config_file: Path, output_dir: Path) -> dict:
+    """Returns the benchmarked operations by name."""
+    proq_files = [str(path) for path in sorted(config_file.parent.glob("proqs/*.md"))]
+    proqs = [ProQ.from_file(proq_file) for proq_file in proq_files]
+
+    def evaluate():
+        for proq in proqs:
+            proq.evaluate()
+
+    def correct_outputs():
+        for proq in proqs:
+            proq.correct_outputs()
+
+    return {
+        "from_file": lambda: [ProQ.from_file(proq_file) for proq_file in proq_files],
+        "evaluate": evaluate,
+        "correct_outputs": correct_outputs,
+        "load_nested_proq_from_file": lambda: load_nested_proq_from_file(
+            str(config_file)
+        ),
+        "export_json": lambda: proq_export(
+            str(config_file), str(output_dir / "corpus.json")
+        ),
+        "export_html": lambda: proq_export(
+            str(config_file), str(output_dir / "corpus.html")
+        ),
+    }
+
+
+def run(
+    output: str | None = None,
+    repeat: int = 3,
+    only: str | list[str] | None = None,
+    cache: bool = False,
+    parse_cache: bool = False,
+    n_files: int = 10,
+    n_test_cases: int = 5,
+    input_size: int = 100,
+    n_includes: int = 1,
+    depth: int = 2,
+    seed: int = 0,
+):
+    """Generates a corpus, times each operation on it and writes the results as json.
+
+    Args:
+        output (str|None): The file to write the results to, printed if not given.
+        repeat (int): The number of timed runs of each operation.
+        only (str|list[str]|None): Run only the operations with these names.
+        cache (bool): Whether to use the build and result caches. They are
+            disabled by default so that every run builds and runs the code.
+        parse_cache (bool): Whether to cache the parsed proqs, along with `cache`.
+        n_files (int): The number of proq files.
+        n_test_cases (int): The number of public and of private test cases
+            of each proq.
+        input_size (int): The number of integers in the input of a test case.
+        n_includes (int): The length of the chain of jinja includes in the
+            problem statement of each proq.
+        depth (int): The nesting depth of the sections in the config file.
+        seed (int): The seed of the random test case inputs.
+    """
+    params = {
+        "n_files": n_files,
+        "n_test_cases": n_test_cases,
+        "input_size": input_size,
+        "n_includes": n_includes,
+        "depth": depth,
+        "seed": seed,
+    }
+    set_caching(cache)
+    set_parse_caching(parse_cache)
+    if isinstance(only, str):
+        only = only.split(",")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        config_file = generate_corpus(tmpdir / "corpus", **params)
+        benchmarks = get_benchmarks(config_file, tmpdir)
+        results = {
+            name: time_it(func, repeat)
+            for name, func in benchmarks.items()
+            if not only or name in only
+        }
+    report = {
+        "commit": get_git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "cache": cache,
+        "parse_cache": parse_cache,
+        "params": params,
+        "results": results,
+    }
+    report_json = json.dumps(report, indent=2)
+    if output:
+        Path(output).write_text(report_json)
+    else:
+        print(report_json)
+
+
+def compare(baseline: str, current: str, metric: str = "median"):
+    """Prints the change of each operation between two result files."""
+    baseline, current = (json.loads(Path(f).read_text()) for f in (baseline, current))
+    if baseline["params"] != current["params"]:
+        print("Warning: the results are of different corpus parameters.")
+    print(f"{'operation':<28}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        old, new = baseline["results"][name][metric], result[metric]
+        change = f"{(new - old) / old:+.1%}" if old else "-"
+        print(f"{name:<28}{old:>11.4f}s{new:>11.4f}s{change:>10}")
+
+
+if __name__ == "__main__":
+    fire.Fire({"run": run, "compare": compare, "generate": generate_corpus})
@@ -1,13 +1,42 @@
-from .core import NestedContent, ProQ, load_nested_proq_from_file
-from .prog_langs import ProgLang, alias_map, get_lang_code
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .core import NestedContent, ProQ, load_nested_proq_from_file
+    from .prog_langs import ProgLang, alias_map, get_lang_code
+
+    NestedProq = NestedContent[ProQ]
+
+# The modules of the public names, imported when a name is first used so that
+# importing a submodule, eg. for the command line, does not import them all.
+_LAZY_NAMES = {
+    "ProQ": ".core",
+    "NestedContent": ".core",
+    "load_nested_proq_from_file": ".core",
+    "ProgLang": ".prog_langs",
+    "alias_map": ".prog_langs",
+    "get_lang_code": ".prog_langs",
+}
+
+
+def __getattr__(name):
+    if name == "NestedProq":
+        from .core import NestedContent, ProQ
+
+        value = NestedContent[ProQ]
+    elif name in _LAZY_NAMES:
+        value = getattr(import_module(_LAZY_NAMES[name], __name__), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
 
-NestedProq = NestedContent[ProQ]
 
 __all__ = [
-    ProQ,
-    ProgLang,
-    load_nested_proq_from_file,
-    get_lang_code,
-    alias_map,
-    NestedContent,
+    "ProQ",
+    "ProgLang",
+    "load_nested_proq_from_file",
+    "get_lang_code",
+    "alias_map",
+    "NestedContent",
 ]
@@ -0,0 +1,207 @@
+import locale
+import select
+import subprocess
+import time
+from pathlib import Path
+
+from .execute_utils import (
+    CommandResult,
+    ResourceLimits,
+    ResourceUsage,
+    capture_outputs,
+    get_exit_status,
+    kill_process_tree,
+    limit_args,
+    run_command,
+    scheduler,
+)
+from .fork_server import HARNESS_SOURCE, get_interpreter_args
+from .profile_utils import span
+from .python_harness import read_frame, write_frame
+from .workspace_utils import workspace_pool
+
+
+class BatchHarnessError(Exception):
+    pass
+
+
+class BatchHarness:
+    """Runs the test cases of a python source file one after another in one process.
+
+    The stdin of a test case is written to a file in the io directory and
+    the harness is asked to run the next test case with a frame. The harness
+    replies with the exit code once the run is over and the outputs are read
+    back from the io directory.
+    """
+
+    def __init__(
+        self,
+        interpreter_args: list[str],
+        source_filename: str,
+        io_dir: str,
+        limits: ResourceLimits = ResourceLimits(),
+        cwd: str | None = None,
+    ):
+        self.io_dir = Path(io_dir)
+        self.limits = limits
+        self.process = subprocess.Popen(
+            limit_args(ResourceLimits(memory=limits.memory))
+            + interpreter_args
+            + ["-c", HARNESS_SOURCE, "batch", source_filename, str(io_dir)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=cwd,
+            start_new_session=True,
+        )
+        try:
+            header, _ = read_frame(self.process.stdout.fileno())
+        except (EOFError, ValueError):
+            header = {"ok": False}
+        if not header["ok"]:
+            self.close()
+            raise BatchHarnessError(
+                f"Could not start a batch harness for {source_filename}"
+            )
+
+    def _read_output(self, name):
+        try:
+            return (self.io_dir / name).read_bytes()
+        except OSError:
+            return b""
+
+    def run(self, stdin: str = "") -> tuple[CommandResult, bool]:
+        """Runs a single test case.
+
+        Returns:
+            result (CommandResult): The output, return code and exit status.
+            alive (bool): Whether the harness can run the next test case.
+        """
+        (self.io_dir / "stdin").write_bytes(
+            stdin.encode(locale.getpreferredencoding(False))
+        )
+        for name in ["stdout", "stderr"]:
+            (self.io_dir / name).unlink(missing_ok=True)
+        response_fd = self.process.stdout.fileno()
+        header = None
+        timed_out = False
+        start = time.perf_counter()
+        try:
+            write_frame(
+                self.process.stdin.fileno(),
+                {"cpu_time": self.limits.cpu_time, "output": self.limits.output},
+            )
+            ready, _, _ = select.select([response_fd], [], [], self.limits.timeout)
+            timed_out = not ready
+            if ready:
+                header, _ = read_frame(response_fd)
+        except (EOFError, ValueError, OSError):
+            pass
+        if header is None:
+            # The test case crashed or timed out the harness.
+            kill_process_tree(self.process)
+            self.process.wait()
+            returncode = self.process.returncode
+            usage = ResourceUsage(time.perf_counter() - start)
+        else:
+            returncode = header["exit_code"]
+            usage = ResourceUsage(*header["usage"])
+        stdout, stderr, output_exceeded = capture_outputs(
+            self._read_output("stdout"), self._read_output("stderr"), self.limits
+        )
+        status = get_exit_status(
+            returncode,
+            stderr,
+            self.limits,
+            usage,
+            timed_out=timed_out,
+            output_exceeded=output_exceeded,
+        )
+        return (
+            CommandResult(stderr + stdout, returncode, status, usage),
+            header is not None,
+        )
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            kill_process_tree(self.process)
+            self.process.wait()
+        # Reclaims the processes left behind by the test cases.
+        kill_process_tree(self.process)
+        self.process.stdout.close()
+
+
+def run_batch(
+    command: str,
+    source_filename: str,
+    stdins: list[str],
+    limits: ResourceLimits = ResourceLimits(),
+    weight: int = 1,
+    cwd: str | None = None,
+    stop=None,
+) -> list[CommandResult | None] | None:
+    """Runs the command for each stdin in a single python process.
+
+    A test case that crashes or times out only fails itself, the remaining
+    test cases are run in a fresh harness process. The whole batch occupies
+    a single scheduler slot.
+
+    Args:
+        command (str): The command running the source file.
+        source_filename (str): The file name of the file to run.
+        stdins (list[str]): The stdin of each run.
+        limits (ResourceLimits): The resource limits of each run.
+        weight (int): The number of scheduler slots the batch occupies.
+        cwd (str|None): The working directory of the runs.
+        stop (Callable[[int, CommandResult], bool]|None): Called with the index
+            and the result of each run, the remaining test cases are not run
+            once it returns True. Their results are None.
+
+    Returns:
+        results (list[CommandResult|None]|None): The results of each run or
+            None if the command can not be run in a batch.
+    """
+    interpreter_args = get_interpreter_args(command, source_filename)
+    if interpreter_args is None:
+        return None
+    results = []
+    stopped = False
+    with workspace_pool.workspace() as io_dir, scheduler.slot(weight):
+        harness = None
+        try:
+            for i, stdin in enumerate(stdins):
+                if harness is None:
+                    try:
+                        with span("spawn", command=command, executor="batch"):
+                            harness = BatchHarness(
+                                interpreter_args, source_filename, io_dir, limits, cwd
+                            )
+                    except (BatchHarnessError, OSError):
+                        break
+                with span("run", command=command, executor="batch"):
+                    result, alive = harness.run(stdin)
+                results.append(result)
+                if not alive:
+                    harness.close()
+                    harness = None
+                if stop is not None and stop(i, result):
+                    stopped = True
+                    break
+        finally:
+            if harness is not None:
+                harness.close()
+    if not results and stdins:
+        return None
+    if stopped:
+        return results + [None] * (len(stdins) - len(results))
+    # The harness could not be restarted, the rest are run normally.
+    return results + [
+        run_command(command, stdin, limits, weight, cwd=cwd)
+        for stdin in stdins[len(results) :]
+    ]
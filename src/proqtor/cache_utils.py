@@ -0,0 +1,270 @@
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+import warnings
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+from .utils import parse_size
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on windows
+    fcntl = None
+
+CACHE_DIR_ENV = "PROQ_CACHE_DIR"
+NO_CACHE_ENV = "PROQ_NO_CACHE"
+PARSE_CACHE_ENV = "PROQ_PARSE_CACHE"
+# The file in each cache directory keeping the total size of its entries.
+SIZE_FILE = ".size"
+
+CacheStats = namedtuple("CacheStats", ["entries", "size"])
+
+
+def get_cache_dir() -> Path:
+    """Returns the root directory of the proqtor caches.
+
+    Uses `PROQ_CACHE_DIR` if set, else `proqtor` in the user cache directory.
+    """
+    if os.environ.get(CACHE_DIR_ENV):
+        return Path(os.environ[CACHE_DIR_ENV])
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "proqtor"
+
+
+def caching_enabled() -> bool:
+    return not os.environ.get(NO_CACHE_ENV)
+
+
+def set_caching(enabled: bool):
+    """Enables or disables the caches for this process and its children."""
+    if enabled:
+        os.environ.pop(NO_CACHE_ENV, None)
+    else:
+        os.environ[NO_CACHE_ENV] = "1"
+
+
+def parse_caching_enabled() -> bool:
+    """Whether the parsed proqs are cached, opted in with `PROQ_PARSE_CACHE`."""
+    return bool(os.environ.get(PARSE_CACHE_ENV)) and caching_enabled()
+
+
+def set_parse_caching(enabled: bool):
+    """Enables or disables the parsed proq cache for this process and its children."""
+    if enabled:
+        os.environ[PARSE_CACHE_ENV] = "1"
+    else:
+        os.environ.pop(PARSE_CACHE_ENV, None)
+
+
+def get_proqtor_version() -> str:
+    import importlib.metadata
+
+    try:
+        return importlib.metadata.version("proqtor")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def hash_key(*parts: str | bytes | None) -> str:
+    """Returns a hex digest identifying the given parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b"\0"
+        elif isinstance(part, str):
+            part = part.encode()
+        # Length prefixed so that the boundaries between parts are unambiguous.
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def get_dir_size(path: Path) -> int:
+    size = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(root, filename)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def runtime_fingerprint(command: str | None) -> str:
+    """Identifies the executable of a command by its path, size and mtime.
+
+    This is used in cache keys so that entries are not reused after the
+    compiler or the interpreter is changed.
+    """
+    if not command:
+        return ""
+    executable = shutil.which(command.split()[0])
+    if executable is None:
+        return command.split()[0]
+    executable = os.path.realpath(executable)
+    stat = os.stat(executable)
+    return f"{executable}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class DiskCache:
+    """A directory of cache entries evicted in least recently used order.
+
+    Each entry is a directory named by its key. Reading an entry updates its
+    modification time which is used as the recency of the entry. Entries are
+    written to a temporary directory and renamed into place, so concurrent
+    processes never see partially written entries.
+
+    Caching is best effort, any error while reading or writing the cache
+    directory is treated as a miss. Nothing is read or written when caching
+    is disabled with `set_caching` or the `PROQ_NO_CACHE` environment variable.
+
+    The max size is read from the `size_env` environment variable when it is
+    set, else `max_size` is used. The total size of the entries is kept in a
+    size file in the cache directory, so that the processes writing to the
+    cache do not walk all the entries to find it. It is corrected to the
+    actual size whenever the entries are evicted.
+    """
+
+    def __init__(self, name: str, max_size: int | str, size_env: str | None = None):
+        self.name = name
+        self.default_max_size = parse_size(max_size)
+        self.size_env = size_env
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return get_cache_dir() / self.name
+
+    @property
+    def max_size(self) -> int:
+        size = os.environ.get(self.size_env) if self.size_env else None
+        if not size:
+            return self.default_max_size
+        try:
+            return parse_size(size)
+        except ValueError as e:
+            warnings.warn(
+                f"Ignoring {self.size_env}: {e} Using {self.default_max_size} bytes.",
+                stacklevel=2,
+            )
+            return self.default_max_size
+
+    def get(self, key: str) -> Path | None:
+        """Returns the entry directory of the key if present."""
+        if not caching_enabled():
+            return None
+        entry = self.path / key
+        try:
+            os.utime(entry)
+        except OSError:
+            return None
+        return entry
+
+    def put(self, key: str, fill) -> Path | None:
+        """Creates the entry of the key.
+
+        Args:
+            key (str): The key of the entry.
+            fill (Callable[[Path], None]): Writes the contents of the entry
+                into the given directory.
+
+        Returns:
+            entry (Path|None): The entry directory or None if it failed.
+        """
+        if not caching_enabled():
+            return None
+        entry = self.path / key
+        tmp_entry = self.path / f".tmp-{uuid.uuid4().hex}"
+        try:
+            tmp_entry.mkdir(parents=True)
+            fill(tmp_entry)
+            size = get_dir_size(tmp_entry)
+            os.rename(tmp_entry, entry)
+        except OSError:
+            # Either written by another process in the meantime or unwritable.
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            return entry if entry.is_dir() else None
+        self._add_size(size)
+        return entry
+
+    @contextmanager
+    def _size_file(self):
+        """Opens the size file locked against the other threads and processes."""
+        with self._lock:
+            fd = os.open(self.path / SIZE_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+            with open(fd, "r+") as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                yield f
+
+    def _add_size(self, size):
+        try:
+            with self._size_file() as f:
+                try:
+                    total_size = int(f.read()) + size
+                except ValueError:
+                    # Created just now, the size includes the new entry.
+                    total_size = self.stats().size
+                if total_size > self.max_size:
+                    total_size = self.evict()
+                f.seek(0)
+                f.truncate()
+                f.write(str(total_size))
+        except OSError:
+            pass
+
+    def _entries(self):
+        try:
+            return [
+                entry
+                for entry in os.scandir(self.path)
+                if entry.is_dir() and not entry.name.startswith(".")
+            ]
+        except OSError:
+            return []
+
+    def evict(self) -> int:
+        """Removes the least recently used entries to fit in the max size.
+
+        Returns:
+            size (int): The size of the remaining entries.
+        """
+        entries = []
+        for entry in self._entries():
+            try:
+                entries.append((entry.stat().st_mtime, get_dir_size(entry), entry))
+            except OSError:
+                pass
+        entries.sort(key=lambda x: x[0], reverse=True)
+        max_size = self.max_size
+        total_size = 0
+        for _, size, entry in entries:
+            if total_size + size > max_size:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                total_size += size
+        return total_size
+
+    def remove(self, key: str):
+        size = get_dir_size(self.path / key)
+        shutil.rmtree(self.path / key, ignore_errors=True)
+        self._add_size(-size)
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def stats(self) -> CacheStats:
+        entries = self._entries()
+        return CacheStats(len(entries), sum(get_dir_size(entry) for entry in entries))
+
+
+build_cache = DiskCache("builds", "512M", size_env="PROQ_BUILD_CACHE_SIZE")
+result_cache = DiskCache("results", "256M", size_env="PROQ_RESULT_CACHE_SIZE")
+proq_cache = DiskCache("proqs", "256M", size_env="PROQ_PARSE_CACHE_SIZE")
+template_cache = DiskCache("templates", "64M", size_env="PROQ_TEMPLATE_CACHE_SIZE")
+
+caches = [build_cache, result_cache, proq_cache, template_cache]
@@ -0,0 +1,101 @@
+import os
+import subprocess
+from datetime import datetime
+
+
+def parse_timestamp(since: str | float) -> float | None:
+    """Returns the seconds since the epoch of a number or an ISO 8601 date.
+
+    Returns None if `since` is neither, eg. a git ref.
+    """
+    if isinstance(since, int | float):
+        return float(since)
+    try:
+        return float(since)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(since).timestamp()
+    except ValueError:
+        return None
+
+
+def run_git(*args: str, cwd) -> str:
+    """Runs the git command in the directory and returns its output."""
+    try:
+        completed = subprocess.run(
+            ["git", *args], cwd=cwd, capture_output=True, text=True, check=True
+        )
+    except FileNotFoundError:
+        raise ValueError("git is not installed.")
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"git {' '.join(args)} failed: {e.stderr.strip()}")
+    return completed.stdout
+
+
+class ChangedFiles:
+    """The files changed since a git commit or a timestamp.
+
+    `since` is taken as a git commit when it names one in the repository of
+    a file, so that a short hash or a tag which reads as a number is not
+    taken as a timestamp. The files changed since a commit are the files of
+    the working tree which differ from it, including the untracked files.
+    Otherwise the files changed since the timestamp are the files modified
+    after it or missing.
+    """
+
+    def __init__(self, since: str | float):
+        self.since = since
+        self.timestamp = parse_timestamp(since)
+        # The top level directory of the git repository of each directory.
+        self._repo_roots: dict[str, str | None] = {}
+        # The changed files of each repository by its top level directory,
+        # None if `since` is not a commit of the repository.
+        self._repo_changes: dict[str, set[str] | None] = {}
+
+    def _get_repo_root(self, directory: str) -> str | None:
+        if directory not in self._repo_roots:
+            try:
+                root = run_git("rev-parse", "--show-toplevel", cwd=directory)
+            except ValueError:
+                root = None
+            self._repo_roots[directory] = root and root.rstrip("\n")
+        return self._repo_roots[directory]
+
+    def _get_repo_changes(self, directory: str) -> set[str] | None:
+        root = self._get_repo_root(directory)
+        if root is None:
+            return None
+        if root not in self._repo_changes:
+            try:
+                run_git("rev-parse", "--verify", f"{self.since}^{{commit}}", cwd=root)
+            except ValueError:
+                self._repo_changes[root] = None
+                return None
+            changed = run_git(
+                "diff", "--name-only", "-z", str(self.since), "--", cwd=root
+            ) + run_git("ls-files", "--others", "--exclude-standard", "-z", cwd=root)
+            self._repo_changes[root] = {
+                os.path.realpath(os.path.join(root, path))
+                for path in changed.split("\0")
+                if path
+            }
+        return self._repo_changes[root]
+
+    def __contains__(self, path) -> bool:
+        path = os.path.realpath(path)
+        directory = os.path.dirname(path)
+        while not os.path.isdir(directory):
+            directory = os.path.dirname(directory)
+        changes = self._get_repo_changes(directory)
+        if changes is not None:
+            return path in changes
+        if self.timestamp is None:
+            raise ValueError(
+                f"{self.since} is neither a git commit of the repository of "
+                f"{path} nor a timestamp."
+            )
+        try:
+            return os.path.getmtime(path) > self.timestamp
+        except OSError:
+            return True
@@ -0,0 +1,22 @@
+from proqtor.cache_utils import caches, get_cache_dir
+from proqtor.utils import format_size
+
+
+class CacheCli:
+    """Manages the caches used to speed up evaluating proqs."""
+
+    def stats(self):
+        """Prints the number of entries and the size of each cache."""
+        print(f"Cache directory: {get_cache_dir()}")
+        for cache in caches:
+            stats = cache.stats()
+            print(
+                f"{cache.name}: {stats.entries} entries, "
+                f"{format_size(stats.size)} of {format_size(cache.max_size)}"
+            )
+
+    def clear(self):
+        """Removes all the cache entries."""
+        for cache in caches:
+            cache.clear()
+        print("Cache cleared.")
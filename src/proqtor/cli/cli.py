@@ -1,24 +1,31 @@
+import io
 import os
-from contextlib import contextmanager
+import sys
+from contextlib import contextmanager, redirect_stdout
 from functools import wraps
+from importlib.util import find_spec
 from pathlib import Path
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
 
 import fire
 from termcolor import cprint
 
-from proqtor.core import ProQ, ProqParseError
-from proqtor.evaluate_utils import ProqCheck
-from proqtor.utils import color_diff
+from proqtor.cache_utils import set_caching
+from proqtor.profile_utils import profiler, profiling, span
 
 from . import export
+from .cache import CacheCli
 
-try:
-    from proqtor.gen_ai_utils import generate_proq
+# The proq models, jinja, marko and the execution utilities are imported by
+# the commands which use them, so that the command line starts quickly.
+if TYPE_CHECKING:
+    from proqtor.change_utils import ChangedFiles
+    from proqtor.evaluate_utils import ProqCheck
 
-    gen_ai_features = True
-except ImportError:
-    gen_ai_features = False
+gen_ai_features = all(
+    find_spec(name) is not None
+    for name in ("langchain", "langchain_groq", "langchain_openai")
+)
 
 
 @contextmanager
@@ -27,10 +34,13 @@ def ignore_parse_errors():
         yield
     except FileNotFoundError as e:
         print(f"{e.filename} is not a valid file.")
-    except ProqParseError as e:
-        print("ProqParseError:", e.message)
     except Exception as e:
-        print(e)
+        from proqtor.core import ProqParseError
+
+        if isinstance(e, ProqParseError):
+            print("ProqParseError:", e.message)
+        else:
+            print(e)
 
 
 def ignore_parse_error_wrapper(func):
@@ -42,6 +52,200 @@ def ignore_parse_error_wrapper(func):
     return wrapper
 
 
+def evaluate_file(
+    file_path, verbose=False, diff_mode=False, fail_fast=False, dependencies=None
+) -> "ProqCheck | None":
+    """Evaluates a single proq file printing the progress and results.
+
+    Args:
+        file_path (str|PathLike): The proq file.
+        verbose (bool): Whether to print the test results.
+        diff_mode (bool): Whether to display expected-actual diffs.
+        fail_fast (bool): Whether to stop at the first failing test case.
+        dependencies (dict|None): Records the files included by the proq,
+            see `ProQ.from_file`.
+
+    Returns:
+        proq_check (ProqCheck|None): The check result or None if the file
+            could not be parsed or evaluated.
+    """
+    from proqtor.core import ProQ
+
+    print(f"Evaluating {file_path}")
+    with ignore_parse_errors(), span("evaluate", file=str(file_path)):
+        proq = ProQ.from_file(file_path, dependencies=dependencies)
+
+        result = proq.evaluate(
+            verbose=verbose, diff_mode=diff_mode, fail_fast=fail_fast
+        )
+        if verbose:
+            print()
+        return result
+
+
+def init_evaluate_worker(force_color, max_concurrency, profile=False):
+    if force_color:
+        # The captured output is not a tty, keep the colors of the parent.
+        os.environ["FORCE_COLOR"] = "1"
+    from proqtor.execute_utils import set_max_concurrency
+
+    set_max_concurrency(max_concurrency)
+    if profile:
+        profiler.enable()
+
+
+def evaluate_file_job(job):
+    """Evaluates a proq file in a worker capturing everything it prints.
+
+    The spans recorded while profiling are returned to be written by the parent.
+    """
+    index, file_path, verbose, diff_mode, fail_fast = job
+    output = io.StringIO()
+    with redirect_stdout(output):
+        result = evaluate_file(
+            file_path, verbose=verbose, diff_mode=diff_mode, fail_fast=fail_fast
+        )
+    return index, file_path, result, output.getvalue(), profiler.pop_events()
+
+
+def print_evaluation_summary(proq_checks: "list[tuple[str, ProqCheck]]"):
+    n_proqs = len(proq_checks)
+    cprint(
+        f"Total of {n_proqs} proq{'s' if n_proqs > 1 else ''} evaluated.",
+        attrs=["bold"],
+    )
+    for file_path, proq_check in proq_checks:
+        cprint(
+            ("✓" if proq_check.solution_check else "✗") + " solution",
+            "green" if proq_check.solution_check else "red",
+            end=" ",
+        )
+        cprint(
+            ("✓" if proq_check.template_check else "✗") + " template",
+            "green" if proq_check.template_check else "red",
+            end=" ",
+        )
+        print(os.path.relpath(file_path, os.curdir))
+
+
+def is_proq_changed(proq_file, changed_files: "ChangedFiles") -> bool:
+    """Whether the proq file or any file it includes is among the changed files.
+
+    The proqs which cannot be parsed are taken as changed to be reported.
+    """
+    from proqtor.core import get_proq_dependencies
+
+    if proq_file in changed_files:
+        return True
+    try:
+        dependencies = get_proq_dependencies(proq_file)
+    except Exception:
+        return True
+    return any(dependency in changed_files for dependency in dependencies)
+
+
+def expand_nested_proq_files(files) -> list:
+    """Replaces the nested proq config files by the proq files in them.
+
+    A proq file in several nested proq config files is listed once.
+    """
+    from proqtor.core import get_nested_proq_files, read_nested_proq_files
+
+    expanded_files, nested_files = [], set()
+    for file_path in files:
+        if os.path.splitext(file_path)[1] != ".yaml" or not os.path.isfile(file_path):
+            expanded_files.append(file_path)
+            continue
+        try:
+            proq_files = get_nested_proq_files(read_nested_proq_files(file_path))
+        except Exception as e:
+            print(f"{file_path} is not a valid nested proq config file - {e}")
+            continue
+        for proq_file in proq_files:
+            if proq_file not in nested_files:
+                nested_files.add(proq_file)
+                expanded_files.append(proq_file)
+    return expanded_files
+
+
+def evaluate_files(
+    files, verbose, diff_mode, jobs, fail_fast, profile, changed_since=None
+):
+    """Evaluates the proq files in `jobs` worker processes, see `ProqCli.evaluate`."""
+    valid_files = []
+    for file_path in expand_nested_proq_files(files):
+        if not os.path.isfile(file_path):
+            print(f"{file_path} is not a valid file")
+            continue
+        valid_files.append(file_path)
+
+    if changed_since is not None:
+        from proqtor.change_utils import ChangedFiles
+
+        changed_files = ChangedFiles(changed_since)
+        n_files = len(valid_files)
+        try:
+            valid_files = [
+                file_path
+                for file_path in valid_files
+                if is_proq_changed(file_path, changed_files)
+            ]
+        except ValueError as e:
+            print(e)
+            return
+        print(f"{len(valid_files)} of {n_files} proqs changed since {changed_since}.")
+        if not valid_files:
+            return
+
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(valid_files)) or 1
+
+    proq_checks: list[tuple[str, ProqCheck]] = []
+    if jobs == 1:
+        for file_path in valid_files:
+            result = evaluate_file(
+                file_path, verbose=verbose, diff_mode=diff_mode, fail_fast=fail_fast
+            )
+            if result is not None:
+                proq_checks.append((file_path, result))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        from proqtor.execute_utils import scheduler
+        from proqtor.utils import bounded_imap_unordered
+
+        indexed_checks = []
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=init_evaluate_worker,
+            # The workers share the child process limit of this process.
+            initargs=(
+                sys.stdout.isatty(),
+                max(1, scheduler.max_concurrency // jobs),
+                profile,
+            ),
+        ) as executor:
+            jobs_iter = (
+                (index, file_path, verbose, diff_mode, fail_fast)
+                for index, file_path in enumerate(valid_files)
+            )
+            # Outputs are printed as each proq finishes, the summary keeps
+            # the order in which the files were given.
+            for index, file_path, result, output, events in bounded_imap_unordered(
+                executor, evaluate_file_job, jobs_iter, max_pending=2 * jobs
+            ):
+                print(output, end="", flush=True)
+                profiler.add_events(events)
+                if result is not None:
+                    indexed_checks.append((index, file_path, result))
+        proq_checks = [
+            (file_path, result) for _, file_path, result in sorted(indexed_checks)
+        ]
+
+    print_evaluation_summary(proq_checks)
+
+
 class ProqCli:
     """A Command-line suite for authoring Programming Questions.
 
@@ -50,6 +254,7 @@ class ProqCli:
 
     def __init__(self) -> None:
         self.export = export.proq_export
+        self.cache = CacheCli()
 
     def create(
         self,
@@ -70,6 +275,8 @@ class ProqCli:
             n_private (int) : Number of private test cases
             force (bool) : Overwrite file if exists
         """
+        from proqtor.core import ProQ
+
         if not force and os.path.isfile(output_file):
             raise FileExistsError(
                 f"A file with the name '{output_file}' already exists."
@@ -85,26 +292,44 @@ class ProqCli:
         Args:
             proq_files (list[str]): List of proq files to format.
         """
+        from proqtor.core import ProQ
+
         for proq_file in proq_files:
             with ignore_parse_errors():
                 ProQ.from_file(proq_file, render_template=False).to_file(proq_file)
 
-    def correct(self, *proq_files: list[str]):
+    def correct(
+        self,
+        *proq_files: list[str],
+        no_cache: bool = False,
+        profile: str | bool = False,
+    ):
         """Corrects the test case outputs according to the solution.
 
         Args:
             proq_files (list[str]): List of proq files to correct.
+            no_cache (bool): Whether to rebuild and rerun everything
+                instead of using the cached builds and results.
+            profile (str|bool): The Chrome trace file to write the time spent
+                in each phase to. `--profile` alone writes `proq-trace.json`.
         """
-        for proq_file in proq_files:
-            with ignore_parse_errors():
-                proq = ProQ.from_file(proq_file).correct_outputs(inplace=True)
-                unrendered_proq = ProQ.from_file(proq_file, render_template=False)
-                unrendered_proq.public_test_cases = proq.public_test_cases
-                unrendered_proq.private_test_cases = proq.private_test_cases
-                unrendered_proq.to_file(proq_file)
+        from proqtor.core import ProQ
+
+        if no_cache:
+            set_caching(False)
+        with profiling(profile):
+            for proq_file in proq_files:
+                with ignore_parse_errors(), span("correct", file=str(proq_file)):
+                    proq = ProQ.from_file(proq_file).correct_outputs(inplace=True)
+                    unrendered_proq = ProQ.from_file(proq_file, render_template=False)
+                    unrendered_proq.public_test_cases = proq.public_test_cases
+                    unrendered_proq.private_test_cases = proq.private_test_cases
+                    unrendered_proq.to_file(proq_file)
 
     def run(self, proq_file: str):
         """Runs the solution as it is run from the terminal."""
+        from proqtor.core import ProQ
+
         proq = ProQ.from_file(proq_file=proq_file, render_template=True)
         proq.run()
 
@@ -122,6 +347,9 @@ class ProqCli:
             render (bool): Whether to render the jinja template
             mode (Literal["solution", "template", "diff"]): Display mode
         """
+        from proqtor.core import ProQ
+        from proqtor.utils import color_diff
+
         proq = ProQ.from_file(proq_file, render_template=render)
         cprint(proq.solution.prefix, color="grey", end="")
         if mode == "diff":
@@ -143,59 +371,96 @@ class ProqCli:
             proq_file (str): The proq file
             zip (bool): Whether to zip archive instead of a folder.
         """
+        from proqtor.core import ProQ
+
         proq = ProQ.from_file(proq_file)
         folder = Path(os.path.splitext(proq_file)[0])
         proq.export_test_cases(folder, zip)
 
-    def evaluate(self, *files: str | os.PathLike, verbose=False, diff_mode=False):
+    def evaluate(
+        self,
+        *files: str | os.PathLike,
+        verbose=False,
+        diff_mode=False,
+        jobs: int = 1,
+        no_cache: bool = False,
+        fail_fast: bool = False,
+        profile: str | bool = False,
+        changed_since: str | float | None = None,
+    ):
         """Evaluates the testcases in the proq files locally.
 
         It uses the local installed compilers and interpreters
         to evalate the testcases.
 
+        Each proq file in a nested proq config `.yaml` file is evaluated
+        once, even if it is in several sections.
+
         The config on how to execute the solution code is present
         in the first line of the code block in the solution.
 
         ```{lang_id} {filename} -r '{run_command}' -b '{build_command}'
 
         Args:
-            files (str|PathLike): The file names of the proqs to be evaluated.
+            files (str|PathLike): The file names of the proqs or of the
+                nested proq config files to be evaluated.
             verbose (bool): Whether to print the test results.
             diff_mode (bool):
                 Whether to display expected-actual diff instead of separate
                 expected and actual outputs
+            jobs (int): Number of proqs to evaluate concurrently in separate
+                processes. Non-positive values use the number of CPUs.
+            no_cache (bool): Whether to rebuild and rerun everything
+                instead of using the cached builds and results.
+            fail_fast (bool): Whether to stop evaluating the solution of a
+                proq at its first failing test case.
+            profile (str|bool): The Chrome trace file to write the time spent
+                in each phase to. `--profile` alone writes `proq-trace.json`.
+            changed_since (str|float|None): Evaluates only the proqs of which
+                the file or any file it includes with jinja changed since this
+                git commit, or else this timestamp given in seconds since the
+                epoch or as an ISO 8601 date.
         """
-        proq_checks: list[tuple[str, ProqCheck]] = []
-        for file_path in files:
-            if not os.path.isfile(file_path):
-                print(f"{file_path} is not a valid file")
-                continue
-            print(f"Evaluating {file_path}")
-            with ignore_parse_errors():
-                proq = ProQ.from_file(file_path)
+        if no_cache:
+            set_caching(False)
+        with profiling(profile):
+            evaluate_files(
+                files,
+                verbose,
+                diff_mode,
+                jobs,
+                fail_fast,
+                bool(profile),
+                changed_since,
+            )
 
-                result = proq.evaluate(verbose=verbose, diff_mode=diff_mode)
-                if verbose:
-                    print()
-                proq_checks.append((file_path, result))
+    def watch(
+        self,
+        *paths: str | os.PathLike,
+        verbose=False,
+        diff_mode=False,
+        fail_fast: bool = False,
+        interval: float = 0.3,
+    ):
+        """Evaluates the proqs and evaluates them again whenever they change.
 
-        n_proqs = len(proq_checks)
-        cprint(
-            f"Total of {n_proqs} proq{'s' if n_proqs > 1 else ''} evaluated.",
-            attrs=["bold"],
-        )
-        for file_path, proq_check in proq_checks:
-            cprint(
-                ("✓" if proq_check.solution_check else "✗") + " solution",
-                "green" if proq_check.solution_check else "red",
-                end=" ",
-            )
-            cprint(
-                ("✓" if proq_check.template_check else "✗") + " template",
-                "green" if proq_check.template_check else "red",
-                end=" ",
-            )
-            print(os.path.relpath(file_path, os.curdir))
+        A proq is evaluated again when its file or any file it includes with
+        jinja changes. The builds and test case results of unchanged code
+        are reused from the cache.
+
+        Args:
+            paths (str|PathLike): The proq files or the directories to watch
+                the `.md` files in.
+            verbose (bool): Whether to print the test results.
+            diff_mode (bool): Whether to display expected-actual diff instead
+                of separate expected and actual outputs.
+            fail_fast (bool): Whether to stop evaluating the solution of a
+                proq at its first failing test case.
+            interval (float): The seconds between the checks for changes.
+        """
+        from .watch import ProqWatcher
+
+        ProqWatcher(paths, verbose, diff_mode, fail_fast).run(interval)
 
     if gen_ai_features:
 
@@ -218,6 +483,9 @@ class ProqCli:
                     The LLM model to be used in the format of "provider:model_id".
                     The currently supported providers are groq and open-ai.
             """
+            from proqtor.core import ProqParseError
+            from proqtor.gen_ai_utils import generate_proq
+
             try:
                 proq = generate_proq(prompt, example_files=examples, model=model)
             except ProqParseError as e:
@@ -237,6 +505,55 @@ class ProqCli:
                 "optional dependencies proqtor[genai]"
             )
 
+    def list(
+        self,
+        *paths: str | os.PathLike,
+        tags: str | tuple[str, ...] | None = None,
+        title: str | None = None,
+    ):
+        """Lists the title, tags and number of test cases of the proq files.
+
+        Only the front matter and the test case sections of the proqs are
+        parsed, so that large question banks are listed quickly.
+
+        Args:
+            paths (str|PathLike): The proq files or the directories to list
+                the `.md` files in.
+            tags (str|tuple[str]): Lists only the proqs with all these tags.
+            title (str): Lists only the proqs with titles containing this
+                text, ignoring the case.
+        """
+        from proqtor.core import ProQ
+
+        if isinstance(tags, str):
+            tags = tags.split(",")
+        n_proqs = 0
+        for proq_file in find_proq_files(paths):
+            with ignore_parse_errors():
+                proq = ProQ.lazy_from_file(proq_file)
+                if tags and not set(tags) <= set(proq.tags):
+                    continue
+                if title and title.lower() not in (proq.title or "").lower():
+                    continue
+                n_public, n_private = proq.count_test_cases()
+                n_proqs += 1
+                cprint(proq.title, attrs=["bold"], end=" ")
+                print(f"[{', '.join(proq.tags)}]", end=" ")
+                print(f"{n_public} public {n_private} private", end=" ")
+                cprint(os.path.relpath(proq_file, os.curdir), "grey")
+        cprint(f"Total of {n_proqs} proq{'s' if n_proqs != 1 else ''}.", attrs=["bold"])
+
+
+def find_proq_files(paths) -> list[str]:
+    """Returns the files and the `.md` files in the directories among the paths."""
+    proq_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            proq_files.extend(sorted(map(str, Path(path).rglob("*.md"))))
+        else:
+            proq_files.append(str(path))
+    return proq_files
+
 
 def main():
     fire.Fire(ProqCli(), name="proq")
@@ -4,8 +4,8 @@ import subprocess
 import tempfile
 from typing import Literal
 
-from proqtor.core import NestedContent, ProQ, load_nested_proq_from_file
-from proqtor.template_utils import package_env
+from proqtor.cache_utils import set_caching
+from proqtor.profile_utils import profiling, span
 
 OUTPUT_FORMATS = ["json", "html", "pdf"]
 
@@ -30,7 +30,11 @@ async def print_html_to_pdf(html_content, output_file, chrome_path=None):
         )
 
 
-get_rendered_html = package_env.get_template("proq_export_template.html.jinja").render
+def get_rendered_html(**kwargs) -> str:
+    # Imported when exporting, as jinja is slow to import for the other commands.
+    from proqtor.template_utils import package_env
+
+    return package_env.get_template("proq_export_template.html.jinja").render(**kwargs)
 
 
 def proq_export(
@@ -40,6 +44,9 @@ def proq_export(
     show_hidden_suffix: bool = False,
     hide_private_testcases: bool = False,
     hide_template_diff: bool = False,
+    no_cache: bool = False,
+    profile: str | bool = False,
+    jobs: int = 1,
 ):
     """Export the proq_file or a nested proq config file to the given format.
 
@@ -63,8 +70,17 @@ def proq_export(
             Whether to hide private testcases in HTML or PDF exports.
         hide_template_diff (bool):
             Whether to hide the template - solution diff.
+        no_cache (bool):
+            Whether to rebuild and rerun everything instead of using the
+            cached builds and results.
+        profile (str|bool): The Chrome trace file to write the time spent
+            in each phase to. `--profile` alone writes `proq-trace.json`.
+        jobs (int): Number of processes parsing the proq files of a nested
+            proq config file. Non-positive values use the number of CPUs.
 
     """
+    if no_cache:
+        set_caching(False)
     if not os.path.isfile(proq_file):
         raise FileNotFoundError(f"File {proq_file} does not exists.")
     if not output_file:
@@ -77,9 +93,34 @@ def proq_export(
         # infer format if output filename is given
         format = output_file.split(".")[-1]
 
+    with profiling(profile), span("export", file=str(proq_file), format=format):
+        write_export(
+            proq_file,
+            output_file,
+            format,
+            show_hidden_suffix,
+            hide_private_testcases,
+            hide_template_diff,
+            jobs,
+        )
+    print(f"Proqs dumped to {output_file}")
+
+
+def write_export(
+    proq_file,
+    output_file,
+    format,
+    show_hidden_suffix,
+    hide_private_testcases,
+    hide_template_diff,
+    jobs=1,
+):
+    """Loads the proq_file and writes it to the output file, see `proq_export`."""
+    from proqtor.core import NestedContent, ProQ, load_nested_proq_from_file
+
     is_nested_proq = proq_file.split(".")[-1] == "yaml"
     if is_nested_proq:
-        nested_proq = load_nested_proq_from_file(proq_file)
+        nested_proq = load_nested_proq_from_file(proq_file, jobs=jobs)
     else:
         proq = ProQ.from_file(proq_file)
         nested_proq = NestedContent[ProQ](title=proq.title, content=proq)
@@ -91,12 +132,13 @@ def proq_export(
             else:
                 f.write(proq.model_dump_json(indent=2))
         elif format in ["html", "pdf"]:
-            rendered_html = get_rendered_html(
-                nested_proq=nested_proq,
-                show_hidden_suffix=show_hidden_suffix,
-                hide_private_testcases=hide_private_testcases,
-                hide_template_diff=hide_template_diff,
-            )
+            with span("render", template="export"):
+                rendered_html = get_rendered_html(
+                    nested_proq=nested_proq,
+                    show_hidden_suffix=show_hidden_suffix,
+                    hide_private_testcases=hide_private_testcases,
+                    hide_template_diff=hide_template_diff,
+                )
             if format == "html":
                 f.write(rendered_html)
             if format == "pdf":
@@ -106,5 +148,3 @@ def proq_export(
                         output_file,
                     )
                 )
-
-    print(f"Proqs dumped to {output_file}")
@@ -0,0 +1,98 @@
+import time
+from pathlib import Path
+
+from termcolor import cprint
+
+from proqtor.core import get_dependency_paths
+from proqtor.evaluate_utils import ProqCheck
+from proqtor.template_utils import get_file_version
+
+from .cli import evaluate_file, find_proq_files, print_evaluation_summary
+
+
+def get_version(path) -> tuple[int, int] | None:
+    """Returns the modification time and size of the file, None if missing."""
+    try:
+        return get_file_version(Path(path))
+    except OSError:
+        return None
+
+
+class ProqWatcher:
+    """Evaluates the proq files again whenever they or the files they include change.
+
+    The files are polled for changes in their modification time or size. The
+    proqs are evaluated in this process, so the jinja environments, the
+    executors and the caches of builds and test case results stay warm.
+    """
+
+    def __init__(self, paths, verbose=False, diff_mode=False, fail_fast=False):
+        self.paths = paths
+        self.verbose = verbose
+        self.diff_mode = diff_mode
+        self.fail_fast = fail_fast
+        # The versions of the proq files and of the files they include as
+        # they were when the proqs were last evaluated.
+        self.versions: dict[str, dict[str, tuple[int, int] | None]] = {}
+        self.checks: dict[str, ProqCheck | None] = {}
+
+    def get_changed_files(self) -> list[str]:
+        """Returns the new proq files and the ones of which any file changed."""
+        proq_files = find_proq_files(self.paths)
+        for proq_file in set(self.versions) - set(proq_files):
+            del self.versions[proq_file]
+            self.checks.pop(proq_file, None)
+        return [
+            proq_file
+            for proq_file in proq_files
+            if proq_file not in self.versions
+            or any(
+                get_version(path) != version
+                for path, version in self.versions[proq_file].items()
+            )
+        ]
+
+    def evaluate(self, proq_file):
+        # Taken before reading so that changes while evaluating are not missed.
+        versions = {proq_file: get_version(proq_file)}
+        dependencies = {}
+        self.checks[proq_file] = evaluate_file(
+            proq_file,
+            verbose=self.verbose,
+            diff_mode=self.diff_mode,
+            fail_fast=self.fail_fast,
+            dependencies=dependencies,
+        )
+        for path in get_dependency_paths(proq_file, dependencies):
+            versions[path] = get_version(path)
+        self.versions[proq_file] = versions
+
+    def evaluate_changed(self) -> bool:
+        """Evaluates the changed proqs, returns whether there were any."""
+        changed_files = self.get_changed_files()
+        for proq_file in changed_files:
+            self.evaluate(proq_file)
+        if changed_files:
+            print_evaluation_summary(
+                [
+                    (proq_file, self.checks[proq_file])
+                    for proq_file in changed_files
+                    if self.checks[proq_file] is not None
+                ]
+            )
+        return bool(changed_files)
+
+    def run(self, interval: float = 0.3):
+        """Evaluates all the proqs and then the changed ones until interrupted."""
+        try:
+            while True:
+                if self.evaluate_changed():
+                    n_proqs = len(self.versions)
+                    cprint(
+                        f"Watching {n_proqs} proq{'s' if n_proqs != 1 else ''} "
+                        "for changes, press Ctrl+C to stop.",
+                        "grey",
+                    )
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print()
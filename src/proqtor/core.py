@@ -1,34 +1,63 @@
+import asyncio
+import copy
 import os
 import re
 import shutil
 import subprocess
 import warnings
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
 from typing import Generic, Self, TypeVar
 
 import yaml
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 from termcolor import colored, cprint
 
-import md2json
-
-from .core_components import Solution, TestCase
+from .cache_utils import (
+    get_proqtor_version,
+    hash_key,
+    parse_caching_enabled,
+    proq_cache,
+)
+from .core_components import ExecuteConfig, Solution, TestCase
 from .evaluate_utils import (
+    EXIT_STATUS_VERDICTS,
     BuildFailedError,
     ProqCheck,
+    aget_test_case_results,
     code_run_env,
-    get_test_case_results,
     print_solution_check_results,
     print_template_check_results,
 )
 from .execute_utils import get_command_output
-from .parse import extract_solution, extract_testcases
+from .parse import (
+    UnsupportedMarkdownError,
+    extract_solution,
+    extract_test_cases,
+    fold_sections,
+    scan_markdown,
+)
+from .profile_utils import span
 from .prog_langs import ProgLang
-from .template_utils import get_relative_env, package_env
+from .template_utils import (
+    get_relative_env,
+    get_template_hash,
+    has_template_syntax,
+    package_env,
+    recording_dependencies,
+    render_template_string,
+)
+from .utils import run_sync
 
 PROBLEM_STATEMENT = "Problem Statement"
 PUBLIC_TEST_CASES = "Public Test Cases"
 PRIVATE_TEST_CASES = "Private Test Cases"
 SOLUTION = "Solution"
+TEST_CASE_HEADINGS = [PUBLIC_TEST_CASES, PRIVATE_TEST_CASES]
+
+# The safe loader of libyaml when available is several times faster.
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 
 class ProqParseError(Exception):
@@ -37,6 +66,34 @@ class ProqParseError(Exception):
         self.message = message
         self.content = content
 
+    def __reduce__(self):
+        # Pickled with both arguments to be raised from worker processes.
+        return type(self), (self.message, self.content)
+
+
+class CorrectOutputsError(Exception):
+    """Raised when the solution exceeds a limit on a test case being corrected."""
+
+
+def split_front_matter(content: str) -> tuple[dict, str]:
+    """Splits the content of a proq file into its yaml header and markdown."""
+    try:
+        yaml_header, md_string = content.split("---", 2)[1:]
+    except Exception:
+        raise ProqParseError(message="Yaml header not found.", content=content)
+    try:
+        yaml_header = yaml.load(yaml_header, Loader=YamlLoader)
+    except Exception:
+        raise ProqParseError(message="Invalid yaml in the yaml header", content=content)
+    if "title" not in yaml_header:
+        raise ProqParseError(message="Title not found in yaml header", content=content)
+    return yaml_header, md_string
+
+
+def normalize_title(title: str) -> str:
+    """Removes multiple spaces and strips whitespace in beginning and end."""
+    return re.sub(re.compile(r"\s+"), " ", title).strip()
+
 
 class FrontMatter(BaseModel):
     title: str | None = None
@@ -88,7 +145,7 @@ class ProQ(BaseModel):
     @classmethod
     def remove_duplicates(cls, word):
         """Removes multiple spaces and strips whitespace in beginning and end."""
-        return re.sub(re.compile(r"\s+"), " ", word).strip()
+        return normalize_title(word)
 
     @classmethod
     def default_proq(cls, lang: ProgLang = "python", n_public=1, n_private=1):
@@ -102,31 +159,34 @@ class ProQ(BaseModel):
         )
 
     @classmethod
-    def from_str(cls, content, base=None, render_template=False):
+    def from_str(cls, content, base=None, render_template=False, dependencies=None):
+        """Parses the proq from the content of a proq file.
+
+        Args:
+            content (str): The content of the proq file.
+            base (str|None): The directory the jinja includes are relative to.
+            render_template (bool): Whether to render the sections as jinja templates.
+            dependencies (dict|None): Records the hash of each file included
+                while rendering by its name.
+        """
         if base is None:
             base = os.curdir
-        try:
-            yaml_header, md_string = content.split("---", 2)[1:]
-        except Exception:
-            raise ProqParseError(message="Yaml header not found.", content=content)
-        try:
-            yaml_header = yaml.safe_load(yaml_header)
-        except Exception:
-            raise ProqParseError(
-                message="Invalid yaml in the yaml header", content=content
-            )
-        if "title" not in yaml_header:
-            raise ProqParseError(
-                message="Title not found in yaml header", content=content
-            )
+        yaml_header, md_string = split_front_matter(content)
 
         try:
             env = get_relative_env(base)
-
-            proq = {
-                k.title(): env.from_string(v).render() if render_template else v
-                for k, v in md2json.fold_level(md_string, level=1).items()
-            }
+            with span("fold"):
+                sections = fold_sections(md_string)
+            proq, blocks = {}, {}
+            with span("render"), recording_dependencies(dependencies):
+                for k, (v, section_blocks) in sections.items():
+                    if render_template:
+                        rendered = render_template_string(env, v)
+                        # The blocks were scanned from the text before rendering.
+                        if rendered != v.removesuffix("\n"):
+                            section_blocks = None
+                        v = rendered
+                    proq[k.title()], blocks[k.title()] = v, section_blocks
         except Exception as e:
             raise ProqParseError(
                 message="Error occured while parsing or rendering "
@@ -155,7 +215,8 @@ class ProQ(BaseModel):
 
         proq[PROBLEM_STATEMENT] = proq[PROBLEM_STATEMENT].strip()
         try:
-            proq[SOLUTION] = extract_solution(proq[SOLUTION])
+            with span("extract", part="solution"):
+                proq[SOLUTION] = extract_solution(proq[SOLUTION], blocks[SOLUTION])
         except Exception as e:
             raise ProqParseError(
                 message="Error occured while extracting solution"
@@ -164,10 +225,10 @@ class ProQ(BaseModel):
             )
 
         try:
-            proq[PUBLIC_TEST_CASES] = md2json.fold_level(
-                proq[PUBLIC_TEST_CASES], level=2, return_type="list"
-            )
-            proq[PUBLIC_TEST_CASES] = extract_testcases(proq[PUBLIC_TEST_CASES])
+            with span("extract", part="public test cases"):
+                proq[PUBLIC_TEST_CASES] = extract_test_cases(
+                    proq[PUBLIC_TEST_CASES], blocks[PUBLIC_TEST_CASES]
+                )
         except Exception as e:
             raise ProqParseError(
                 message="Error occured while extracting public test cases"
@@ -176,10 +237,10 @@ class ProQ(BaseModel):
             )
 
         try:
-            proq[PRIVATE_TEST_CASES] = md2json.fold_level(
-                proq[PRIVATE_TEST_CASES], level=2, return_type="list"
-            )
-            proq[PRIVATE_TEST_CASES] = extract_testcases(proq[PRIVATE_TEST_CASES])
+            with span("extract", part="private test cases"):
+                proq[PRIVATE_TEST_CASES] = extract_test_cases(
+                    proq[PRIVATE_TEST_CASES], blocks[PRIVATE_TEST_CASES]
+                )
         except Exception as e:
             raise ProqParseError(
                 message="Error occured while extracting public test cases"
@@ -188,17 +249,30 @@ class ProQ(BaseModel):
             )
 
         proq.update(yaml_header)
-        return cls.model_validate(proq)
+        with span("validate"):
+            return cls.model_validate(proq)
 
     @classmethod
-    def from_file(cls, proq_file, render_template=True):
-        """Loads the proq file and returns a Proq."""
+    def from_file(cls, proq_file, render_template=True, dependencies=None):
+        """Loads the proq file and returns a Proq.
+
+        When `PROQ_PARSE_CACHE` is set, the parsed proqs are cached by the
+        content of the file and of the jinja files included while rendering.
+        The hash of each included file is recorded by its name relative to
+        the proq file in `dependencies` if given.
+        """
         if not os.path.isfile(proq_file):
             raise FileNotFoundError(f"File {proq_file} does not exists.")
-        with open(proq_file) as f:
-            return ProQ.from_str(
-                f.read(), os.path.dirname(proq_file), render_template=render_template
-            )
+        with span("read", file=str(proq_file)), open(proq_file) as f:
+            content = f.read()
+        return load_proq(
+            content, os.path.dirname(proq_file), render_template, dependencies
+        )
+
+    @classmethod
+    def lazy_from_file(cls, proq_file, render_template=True) -> "LazyProQ":
+        """Loads the front matter of the proq file, the rest is parsed when used."""
+        return LazyProQ(proq_file, render_template)
 
     @property
     def front_matter(self):
@@ -215,104 +289,197 @@ class ProQ(BaseModel):
         with open(file_name, "w") as f:
             f.write(self.to_str())
 
-    def get_test_case_results(self, code, test_cases):
-        execute_config = self.solution.execute_config
-        return get_test_case_results(
+    @property
+    def execute_config(self) -> ExecuteConfig:
+        """The execute config of the solution.
+
+        The `execute` mapping in the front matter provides the values that are
+        not given in the execute config of the solution code block.
+        """
+        front_matter_config = (self.model_extra or {}).get("execute") or {}
+        return ExecuteConfig.model_validate(
+            front_matter_config
+            | self.solution.execute_config.model_dump(
+                exclude_unset=True, exclude_none=True
+            )
+        )
+
+    async def aget_test_case_results(self, code, test_cases, stop_on=None):
+        execute_config = self.execute_config
+        return await aget_test_case_results(
             code,
             test_cases,
             execute_config.source_filename,
             execute_config.run,
             execute_config.build,
+            limits=execute_config.limits,
+            weight=execute_config.weight,
+            executor=execute_config.executor,
+            stop_on=stop_on,
         )
 
+    def get_test_case_results(self, code, test_cases, stop_on=None):
+        return run_sync(self.aget_test_case_results(code, test_cases, stop_on))
+
     def run(self):
         """Executes the code as it is run from the command line."""
         with code_run_env(
             self.solution.solution_code, self.solution.execute_config.source_filename
-        ):
+        ) as workspace:
             if self.solution.execute_config.build:
                 get_command_output(
-                    self.solution.execute_config.build, raise_on_fail=True
+                    self.solution.execute_config.build,
+                    raise_on_fail=True,
+                    cwd=workspace,
                 )
 
-            return subprocess.run(self.solution.execute_config.run.split())
+            return subprocess.run(
+                self.solution.execute_config.run.split(), cwd=workspace
+            )
+
+    async def aevaluate(
+        self, verbose=False, diff_mode=False, fail_fast=False
+    ) -> ProqCheck:
+        """Checks the solution and the template against the test cases.
 
-    def evaluate(self, verbose=False, diff_mode=False) -> ProqCheck:
-        n_public = len(self.public_testcases)
+        The template is run alongside the solution and stops at its first
+        passing test case. With `fail_fast` the solution stops at its first
+        failing test case.
+        """
+        n_public = len(self.public_test_cases)
+        test_cases = self.public_test_cases + self.private_test_cases
 
         if verbose:
             print("Title:", colored(self.title, "cyan", attrs=["bold"]))
 
-        # Test solution with public and private test cases
-        try:
-            test_case_results = self.get_test_case_results(
-                self.solution.solution_code,
-                self.public_test_cases + self.private_test_cases,
+        tagged_template = self.solution.tagged_template
+        sol_start = tagged_template.find("<sol>")
+        has_sol_tag = (
+            sol_start != -1 and tagged_template.find("</sol>", sol_start) != -1
+        )
+        template_run = None
+        if has_sol_tag:
+            template_run = asyncio.ensure_future(
+                self.aget_test_case_results(
+                    self.solution.template_code,
+                    test_cases,
+                    stop_on=lambda result: result.passed,
+                )
             )
-        except BuildFailedError as e:
+        try:
+            # Test solution with public and private test cases
+            try:
+                test_case_results = await self.aget_test_case_results(
+                    self.solution.solution_code,
+                    test_cases,
+                    stop_on=(lambda result: not result.passed) if fail_fast else None,
+                )
+            except BuildFailedError as e:
+                if verbose:
+                    cprint("Build Failed", color="red", attrs=["bold"])
+                    cprint(e.command_output, color="red")
+                return ProqCheck(solution_check=False, template_check=False)
+
             if verbose:
-                cprint("Build Failed", color="red", attrs=["bold"])
-                cprint(e.command_output, color="red")
-            return ProqCheck(solution_check=False, template_check=False)
+                print_solution_check_results(
+                    test_case_results[:n_public],
+                    test_case_results[n_public:],
+                    diff_mode=diff_mode,
+                )
 
-        if verbose:
-            print_solution_check_results(
-                test_case_results[:n_public],
-                test_case_results[n_public:],
-                diff_mode=diff_mode,
-            )
+            if not all(map(lambda x: x.passed, test_case_results)):
+                return ProqCheck(solution_check=False, template_check=False)
 
-        if not all(map(lambda x: x.passed, test_case_results)):
-            return ProqCheck(solution_check=False, template_check=False)
-
-        if not re.match(r".*<sol>.*</sol>.*", self.solution.tagged_template, re.DOTALL):
-            print(
-                colored("Template Check:", attrs=["bold"]),
-                colored(
-                    "failed - No sol tag present in the template. "
-                    "Atleast one sol tag must be present in the template.",
-                    color="red",
-                ),
+            if template_run is None:
+                print(
+                    colored("Template Check:", attrs=["bold"]),
+                    colored(
+                        "failed - No sol tag present in the template. "
+                        "Atleast one sol tag must be present in the template.",
+                        color="red",
+                    ),
+                )
+                return ProqCheck(solution_check=True, template_check=False)
+            # Test template with public and private test cases
+            try:
+                template_test_case_results = await template_run
+            except BuildFailedError:
+                if verbose:
+                    print(
+                        colored("Template Check:", attrs=["bold"]),
+                        colored("passed - build failed", color="green"),
+                    )
+                return ProqCheck(solution_check=True, template_check=True)
+
+            template_passed = any(
+                result.passed for result in template_test_case_results
             )
-            return ProqCheck(solution_check=True, template_check=False)
-        # Test template with public and private test cases
-        try:
-            template_test_case_results = self.get_test_case_results(
-                self.solution.template_code,
-                self.public_test_cases + self.private_test_cases,
+            proq_check = ProqCheck(
+                solution_check=True, template_check=not template_passed
             )
-        except BuildFailedError:
+
             if verbose:
-                print(
-                    colored("Template Check:", attrs=["bold"]),
-                    colored("passed - build failed", color="green"),
+                print_template_check_results(
+                    template_test_case_results[:n_public],
+                    template_test_case_results[n_public:],
+                    proq_check.template_check,
                 )
-            return ProqCheck(solution_check=True, template_check=True)
 
-        template_passed = any(result.passed for result in template_test_case_results)
-        proq_check = ProqCheck(solution_check=True, template_check=not template_passed)
+            return proq_check
+        finally:
+            if template_run is not None:
+                # Stops the template runs which are not needed anymore.
+                template_run.cancel()
+                await asyncio.gather(template_run, return_exceptions=True)
 
-        if verbose:
-            print_template_check_results(
-                template_test_case_results[:n_public],
-                template_test_case_results[n_public:],
-                proq_check.template_check,
-            )
+    def evaluate(self, verbose=False, diff_mode=False, fail_fast=False) -> ProqCheck:
+        return run_sync(
+            self.aevaluate(verbose=verbose, diff_mode=diff_mode, fail_fast=fail_fast)
+        )
 
-        return proq_check
+    async def acorrect_outputs(self, inplace=False) -> Self:
+        """Sets the outputs of the test cases to the outputs of the solution.
 
-    def correct_outputs(self, inplace=False) -> Self:
-        if not inplace:
-            proq = self.model_copy(deep=True)
-        else:
-            proq = self
-        test_cases = proq.public_test_cases + proq.private_test_cases
-        test_case_results = self.get_test_case_results(
+        Raises:
+            CorrectOutputsError: If the solution exceeded a resource limit on
+                a test case, as its output is truncated or partial. No output
+                is changed then.
+        """
+        test_cases = self.public_test_cases + self.private_test_cases
+        test_case_results = await self.aget_test_case_results(
             self.solution.solution_code, test_cases
         )
-        for test_case, test_case_result in zip(test_cases, test_case_results):
-            test_case.output = test_case_result.actual_output
-        return proq
+        n_public = len(self.public_test_cases)
+        for i, test_case_result in enumerate(test_case_results):
+            if test_case_result.exit_status in EXIT_STATUS_VERDICTS:
+                kind, number = (
+                    ("public", i + 1) if i < n_public else ("private", i - n_public + 1)
+                )
+                raise CorrectOutputsError(
+                    f"The solution got the {test_case_result.verdict} verdict on "
+                    f"{kind} test case {number}, the outputs are not corrected."
+                )
+        outputs = [
+            test_case_result.actual_output for test_case_result in test_case_results
+        ]
+        if inplace:
+            for test_case, output in zip(test_cases, outputs):
+                test_case.output = output
+            return self
+        corrected = [
+            TestCase(input=test_case.input, output=output)
+            for test_case, output in zip(test_cases, outputs)
+        ]
+        # The test case lists are replaced by the corrected ones instead of
+        # being deep copied along with the rest of the proq.
+        memo = {
+            id(self.public_test_cases): corrected[:n_public],
+            id(self.private_test_cases): corrected[n_public:],
+        }
+        return copy.deepcopy(self, memo)
+
+    def correct_outputs(self, inplace=False) -> Self:
+        return run_sync(self.acorrect_outputs(inplace=inplace))
 
     def export_test_cases(self, output_dir, zip=False):
         if output_dir.exists():
@@ -334,6 +501,158 @@ class ProQ(BaseModel):
             shutil.rmtree(output_dir)
 
 
+def load_proq(
+    content: str, base: str, render_template: bool, dependencies: dict | None = None
+) -> ProQ:
+    """Parses the content of a proq file using the parsed proq cache if enabled.
+
+    Args:
+        content (str): The content of the proq file.
+        base (str): The directory the jinja includes are relative to.
+        render_template (bool): Whether to render the sections as jinja templates.
+        dependencies (dict|None): Records the hash of each file included
+            while rendering by its name.
+    """
+    if not parse_caching_enabled():
+        return ProQ.from_str(content, base, render_template, dependencies)
+    key = hash_key(
+        get_proqtor_version(), str(render_template), os.path.abspath(base), content
+    )
+    with span("cache"):
+        cached = get_cached_proq(key, base)
+    if cached is not None:
+        proq, cached_dependencies = cached
+        if dependencies is not None:
+            dependencies.update(cached_dependencies)
+        return proq
+    if dependencies is None:
+        dependencies = {}
+    proq = ProQ.from_str(content, base, render_template, dependencies)
+    cache_proq(key, proq, dependencies)
+    return proq
+
+
+class CachedProq(BaseModel):
+    """A parsed proq along with the hashes of the files included while rendering."""
+
+    dependencies: dict[str, str | None]
+    proq: ProQ
+
+
+def get_cached_proq(key: str, base: str) -> tuple[ProQ, dict] | None:
+    """Returns the cached proq and its dependencies unless an included file changed."""
+    entry = proq_cache.get(key)
+    if entry is None:
+        return None
+    try:
+        # Validated straight from the json, which is faster than validating
+        # the parsed json or building the models without validation.
+        cached = CachedProq.model_validate_json((entry / "proq.json").read_bytes())
+    except (OSError, ValueError):
+        return None
+    for template, template_hash in cached.dependencies.items():
+        if get_template_hash(base, template) != template_hash:
+            # To be replaced by the proq parsed with the changed includes.
+            proq_cache.remove(key)
+            return None
+    return cached.proq, cached.dependencies
+
+
+def get_dependency_paths(proq_file, dependencies: dict) -> list[str]:
+    """Returns the paths of the files recorded as included by the proq file."""
+    base = os.path.dirname(proq_file)
+    return [os.path.normpath(os.path.join(base, name)) for name in dependencies]
+
+
+def get_proq_dependencies(proq_file) -> list[str]:
+    """Returns the paths of the files included by the proq file while rendering.
+
+    The files included by the included files are listed as well.
+    """
+    dependencies = {}
+    ProQ.from_file(proq_file, dependencies=dependencies)
+    return get_dependency_paths(proq_file, dependencies)
+
+
+def cache_proq(key: str, proq: ProQ, dependencies: dict):
+    cached = CachedProq(dependencies=dependencies, proq=proq)
+    proq_cache.put(
+        key,
+        # The unset fields are left out so that they are unset when loaded.
+        lambda entry: (entry / "proq.json").write_text(
+            cached.model_dump_json(exclude_unset=True)
+        ),
+    )
+
+
+class LazyProQ:
+    """A proq file of which only the front matter is parsed when loaded.
+
+    The whole proq is parsed on the first access of any other attribute,
+    which are then looked up in the parsed `ProQ`.
+    """
+
+    def __init__(self, proq_file, render_template=True):
+        if not os.path.isfile(proq_file):
+            raise FileNotFoundError(f"File {proq_file} does not exists.")
+        self.proq_file = proq_file
+        self.render_template = render_template
+        with span("read", file=str(proq_file)), open(proq_file) as f:
+            self._content = f.read()
+        yaml_header, self._md_string = split_front_matter(self._content)
+        self.front_matter = FrontMatter.model_validate(yaml_header)
+
+    @property
+    def title(self) -> str | None:
+        title = self.front_matter.title
+        return title if title is None else normalize_title(title)
+
+    @property
+    def tags(self) -> list[str]:
+        return self.front_matter.tags or []
+
+    @cached_property
+    def proq(self) -> ProQ:
+        return load_proq(
+            self._content, os.path.dirname(self.proq_file), self.render_template
+        )
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.proq, name)
+
+    def count_test_cases(self) -> tuple[int, int]:
+        """Returns the number of public and private test cases.
+
+        Unless the proq is parsed already, the test cases are counted in the
+        scanned sections without parsing the rest of the proq. The proq is
+        parsed if the test cases are rendered from jinja templates.
+        """
+        if "proq" not in self.__dict__:
+            try:
+                sections = {
+                    heading.title(): (start, end, blocks)
+                    for heading, start, end, blocks in scan_markdown(
+                        self._md_string, level=1
+                    )[1:]
+                }
+            except UnsupportedMarkdownError:
+                sections = {}
+            counts = []
+            for heading in TEST_CASE_HEADINGS:
+                start, end, blocks = sections.get(heading, (0, 0, None))
+                text = self._md_string[start:end]
+                if blocks is None or (
+                    self.render_template and has_template_syntax(text)
+                ):
+                    break
+                counts.append(len(extract_test_cases(text, blocks)))
+            else:
+                return tuple(counts)
+        return len(self.public_test_cases), len(self.private_test_cases)
+
+
 DataT = TypeVar("DataT")
 
 
@@ -342,23 +661,82 @@ class NestedContent(BaseModel, Generic[DataT]):
     content: list["NestedContent[DataT]"] | DataT
 
 
-def load_nested_proq_from_file(yaml_file) -> NestedContent[ProQ]:
-    """Loads a nested content structure with proqs at leaf nodes."""
+def read_nested_proq_files(yaml_file) -> NestedContent[str | ProQ]:
+    """Reads a nested proq set with its proq files resolved relative to it."""
     with open(yaml_file) as f:
         nested_proq_files = NestedContent[str | ProQ].model_validate(yaml.safe_load(f))
+    base = os.path.dirname(os.path.abspath(yaml_file))
+    for leaf in iter_nested_leaves(nested_proq_files):
+        if isinstance(leaf.content, str):
+            leaf.content = os.path.normpath(os.path.join(base, leaf.content))
+    return nested_proq_files
+
+
+def iter_nested_leaves(nested_content: NestedContent) -> Iterator[NestedContent]:
+    """Yields the leaf nodes of the nested content in order."""
+    if isinstance(nested_content.content, list):
+        for content in nested_content.content:
+            yield from iter_nested_leaves(content)
+    else:
+        yield nested_content
+
+
+def get_nested_proq_files(nested_proq_files: NestedContent[str | ProQ]) -> list[str]:
+    """Returns the unique proq files at the leaves in the order they first appear."""
+    return list(
+        dict.fromkeys(
+            leaf.content
+            for leaf in iter_nested_leaves(nested_proq_files)
+            if isinstance(leaf.content, str)
+        )
+    )
 
-    def load_nested_proq_files(nested_proq_files: NestedContent[str]):
-        """Loads the nested Proqs inplace recursively."""
-        if isinstance(nested_proq_files.content, str):
-            nested_proq_files.content = ProQ.from_file(
-                os.path.join(
-                    os.path.dirname(os.path.abspath(yaml_file)),
-                    nested_proq_files.content,
-                )
+
+def load_proq_files(proq_files: list[str], jobs: int = 1) -> list[ProQ]:
+    """Parses the proq files in `jobs` worker processes.
+
+    Non-positive `jobs` use the number of CPUs. The files are parsed in this
+    process when there is one job, as the parsing does not release the GIL.
+    """
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(proq_files))
+    if jobs <= 1:
+        return [ProQ.from_file(proq_file) for proq_file in proq_files]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(
+            executor.map(
+                ProQ.from_file,
+                proq_files,
+                chunksize=max(1, len(proq_files) // (4 * jobs)),
             )
-        else:
-            for content in nested_proq_files.content:
-                load_nested_proq_files(content)
+        )
+
 
-    load_nested_proq_files(nested_proq_files)
-    return NestedContent[ProQ].model_validate(nested_proq_files.model_dump())
+def load_nested_proq_from_file(yaml_file, jobs: int = 1) -> NestedContent[ProQ]:
+    """Loads a nested content structure with proqs at leaf nodes.
+
+    All the proq files are resolved first and each file is parsed once, so
+    the leaves of a file which is in several sections share its `ProQ`.
+
+    Args:
+        yaml_file (str|PathLike): The yaml file of the nested proq set.
+        jobs (int): Number of processes parsing the proq files, see
+            `load_proq_files`.
+    """
+    nested_proq_files = read_nested_proq_files(yaml_file)
+    proq_files = get_nested_proq_files(nested_proq_files)
+    proqs = dict(zip(proq_files, load_proq_files(proq_files, jobs)))
+
+    def build_nested_proq(
+        nested_proq_file: NestedContent[str | ProQ],
+    ) -> NestedContent[ProQ]:
+        content = nested_proq_file.content
+        if isinstance(content, str):
+            content = proqs[content]
+        elif isinstance(content, list):
+            content = [build_nested_proq(child) for child in content]
+        # The built nodes and proqs are not copied while validating.
+        return NestedContent[ProQ](title=nested_proq_file.title, content=content)
+
+    return build_nested_proq(nested_proq_files)
@@ -2,12 +2,15 @@ import difflib
 import warnings
 from functools import cached_property
 from importlib.resources import files
+from typing import Literal
 
-from pydantic import AliasChoices, BaseModel, Field, computed_field
+from pydantic import AliasChoices, BaseModel, Field, computed_field, field_validator
 
-from .parse import extract_solution, remove_tags, strip_tags
+from .execute_utils import DEFAULT_OUTPUT_LIMIT, ResourceLimits
+from .parse import extract_solution, split_tagged_template
 from .prog_langs import ProgLang
 from .template_utils import package_env
+from .utils import parse_size
 
 lang_default_files = files("proqtor.templates.lang_defaults")
 solution_template = package_env.get_template("solution.md.jinja")
@@ -31,6 +34,51 @@ class ExecuteConfig(BaseModel):
     source_filename: str | None = ""
     build: str | None = ""
     run: str | None = ""
+    timeout: float | None = Field(
+        default=None, gt=0, description="Wall clock time limit of a test case run."
+    )
+    cpu_time: float | None = Field(
+        default=None, gt=0, description="CPU time limit of a test case run."
+    )
+    memory_limit: int | str | None = Field(
+        default=None,
+        description="Address space limit of a test case run in bytes "
+        "or with a K, M or G suffix.",
+    )
+    output_limit: int | str | None = Field(
+        default=None,
+        description="Limit of the combined size of stdout and stderr of a test case "
+        "run in bytes or with a K, M or G suffix. Defaults to 8M.",
+    )
+    weight: int = Field(
+        default=1,
+        ge=1,
+        description="The number of execution slots each process of the proq occupies.",
+    )
+    executor: Literal["subprocess", "fork", "batch"] | None = Field(
+        default=None,
+        description="How the test cases are run. "
+        "`fork` runs python sources by forking a pre-warmed interpreter, "
+        "`batch` runs all the test cases of a python source in one interpreter.",
+    )
+
+    @field_validator("memory_limit", "output_limit")
+    @classmethod
+    def check_size(cls, size):
+        if size is not None:
+            parse_size(size)
+        return size
+
+    @property
+    def limits(self) -> ResourceLimits:
+        return ResourceLimits(
+            timeout=self.timeout,
+            cpu_time=self.cpu_time,
+            memory=None if self.memory_limit is None else parse_size(self.memory_limit),
+            output=DEFAULT_OUTPUT_LIMIT
+            if self.output_limit is None
+            else parse_size(self.output_limit),
+        )
 
 
 class Solution(BaseModel):
@@ -64,25 +112,19 @@ class Solution(BaseModel):
     @cached_property
     def solution(self) -> str:
         """Template code between prefix and suffix extracted from tagged_template."""
-        return strip_tags(
-            remove_tags(self.tagged_template, ["los"]), ["sol", "solution"]
-        )
+        return split_tagged_template(self.tagged_template).solution
 
     @computed_field
     @cached_property
     def template(self) -> str:
         """The solution code to replace template extracted from tagged_template."""
-        return strip_tags(
-            remove_tags(self.tagged_template, ["solution", "sol"]), ["los"]
-        )
+        return split_tagged_template(self.tagged_template).template
 
     def __setattr__(self, name, value):
         if name == "tagged_template":
             # Cache invalidation
-            if hasattr(self, "solution"):
-                del self.solution
-            if hasattr(self, "template"):
-                del self.template
+            self.__dict__.pop("solution", None)
+            self.__dict__.pop("template", None)
         return super().__setattr__(name, value)
 
     def prefix_suffix_join(self, code):
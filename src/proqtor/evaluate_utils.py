@@ -1,71 +1,275 @@
+import asyncio
+import json
 import os
+import shutil
 from collections import namedtuple
 from contextlib import contextmanager
 from pathlib import Path
-from tempfile import TemporaryDirectory
 from typing import Literal
 
+from strenum import StrEnum
 from termcolor import colored, cprint
 
+from .batch_runner import run_batch
+from .cache_utils import build_cache, hash_key, result_cache, runtime_fingerprint
 from .core_components import TestCase
-from .execute_utils import CommandFailedError, get_command_output, get_outputs
-from .utils import color_diff
+from .execute_utils import (
+    CommandFailedError,
+    CommandResult,
+    ExitStatus,
+    ResourceLimits,
+    ResourceUsage,
+    aget_command_output,
+    aget_results,
+    get_results,
+)
+from .fork_server import ForkServer
+from .profile_utils import span
+from .utils import color_diff, format_size, head_and_tail, run_sync
+from .workspace_utils import workspace_pool
 
 ProqCheck = namedtuple("ProqCheck", ["solution_check", "template_check"])
 
+
+class Verdict(StrEnum):
+    PASSED = "passed"
+    FAILED = "failed"
+    TIMEOUT = "timeout"
+    MEMORY = "memory"
+    OUTPUT_LIMIT = "output_limit"
+    SKIPPED = "skipped"
+
+
 TestCaseResult = namedtuple(
-    "TestCaseResult", ["input", "expected_output", "actual_output", "passed"]
+    "TestCaseResult",
+    [
+        "input",
+        "expected_output",
+        "actual_output",
+        "passed",
+        "verdict",
+        "cached",
+        "returncode",
+        "exit_status",
+        "usage",
+    ],
+    defaults=[None, False, None, None, None],
 )
 
+EXIT_STATUS_VERDICTS = {
+    ExitStatus.TIMEOUT: Verdict.TIMEOUT,
+    ExitStatus.MEMORY: Verdict.MEMORY,
+    ExitStatus.OUTPUT: Verdict.OUTPUT_LIMIT,
+}
+
 
 class BuildFailedError(CommandFailedError):
     pass
 
 
+def get_test_case_result(
+    command_result: CommandResult, test_case: TestCase, cached=False
+) -> TestCaseResult:
+    with span("compare"):
+        actual_output = command_result.output.replace("\r", "")
+        expected_output = test_case.output.replace("\r", "")
+        if command_result.status in EXIT_STATUS_VERDICTS:
+            passed = False
+            verdict = EXIT_STATUS_VERDICTS[command_result.status]
+        else:
+            passed = actual_output.strip() == expected_output.strip()
+            verdict = Verdict.PASSED if passed else Verdict.FAILED
+    return TestCaseResult(
+        test_case.input,
+        expected_output,
+        actual_output,
+        passed,
+        verdict,
+        cached,
+        command_result.returncode,
+        command_result.status,
+        command_result.usage,
+    )
+
+
+def get_skipped_result(test_case: TestCase) -> TestCaseResult:
+    """The result of a test case not run as the evaluation stopped early."""
+    return TestCaseResult(
+        test_case.input, test_case.output.replace("\r", ""), "", False, Verdict.SKIPPED
+    )
+
+
 def check_test_cases(
     run_command: str,
     test_cases: list[TestCase],
+    limits: ResourceLimits = ResourceLimits(),
+    weight: int = 1,
 ):
-    actual_outputs = get_outputs(
-        run_command, [test_case.input for test_case in test_cases]
+    command_results = get_results(
+        run_command,
+        [test_case.input for test_case in test_cases],
+        limits=limits,
+        weight=weight,
     )
-    results = []
-    for actual_output, testcase in zip(actual_outputs, test_cases):
-        actual_output = actual_output.replace("\r", "")
-        expected_output = testcase.output.replace("\r", "")
-        passed = actual_output.strip() == expected_output.strip()
-        results.append(
-            TestCaseResult(testcase.input, expected_output, actual_output, passed)
+    return [
+        get_test_case_result(command_result, test_case)
+        for command_result, test_case in zip(command_results, test_cases)
+    ]
+
+
+def get_cached_result(run_key, stdin) -> CommandResult | None:
+    entry = result_cache.get(hash_key(run_key, stdin))
+    if entry is None:
+        return None
+    try:
+        # The results cached before the resource usage was recorded have none.
+        output, returncode, status, *usage = json.loads(
+            (entry / "result.json").read_text()
         )
-    return results
+    except (OSError, ValueError):
+        return None
+    usage = ResourceUsage(*usage[0]) if usage and usage[0] else None
+    return CommandResult(output, returncode, ExitStatus(status), usage)
+
+
+def cache_result(run_key, stdin, command_result: CommandResult):
+    # Timeouts depend on the load of the machine.
+    if command_result.status == ExitStatus.TIMEOUT:
+        return
+    result_cache.put(
+        hash_key(run_key, stdin),
+        lambda entry: (entry / "result.json").write_text(
+            json.dumps(list(command_result))
+        ),
+    )
 
 
 @contextmanager
 def code_run_env(code, source_filename):
-    """Writes the code in the source file in a tempdir and changes to that dir.
+    """Writes the code in the source file in an empty workspace from the pool.
+
+    The working directory of the process is not changed, the commands are
+    run with the workspace as their working directory.
 
     Args:
         code (str): The source code toe be written.
         source_filename (str): The filename to use to write the source code.
+
+    Yields:
+        workspace (str): The path of the workspace directory.
     """
-    curdir = os.path.abspath(os.curdir)
-    with TemporaryDirectory() as tempdirname:
-        os.chdir(tempdirname)
+    with workspace_pool.workspace() as workspace:
+        Path(workspace, source_filename).write_text(code)
         try:
-            Path(source_filename).write_text(code)
-            yield
+            yield str(workspace)
         except CommandFailedError as e:
             raise BuildFailedError(e.command_output)
-        finally:
-            os.chdir(curdir)
 
 
-def get_test_case_results(
+async def abuild(code, source_filename, build_command, workspace, weight=1):
+    """Builds the code in the workspace reusing the cached build artifacts.
+
+    The files created by the build command are cached by the code, the
+    source file name, the build command and the build executable. On a cache
+    hit the cached files are copied into the workspace instead of building,
+    so that a run changing them does not change the cached files.
+
+    Raises:
+        CommandFailedError: if the build command fails.
+    """
+    key = hash_key(
+        code, source_filename, build_command, runtime_fingerprint(build_command)
+    )
+    entry = build_cache.get(key)
+    if entry is not None:
+        try:
+            shutil.copytree(
+                entry / "artifacts", workspace, dirs_exist_ok=True, symlinks=True
+            )
+            return
+        except OSError:
+            pass
+    await aget_command_output(
+        build_command, raise_on_fail=True, weight=weight, cwd=workspace
+    )
+
+    source_path = os.path.abspath(os.path.join(workspace, source_filename))
+
+    def ignore_source(directory, names):
+        return [
+            name
+            for name in names
+            if os.path.abspath(os.path.join(directory, name)) == source_path
+        ]
+
+    def fill(entry):
+        shutil.copytree(
+            workspace, entry / "artifacts", ignore=ignore_source, symlinks=True
+        )
+
+    build_cache.put(key, fill)
+
+
+async def arun_test_cases(
+    run_command,
+    stdins,
+    source_filename,
+    workspace,
+    limits=ResourceLimits(),
+    weight=1,
+    executor=None,
+    stop=None,
+) -> list[CommandResult | None]:
+    """Runs the command for each stdin in the workspace with the executor.
+
+    The fork and batch executors fall back to subprocesses for the commands
+    they can not run. See `execute_utils.aget_results` for `stop`.
+    """
+    if executor == "batch":
+        # The batch runs the test cases one after another in a worker thread.
+        results = await asyncio.to_thread(
+            run_batch,
+            run_command,
+            source_filename,
+            stdins,
+            limits,
+            weight,
+            workspace,
+            stop,
+        )
+        if results is not None:
+            return results
+    fork_server = None
+    if executor == "fork":
+        with span("spawn", command=run_command, executor="fork"):
+            fork_server = await asyncio.to_thread(
+                ForkServer.start, run_command, source_filename, workspace
+            )
+    if fork_server is None:
+        return await aget_results(
+            run_command, stdins, limits=limits, weight=weight, cwd=workspace, stop=stop
+        )
+    with fork_server:
+        return await aget_results(
+            run_command,
+            stdins,
+            limits=limits,
+            weight=weight,
+            runner=fork_server.arun_command,
+            stop=stop,
+        )
+
+
+async def aget_test_case_results(
     code,
     test_cases,
     source_filename,
     run_command,
     build_command=None,
+    limits=ResourceLimits(),
+    weight=1,
+    executor=None,
+    stop_on=None,
 ) -> list[TestCaseResult]:
     """Returns the test case results after evaluating the test cases.
 
@@ -75,6 +279,13 @@ def get_test_case_results(
         source_filename (str): The file name of the file to run.
         run_command (str): The command to run the code.
         build_command (str): The build command to build or compile the code.
+        limits (ResourceLimits): The resource limits of each test case run.
+        weight (int): The number of execution slots each process occupies.
+        executor (str): How the test cases are run, "subprocess" (default),
+            "fork" or "batch".
+        stop_on (Callable[[TestCaseResult], bool]|None): The evaluation stops
+            at the first result for which it returns True. The test cases
+            not run are skipped.
 
     Returns:
         results (list[TestCaseResult]): The list of test case results.
@@ -82,10 +293,101 @@ def get_test_case_results(
     Raises:
         BuildFailedError:  if the build process fails.
     """
-    with code_run_env(code, source_filename=source_filename):
-        if build_command:
-            get_command_output(build_command, raise_on_fail=True)
-        return check_test_cases(run_command, test_cases)
+    # The results of unchanged code on unchanged inputs are reused.
+    run_key = hash_key(
+        code,
+        source_filename,
+        run_command,
+        build_command,
+        runtime_fingerprint(run_command),
+        runtime_fingerprint(build_command),
+        repr(tuple(limits)),
+    )
+    command_results = [
+        get_cached_result(run_key, test_case.input) for test_case in test_cases
+    ]
+    missing = [i for i, result in enumerate(command_results) if result is None]
+
+    def stop(i, command_result):
+        return stop_on(get_test_case_result(command_result, test_cases[missing[i]]))
+
+    if stop_on is not None and any(
+        stop_on(get_test_case_result(command_result, test_case))
+        for command_result, test_case in zip(command_results, test_cases)
+        if command_result is not None
+    ):
+        missing_results = [None] * len(missing)
+    elif missing:
+        with code_run_env(code, source_filename) as workspace:
+            if build_command:
+                with span("build", command=build_command):
+                    await abuild(
+                        code, source_filename, build_command, workspace, weight
+                    )
+            missing_results = await arun_test_cases(
+                run_command,
+                [test_cases[i].input for i in missing],
+                source_filename,
+                workspace,
+                limits=limits,
+                weight=weight,
+                executor=executor,
+                stop=None if stop_on is None else stop,
+            )
+    else:
+        missing_results = []
+    for i, command_result in zip(missing, missing_results):
+        command_results[i] = command_result
+        if command_result is not None:
+            cache_result(run_key, test_cases[i].input, command_result)
+    missing = set(missing)
+    return [
+        get_skipped_result(test_case)
+        if command_result is None
+        else get_test_case_result(command_result, test_case, cached=i not in missing)
+        for i, (command_result, test_case) in enumerate(
+            zip(command_results, test_cases)
+        )
+    ]
+
+
+def get_test_case_results(
+    code,
+    test_cases,
+    source_filename,
+    run_command,
+    build_command=None,
+    limits=ResourceLimits(),
+    weight=1,
+    executor=None,
+    stop_on=None,
+) -> list[TestCaseResult]:
+    """Returns the test case results, see `aget_test_case_results`."""
+    return run_sync(
+        aget_test_case_results(
+            code,
+            test_cases,
+            source_filename,
+            run_command,
+            build_command,
+            limits,
+            weight,
+            executor,
+            stop_on,
+        )
+    )
+
+
+VERDICT_LABELS = {
+    Verdict.TIMEOUT: "Time Limit Exceeded",
+    Verdict.MEMORY: "Memory Limit Exceeded",
+    Verdict.OUTPUT_LIMIT: "Output Limit Exceeded",
+}
+
+# The number of lines shown from the head and the tail of a long output.
+DISPLAY_LINES = 50
+# The number of test cases shown as the slowest and the heaviest.
+TOP_USAGE_CASES = 3
 
 
 def print_failed_test_cases(
@@ -96,18 +398,23 @@ def print_failed_test_cases(
     test_case_type = test_case_type.title()
     cprint(f"{test_case_type} Test Cases:", attrs=["bold"])
     for i, result in enumerate(test_case_results, 1):
-        if not result.passed:
-            cprint(f"{test_case_type} Test Case {i}: Failed", "red", attrs=["bold"])
+        if result.verdict == Verdict.SKIPPED:
+            cprint(f"{test_case_type} Test Case {i}: Skipped", "grey", attrs=["bold"])
+        elif not result.passed:
+            status = VERDICT_LABELS.get(result.verdict, "Failed")
+            cprint(f"{test_case_type} Test Case {i}: {status}", "red", attrs=["bold"])
             cprint("Input:", "cyan", attrs=["bold"])
-            print(result.input.strip())
+            print(head_and_tail(result.input.strip(), DISPLAY_LINES))
+            expected_output = head_and_tail(result.expected_output, DISPLAY_LINES)
+            actual_output = head_and_tail(result.actual_output, DISPLAY_LINES)
             if not diff_mode:
                 cprint("Expected Output:", "cyan", attrs=["bold"])
-                print(result.expected_output)
+                print(expected_output)
                 cprint("Actual Output:", "cyan", attrs=["bold"])
-                print(result.actual_output or "{{NO OUPUT}}")
+                print(actual_output or "{{NO OUPUT}}")
             else:
                 cprint("Expected - Actual Diff:", "cyan", attrs=["bold"])
-                color_diff(result.expected_output, result.actual_output)
+                color_diff(expected_output, actual_output)
                 print()
 
 
@@ -115,6 +422,10 @@ def count_passed(results: list[TestCaseResult]):
     return sum(map(lambda x: x.passed, results))
 
 
+def count_cached(results: list[TestCaseResult]):
+    return sum(map(lambda x: x.cached, results))
+
+
 def get_passed(results: list[TestCaseResult]):
     return [i for i, result in enumerate(results, 1) if result.passed]
 
@@ -144,10 +455,52 @@ def print_solution_check_results(
         "red" if public_passed < n_public else "green",
         end="\t",
     )
+    n_cached = count_cached(public_test_cases) + count_cached(private_test_cases)
     cprint(
         f"{private_passed}/{n_private} private test cases passed",
         "red" if private_passed < n_private else "green",
+        end="\t" if n_cached else "\n",
     )
+    if n_cached:
+        cprint(f"{n_cached}/{n_public + n_private} cached", "grey")
+    print_resource_usage(public_test_cases, private_test_cases)
+
+
+def print_resource_usage(public_test_cases, private_test_cases, n=TOP_USAGE_CASES):
+    """Prints the test cases which took the most time and the most memory."""
+    usages = [
+        (f"{test_case_type} {i}", result.usage)
+        for test_case_type, results in [
+            ("public", public_test_cases),
+            ("private", private_test_cases),
+        ]
+        for i, result in enumerate(results, 1)
+        if result.usage is not None
+    ]
+    if not usages:
+        return
+    slowest = sorted(usages, key=lambda x: x[1].wall_time, reverse=True)[:n]
+    cprint("Slowest Test Cases: ", attrs=["bold"], end="")
+    print(
+        ", ".join(
+            f"{label} ({usage.wall_time:.3f}s wall"
+            + ("" if usage.cpu_time is None else f", {usage.cpu_time:.3f}s cpu")
+            + ")"
+            for label, usage in slowest
+        )
+    )
+    heaviest = sorted(
+        (x for x in usages if x[1].max_rss is not None),
+        key=lambda x: x[1].max_rss,
+        reverse=True,
+    )[:n]
+    if heaviest:
+        cprint("Heaviest Test Cases: ", attrs=["bold"], end="")
+        print(
+            ", ".join(
+                f"{label} ({format_size(usage.max_rss)})" for label, usage in heaviest
+            )
+        )
 
 
 def print_template_check_results(public_test_cases, private_test_cases, template_check):
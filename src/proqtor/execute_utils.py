@@ -1,6 +1,81 @@
+import asyncio
+import locale
+import math
+import os
+import signal
 import subprocess
-from concurrent.futures import ThreadPoolExecutor
-from itertools import repeat
+import threading
+import time
+import warnings
+from collections import OrderedDict, deque, namedtuple
+from contextlib import asynccontextmanager, contextmanager, suppress
+
+from strenum import StrEnum
+
+from .profile_utils import span
+from .python_harness import max_rss_bytes
+from .utils import run_sync
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on windows
+    resource = None
+
+MAX_PROCS_ENV = "PROQ_MAX_PROCS"
+
+DEFAULT_OUTPUT_LIMIT = 8 * 1024**2
+# The size of the head and the tail kept from an output over the limit.
+OUTPUT_KEEP_SIZE = 4 * 1024
+
+# Messages printed by the common runtimes when an allocation fails.
+OUT_OF_MEMORY_MARKERS = (
+    "MemoryError",
+    "java.lang.OutOfMemoryError",
+    "std::bad_alloc",
+    "Cannot allocate memory",
+    "out of memory",
+)
+# The fraction of the memory limit a failed process has to use to be taken as
+# out of memory when it does not print an out of memory error.
+MEMORY_LIMIT_RATIO = 0.9
+
+
+class ExitStatus(StrEnum):
+    OK = "ok"
+    ERROR = "error"
+    TIMEOUT = "timeout"
+    MEMORY = "memory"
+    OUTPUT = "output"
+
+
+ResourceLimits = namedtuple(
+    "ResourceLimits",
+    ["timeout", "cpu_time", "memory", "output"],
+    defaults=[None, None, None, None],
+)
+ResourceLimits.__doc__ = """Limits applied to a child process.
+
+Attributes:
+    timeout (float|None): Wall clock time limit in seconds.
+    cpu_time (float|None): CPU time limit in seconds.
+    memory (int|None): Address space limit in bytes.
+    output (int|None): Limit of the combined size of stdout and stderr in bytes.
+"""
+
+ResourceUsage = namedtuple(
+    "ResourceUsage", ["wall_time", "cpu_time", "max_rss"], defaults=[None, None]
+)
+ResourceUsage.__doc__ = """Resources used by a child process.
+
+Attributes:
+    wall_time (float): Wall clock time in seconds.
+    cpu_time (float|None): User and system CPU time in seconds.
+    max_rss (int|None): Peak resident set size in bytes.
+"""
+
+CommandResult = namedtuple(
+    "CommandResult", ["output", "returncode", "status", "usage"], defaults=[None]
+)
 
 
 class CommandFailedError(Exception):
@@ -15,13 +90,550 @@ class CommandFailedError(Exception):
         self.command_output = command_output
 
 
-def get_command_output(command: str, stdin: str = "", raise_on_fail: bool = False):
+def default_max_concurrency():
+    if os.environ.get(MAX_PROCS_ENV):
+        try:
+            return max(1, int(os.environ[MAX_PROCS_ENV]))
+        except ValueError:
+            warnings.warn(
+                f"Ignoring invalid {MAX_PROCS_ENV}={os.environ[MAX_PROCS_ENV]!r}. "
+                "Using the number of CPUs.",
+                stacklevel=2,
+            )
+    return os.cpu_count() or 1
+
+
+class ExecutionScheduler:
+    """Limits the number of child processes running at the same time.
+
+    Each child process occupies `weight` slots out of `max_concurrency`.
+    Waiting requests are grouped (eg. the test cases of one run) and the
+    groups are served in a round robin manner so that a run with many test
+    cases does not starve the other runs. Within a group requests are served
+    in the order they arrive.
+    """
+
+    def __init__(self, max_concurrency: int | None = None):
+        self._lock = threading.Lock()
+        self._waiters: OrderedDict[object, deque] = OrderedDict()
+        self._max_concurrency = max_concurrency or default_max_concurrency()
+        self._in_use = 0
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._max_concurrency
+
+    @max_concurrency.setter
+    def max_concurrency(self, value: int):
+        with self._lock:
+            self._max_concurrency = max(1, value)
+            self._wake_waiters()
+
+    def _fits(self, weight):
+        # A weight larger than the limit runs alone instead of never running.
+        return self._in_use == 0 or self._in_use + weight <= self._max_concurrency
+
+    def _wake_waiters(self):
+        while self._waiters:
+            group, waiters = next(iter(self._waiters.items()))
+            weight, wake = waiters[0]
+            if not self._fits(weight):
+                return
+            waiters.popleft()
+            # The served group goes to the back of the line.
+            del self._waiters[group]
+            if waiters:
+                self._waiters[group] = waiters
+            self._in_use += weight
+            wake()
+
+    def _try_acquire(self, weight, group, wake):
+        """Acquires the slots or queues the waiter, returns whether acquired."""
+        with self._lock:
+            if not self._waiters and self._fits(weight):
+                self._in_use += weight
+                return True
+            self._waiters.setdefault(group, deque()).append((weight, wake))
+            return False
+
+    def acquire(self, weight: int = 1, group: object = None):
+        event = threading.Event()
+        if not self._try_acquire(weight, group, event.set):
+            event.wait()
+
+    async def aacquire(self, weight: int = 1, group: object = None):
+        """Same as `acquire` but waits without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def set_result():
+            if not future.done():
+                future.set_result(None)
+
+        def wake():
+            loop.call_soon_threadsafe(set_result)
+
+        if self._try_acquire(weight, group, wake):
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                waiters = self._waiters.get(group)
+                queued = waiters is not None and (weight, wake) in waiters
+                if queued:
+                    waiters.remove((weight, wake))
+                    if not waiters:
+                        del self._waiters[group]
+            if not queued:
+                # The slots were acquired in the meantime.
+                self.release(weight)
+            raise
+
+    def release(self, weight: int = 1):
+        with self._lock:
+            self._in_use -= weight
+            self._wake_waiters()
+
+    @contextmanager
+    def slot(self, weight: int = 1, group: object = None):
+        """Holds `weight` slots of the scheduler within the context."""
+        self.acquire(weight, group)
+        try:
+            yield
+        finally:
+            self.release(weight)
+
+    @asynccontextmanager
+    async def aslot(self, weight: int = 1, group: object = None):
+        """Same as `slot` but waits without blocking the event loop."""
+        await self.aacquire(weight, group)
+        try:
+            yield
+        finally:
+            self.release(weight)
+
+
+scheduler = ExecutionScheduler()
+
+
+def set_max_concurrency(max_concurrency: int):
+    """Sets the maximum number of child processes run at the same time."""
+    scheduler.max_concurrency = max_concurrency
+
+
+def limit_args(limits: ResourceLimits) -> list[str]:
+    """Returns the arguments prefixed to a command to apply the limits to it.
+
+    The CPU time and memory limits are set with `ulimit` in a shell which then
+    execs the command, so that they apply from the start of the command. A
+    `preexec_fn` is not safe to use in a process with threads, and `prlimit`
+    after the spawn would let the command run without the limits for a while.
+    """
+    steps = []
+    if limits.cpu_time is not None:
+        cpu_time = math.ceil(limits.cpu_time)
+        # SIGXCPU is sent on the soft limit and SIGKILL on the hard limit.
+        steps += [f"ulimit -t {cpu_time + 1}", f"ulimit -S -t {cpu_time}"]
+    if limits.memory is not None:
+        steps.append(f"ulimit -v {limits.memory // 1024}")
+    if not steps:
+        return []
+    if os.name != "posix":  # pragma: no cover - windows
+        warnings.warn(
+            "The CPU time and memory limits are not supported on this platform.",
+            stacklevel=2,
+        )
+        return []
+    return ["/bin/sh", "-c", " && ".join([*steps, 'exec "$@"']), "sh"]
+
+
+def kill_process_tree(process: subprocess.Popen):
+    """Kills the process and every process in its process group."""
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:  # pragma: no cover - windows
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def get_exit_status(
+    returncode,
+    stderr,
+    limits: ResourceLimits,
+    usage: ResourceUsage | None = None,
+    timed_out=False,
+    output_exceeded=False,
+):
+    """Returns the exit status of a process from how it exited.
+
+    A process killed with SIGKILL has only exceeded the CPU time limit if it
+    used up the CPU time, else it was killed by the out of memory killer or
+    by another process. A failed process has only exceeded the memory limit
+    if it printed an out of memory error or its peak memory use was close to
+    the limit.
+    """
+    if output_exceeded:
+        return ExitStatus.OUTPUT
+    cpu_time_exceeded = (
+        limits.cpu_time is not None
+        and usage is not None
+        and usage.cpu_time is not None
+        and usage.cpu_time >= limits.cpu_time
+    )
+    if (
+        timed_out
+        or returncode == -getattr(signal, "SIGXCPU", signal.SIGTERM)
+        or (cpu_time_exceeded and returncode == -signal.SIGKILL)
+    ):
+        return ExitStatus.TIMEOUT
+    if returncode == 0:
+        return ExitStatus.OK
+    if limits.memory is not None and (
+        any(marker in stderr for marker in OUT_OF_MEMORY_MARKERS)
+        or (
+            usage is not None
+            and usage.max_rss is not None
+            and usage.max_rss >= MEMORY_LIMIT_RATIO * limits.memory
+        )
+    ):
+        return ExitStatus.MEMORY
+    return ExitStatus.ERROR
+
+
+def decode_output(output: bytes, errors="strict") -> str:
+    """Decodes the output the same way as `subprocess.run(..., text=True)`."""
+    text = output.decode(locale.getpreferredencoding(False), errors)
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+class OutputCapture:
+    """Captures an output stream of a process.
+
+    After `truncate` is called only the first and the last `keep` bytes of
+    the output are kept, so an output over the limit does not grow in memory.
+    """
+
+    def __init__(self, keep: int = OUTPUT_KEEP_SIZE):
+        self.keep = keep
+        self.head = bytearray()
+        self.tail = b""
+        self.size = 0
+        self.truncated = False
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.truncated:
+            self.tail = (self.tail + data)[-self.keep :]
+        else:
+            self.head += data
+
+    def truncate(self):
+        if not self.truncated and len(self.head) > 2 * self.keep:
+            self.tail = bytes(self.head[-self.keep :])
+            del self.head[self.keep :]
+        self.truncated = True
+
+    def getvalue(self) -> str:
+        if not self.truncated:
+            return decode_output(bytes(self.head))
+        skipped = self.size - len(self.head) - len(self.tail)
+        if skipped == 0:
+            return decode_output(bytes(self.head) + self.tail, "replace")
+        return (
+            decode_output(bytes(self.head), "replace")
+            + f"\n... {skipped} bytes truncated ...\n"
+            + decode_output(self.tail, "replace")
+        )
+
+
+def capture_outputs(
+    stdout: bytes, stderr: bytes, limits: ResourceLimits
+) -> tuple[str, str, bool]:
+    """Decodes the outputs truncating them if they are over the output limit.
+
+    Returns:
+        stdout (str): The decoded stdout.
+        stderr (str): The decoded stderr.
+        output_exceeded (bool): Whether the outputs are over the output limit.
+    """
+    captures = [OutputCapture(), OutputCapture()]
+    output_exceeded = (
+        limits.output is not None and len(stdout) + len(stderr) > limits.output
+    )
+    for capture, data in zip(captures, [stdout, stderr]):
+        capture.write(data)
+        if output_exceeded:
+            capture.truncate()
+    return captures[0].getvalue(), captures[1].getvalue(), output_exceeded
+
+
+def get_max_rss() -> int | None:
+    """The peak resident set size of this process in bytes."""
+    if resource is None:
+        return None
+    return max_rss_bytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def get_resource_usage(
+    wall_time: float, rusage=None, parent_max_rss: int | None = None
+) -> ResourceUsage:
+    """Returns the resource usage of a child from its `os.wait4` rusage.
+
+    The peak resident set size of a child includes the memory of the parent
+    it was forked from, which is kept across `exec` on Linux. It is only
+    known when the child used more memory than the parent at the fork.
+    """
+    if rusage is None:
+        return ResourceUsage(wall_time)
+    max_rss = max_rss_bytes(rusage.ru_maxrss)
+    if parent_max_rss is not None and max_rss <= parent_max_rss:
+        max_rss = None
+    return ResourceUsage(wall_time, rusage.ru_utime + rusage.ru_stime, max_rss)
+
+
+async def wait_fd(fd: int, write: bool = False):
+    """Waits until the file descriptor is readable or writable."""
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    if write:
+        add, remove = loop.add_writer, loop.remove_writer
+    else:
+        add, remove = loop.add_reader, loop.remove_reader
+    add(fd, lambda: ready.done() or ready.set_result(None))
+    try:
+        await ready
+    finally:
+        remove(fd)
+
+
+async def write_pipe(pipe, data: bytes):
+    """Writes the data to the pipe without blocking and closes it."""
+    fd = pipe.fileno()
+    os.set_blocking(fd, False)
+    view = memoryview(data)
+    try:
+        while view:
+            try:
+                view = view[os.write(fd, view) :]
+            except BlockingIOError:
+                await wait_fd(fd, write=True)
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    finally:
+        pipe.close()
+
+
+async def read_pipe(pipe, on_data):
+    """Calls `on_data` with the chunks read from the pipe until it is closed."""
+    fd = pipe.fileno()
+    os.set_blocking(fd, False)
+    try:
+        while True:
+            try:
+                data = os.read(fd, 1 << 16)
+            except BlockingIOError:
+                await wait_fd(fd)
+                continue
+            if not data:
+                return
+            on_data(data)
+    finally:
+        pipe.close()
+
+
+async def wait_process(process: subprocess.Popen):
+    """Waits for the process to exit and returns the resources used by it.
+
+    The process is reaped with `os.wait4` instead of `Popen.wait`, which
+    does not return the resource usage of the process. This is also why the
+    processes are not started with `asyncio.create_subprocess_exec`, as the
+    child watcher of asyncio reaps them itself and drops their usage.
+
+    On Linux 5.3 and later the exit is awaited on a pidfd without a thread.
+    Elsewhere a thread blocks in `os.wait4` for each running process, as
+    with the `ThreadedChildWatcher` of asyncio, so the number of these
+    threads is bounded by the `PROQ_MAX_PROCS` execution slots.
+    """
+    if not hasattr(os, "wait4"):  # pragma: no cover - windows
+        await asyncio.to_thread(process.wait)
+        return None
+    try:
+        pidfd = os.pidfd_open(process.pid)
+    except (AttributeError, OSError):
+        # Without pidfds the process is waited for in a thread.
+        _, wait_status, rusage = await asyncio.to_thread(os.wait4, process.pid, 0)
+    else:
+        try:
+            await wait_fd(pidfd)
+        finally:
+            os.close(pidfd)
+        _, wait_status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(wait_status)
+    return rusage
+
+
+def spawn_process(command: str, limits: ResourceLimits, cwd: str | None):
+    """Starts the command in a new session with piped stdin, stdout and stderr."""
+    return subprocess.Popen(
+        limit_args(limits) + command.split(),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        start_new_session=True,
+    )
+
+
+async def aspawn_process(
+    command: str, limits: ResourceLimits, cwd: str | None
+) -> subprocess.Popen:
+    """Starts the command in a thread, so that the fork does not block the loop.
+
+    The process is killed and reaped if the task is cancelled while starting it.
+    """
+    spawn = asyncio.ensure_future(
+        asyncio.to_thread(spawn_process, command, limits, cwd)
+    )
+    try:
+        return await asyncio.shield(spawn)
+    except asyncio.CancelledError:
+        with suppress(Exception):
+            process = await spawn
+            kill_process_tree(process)
+            await wait_process(process)
+        raise
+
+
+async def arun_command(
+    command: str,
+    stdin: str = "",
+    limits: ResourceLimits = ResourceLimits(),
+    weight: int = 1,
+    group: object = None,
+    cwd: str | None = None,
+) -> CommandResult:
+    """Runs the given command within the resource limits.
+
+    The command is run in a new process group which is killed as a whole when
+    the wall clock time limit is reached.
+
+    Args:
+        command (str): the command to run in a subprocess
+        stdin (str): the contents of the stdin passed
+        limits (ResourceLimits): the resource limits of the process.
+        weight (int): the number of scheduler slots the process occupies.
+        group (object): the scheduler group the process is queued in.
+        cwd (str|None): the working directory of the process.
+
+    Return:
+        result (CommandResult): The output, return code, exit status and
+            resource usage.
+    """
+    timed_out = False
+    output_exceeded = False
+    captures = [OutputCapture(), OutputCapture()]
+    rusage = None
+
+    def output_reader(capture):
+        def on_data(data):
+            nonlocal output_exceeded
+            capture.write(data)
+            if (
+                limits.output is not None
+                and not output_exceeded
+                and sum(c.size for c in captures) > limits.output
+            ):
+                output_exceeded = True
+                kill_process_tree(process)
+                for output_capture in captures:
+                    output_capture.truncate()
+
+        return on_data
+
+    async def wait():
+        nonlocal rusage, wall_time
+        rusage = await wait_process(process)
+        wall_time = time.perf_counter() - start
+
+    async with scheduler.aslot(weight, group):
+        parent_max_rss = get_max_rss()
+        with span("spawn", command=command):
+            process = await aspawn_process(command, limits, cwd)
+        start = time.perf_counter()
+        wall_time = None
+        # Shielded so that the output written before a timeout is kept.
+        communicate = asyncio.gather(
+            write_pipe(process.stdin, stdin.encode(locale.getpreferredencoding(False))),
+            read_pipe(process.stdout, output_reader(captures[0])),
+            read_pipe(process.stderr, output_reader(captures[1])),
+            wait(),
+        )
+        try:
+            with span("run", command=command):
+                await asyncio.wait_for(asyncio.shield(communicate), limits.timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            kill_process_tree(process)
+            await communicate
+        except asyncio.CancelledError:
+            # Eg. the template run is stopped once the template is known to fail.
+            kill_process_tree(process)
+            communicate.cancel()
+            with suppress(asyncio.CancelledError):
+                await communicate
+            if process.returncode is None:
+                # Reaped here as the wait for the process was cancelled too.
+                with suppress(ChildProcessError):
+                    await wait_process(process)
+            raise
+        finally:
+            # Reclaims the processes left behind by the command.
+            kill_process_tree(process)
+    stdout, stderr = captures[0].getvalue(), captures[1].getvalue()
+    usage = get_resource_usage(wall_time, rusage, parent_max_rss)
+    status = get_exit_status(
+        process.returncode,
+        stderr,
+        limits,
+        usage,
+        timed_out=timed_out,
+        output_exceeded=output_exceeded,
+    )
+    return CommandResult(stderr + stdout, process.returncode, status, usage)
+
+
+def run_command(
+    command: str,
+    stdin: str = "",
+    limits: ResourceLimits = ResourceLimits(),
+    weight: int = 1,
+    group: object = None,
+    cwd: str | None = None,
+) -> CommandResult:
+    """Runs the given command within the resource limits, see `arun_command`."""
+    return run_sync(arun_command(command, stdin, limits, weight, group, cwd))
+
+
+async def aget_command_output(
+    command: str,
+    stdin: str = "",
+    raise_on_fail: bool = False,
+    weight: int = 1,
+    group: object = None,
+    cwd: str | None = None,
+):
     """Runs the given command and returns the output.
 
     Args:
         command (str):  build  to run in a subprocess
         stdin (str): the contents of the stdin passed
         raise_on_fail (bool): whether to raise an exception on non zero return status.
+        weight (int): the number of scheduler slots the process occupies.
+        group (object): the scheduler group the process is queued in.
+        cwd (str|None): the working directory of the process.
 
     Return:
         output (str):  The output of build command
@@ -29,22 +641,94 @@ def get_command_output(command: str, stdin: str = "", raise_on_fail: bool = Fals
     Raises:
         BuildFailedError: if build process returns a non-zero
     """
-    result = subprocess.run(
-        command.split(),
-        input=stdin,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-    )
-    output = result.stderr + result.stdout
+    result = await arun_command(command, stdin, weight=weight, group=group, cwd=cwd)
     if raise_on_fail and result.returncode != 0:
-        raise CommandFailedError(command_output=output)
-    return output
+        raise CommandFailedError(command_output=result.output)
+    return result.output
 
 
-def get_outputs(command, stdins: list[str], raise_on_fail: bool = False):
-    n = len(stdins)
-    with ThreadPoolExecutor(max_workers=n) as executor:
-        return executor.map(
-            get_command_output, repeat(command, n), stdins, repeat(raise_on_fail, n)
-        )
+def get_command_output(
+    command: str,
+    stdin: str = "",
+    raise_on_fail: bool = False,
+    weight: int = 1,
+    group: object = None,
+    cwd: str | None = None,
+):
+    """Runs the given command and returns the output, see `aget_command_output`."""
+    return run_sync(
+        aget_command_output(command, stdin, raise_on_fail, weight, group, cwd)
+    )
+
+
+async def aget_results(
+    command,
+    stdins: list[str],
+    limits: ResourceLimits = ResourceLimits(),
+    weight: int = 1,
+    runner=arun_command,
+    cwd: str | None = None,
+    stop=None,
+) -> list[CommandResult | None]:
+    """Runs the command for each stdin concurrently.
+
+    Args:
+        command (str): the command to run.
+        stdins (list[str]): the stdin of each run.
+        limits (ResourceLimits): the resource limits of each run.
+        weight (int): the number of scheduler slots each process occupies.
+        runner (Callable): runs a single command with the same signature as
+            `arun_command`.
+        cwd (str|None): the working directory of the processes.
+        stop (Callable[[int, CommandResult], bool]|None): called with the index
+            and the result of each finished run, the remaining runs are
+            cancelled once it returns True. Their results are None.
+    """
+    # All the processes of this call wait in the scheduler as a single group.
+    group = object()
+    runs = [
+        asyncio.ensure_future(runner(command, stdin, limits, weight, group, cwd=cwd))
+        for stdin in stdins
+    ]
+    if stop is None:
+        return list(await asyncio.gather(*runs))
+    indices = {run: i for i, run in enumerate(runs)}
+    results = [None] * len(runs)
+    pending = set(runs)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for run in done:
+                results[indices[run]] = run.result()
+            if any(stop(indices[run], run.result()) for run in done):
+                break
+    finally:
+        for run in pending:
+            run.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return results
+
+
+def get_results(
+    command,
+    stdins: list[str],
+    limits: ResourceLimits = ResourceLimits(),
+    weight: int = 1,
+    runner=arun_command,
+    cwd: str | None = None,
+) -> list[CommandResult]:
+    """Runs the command for each stdin concurrently, see `aget_results`."""
+    return run_sync(aget_results(command, stdins, limits, weight, runner, cwd))
+
+
+def get_outputs(
+    command, stdins: list[str], raise_on_fail: bool = False, weight: int = 1
+):
+    results = get_results(command, stdins, weight=weight)
+    if raise_on_fail:
+        for result in results:
+            if result.returncode != 0:
+                raise CommandFailedError(command_output=result.output)
+    return [result.output for result in results]
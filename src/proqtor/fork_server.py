@@ -0,0 +1,205 @@
+import asyncio
+import itertools
+import locale
+import os
+import shlex
+import subprocess
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+from .execute_utils import (
+    CommandResult,
+    ResourceLimits,
+    ResourceUsage,
+    arun_command,
+    capture_outputs,
+    get_exit_status,
+    kill_process_tree,
+    scheduler,
+)
+from .profile_utils import span
+from .python_harness import read_frame, write_frame
+from .utils import run_sync
+
+HARNESS_SOURCE = Path(__file__).with_name("python_harness.py").read_text()
+
+
+class ForkServerError(Exception):
+    pass
+
+
+def get_interpreter_args(command: str, source_filename: str) -> list[str] | None:
+    """Returns the interpreter and its options if the command runs the source.
+
+    The fork server can only replace commands of the form
+    `python [OPTIONS] SOURCE_FILENAME`.
+    """
+    args = command.split()
+    if (
+        len(args) < 2
+        or args[-1] != source_filename
+        or not os.path.basename(args[0]).startswith("python")
+        or any(not arg.startswith("-") for arg in args[1:-1])
+        or any(arg in ("-c", "-m", "-i", "-") for arg in args[1:-1])
+    ):
+        return None
+    return args[:-1]
+
+
+class ForkServer:
+    """Runs a python source file by forking a pre-warmed zygote process.
+
+    The zygote compiles the source file once and forks a child for each
+    test case instead of starting a new interpreter, which removes the
+    interpreter startup and import time from every test case. The output of
+    a test case is the same as running the command in a subprocess.
+
+    Use `ForkServer.start` which returns None if the command or the source
+    can not be run with a fork server.
+    """
+
+    def __init__(
+        self, interpreter_args: list[str], source_filename: str, cwd: str | None = None
+    ):
+        self.command = shlex.join(interpreter_args + [source_filename])
+        self.cwd = cwd
+        self.process = subprocess.Popen(
+            interpreter_args + ["-c", HARNESS_SOURCE, "fork", source_filename],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=cwd,
+            start_new_session=True,
+        )
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending: dict[int, Future] = {}
+        try:
+            header, _ = read_frame(self.process.stdout.fileno())
+        except (EOFError, ValueError):
+            header = {"ok": False}
+        if not header["ok"]:
+            self.close()
+            raise ForkServerError(f"Could not start a fork server for {self.command}")
+        self._reader = threading.Thread(target=self._read_responses, daemon=True)
+        self._reader.start()
+
+    @classmethod
+    def start(
+        cls, command: str, source_filename: str, cwd: str | None = None
+    ) -> "ForkServer | None":
+        interpreter_args = get_interpreter_args(command, source_filename)
+        if interpreter_args is None or not hasattr(os, "fork"):
+            return None
+        try:
+            return cls(interpreter_args, source_filename, cwd)
+        except (ForkServerError, OSError):
+            return None
+
+    def _read_responses(self):
+        fd = self.process.stdout.fileno()
+        try:
+            while True:
+                header, payload = read_frame(fd)
+                with self._lock:
+                    future = self._pending.pop(header["id"])
+                # The waiting test case may have been cancelled.
+                if future.set_running_or_notify_cancel():
+                    future.set_result((header, payload))
+        except (EOFError, ValueError, OSError):
+            pass
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(ForkServerError("The fork server exited."))
+
+    def _request(self, stdin: str, limits: ResourceLimits) -> Future:
+        future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            write_frame(
+                self.process.stdin.fileno(),
+                {
+                    "id": request_id,
+                    "timeout": limits.timeout,
+                    "cpu_time": limits.cpu_time,
+                    "memory": limits.memory,
+                    "output": limits.output,
+                },
+                stdin.encode(locale.getpreferredencoding(False)),
+            )
+        return future
+
+    async def arun_command(
+        self,
+        command: str,
+        stdin: str = "",
+        limits: ResourceLimits = ResourceLimits(),
+        weight: int = 1,
+        group: object = None,
+        cwd: str | None = None,
+    ) -> CommandResult:
+        """Runs a test case in a forked child, same as `execute_utils.arun_command`.
+
+        Falls back to running the command in a subprocess if the fork server
+        is not usable anymore. The test case always runs in the working
+        directory of the fork server.
+        """
+        async with scheduler.aslot(weight, group):
+            try:
+                with span("run", command=command, executor="fork"):
+                    header, payload = await asyncio.wrap_future(
+                        self._request(stdin, limits)
+                    )
+            except (ForkServerError, OSError):
+                response = None
+            else:
+                response = header, payload
+        if response is None:
+            return await arun_command(command, stdin, limits, weight, group, self.cwd)
+        stdout, stderr, output_exceeded = capture_outputs(
+            payload[: header["stdout"]], payload[header["stdout"] :], limits
+        )
+        returncode = os.waitstatus_to_exitcode(header["wait_status"])
+        usage = ResourceUsage(*header["usage"])
+        status = get_exit_status(
+            returncode,
+            stderr,
+            limits,
+            usage,
+            timed_out=header["timed_out"],
+            output_exceeded=output_exceeded,
+        )
+        return CommandResult(stderr + stdout, returncode, status, usage)
+
+    def run_command(
+        self,
+        command: str,
+        stdin: str = "",
+        limits: ResourceLimits = ResourceLimits(),
+        weight: int = 1,
+        group: object = None,
+    ) -> CommandResult:
+        """Runs a test case in a forked child, see `arun_command`."""
+        return run_sync(self.arun_command(command, stdin, limits, weight, group))
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            kill_process_tree(self.process)
+            self.process.wait()
+        self.process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
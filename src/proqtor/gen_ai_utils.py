@@ -1,18 +1,21 @@
 from pathlib import Path
 
 from langchain.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
-from langchain_groq import ChatGroq
-from langchain_openai import ChatOpenAI
 
 from .core import ProQ
 
 
 def get_model(model_name):
+    # Only the integration of the provider used is imported, each is slow to import.
     provider, model = model_name.split(":")
     match provider:
         case "open-ai":
+            from langchain_openai import ChatOpenAI
+
             model = ChatOpenAI(model=model)
         case "groq":
+            from langchain_groq import ChatGroq
+
             model = ChatGroq(model=model)
     return model
 
@@ -1,8 +1,14 @@
-import argparse
 import re
 import shlex
+from functools import lru_cache
+from itertools import islice
+from typing import NamedTuple
 
 from marko import Markdown
+from marko.block import FencedCode, Heading
+from marko.md_renderer import MarkdownRenderer
+
+from md2json import fold_level
 
 
 def clip_extra_lines(text: str) -> str:
@@ -26,10 +32,16 @@ def get_tag_content(tag: str, html: str) -> str:
     return content
 
 
+@lru_cache
+def get_tags_re(tags: tuple[str, ...], with_content: bool = False) -> re.Pattern:
+    tags = "|".join(map(re.escape, tags))
+    if with_content:
+        return re.compile(rf"<({tags})( .*?|)>(.*?)</\1>", re.DOTALL)
+    return re.compile(rf"<\/?({tags})( .*?|)>", re.DOTALL)
+
+
 def remove_tag(html, tag):
-    return re.sub(
-        f"<{re.escape(tag)}( .*?|)>(.*?)</{re.escape(tag)}>", "", html, flags=re.DOTALL
-    )
+    return get_tags_re((tag,), with_content=True).sub("", html)
 
 
 def remove_tags(html, tags: list[str]):
@@ -40,50 +52,440 @@ def remove_tags(html, tags: list[str]):
 
 def strip_tags(html: str, tags: list[str]) -> str:
     """Removes the given tags from an HTML text without removing the content."""
-    return re.sub(
-        r"<\/?({tags})( .*?|)>".format(tags="|".join(map(re.escape, tags))),
-        "",
-        html,
-        flags=re.DOTALL,
-    )
+    return get_tags_re(tuple(tags)).sub("", html)
+
+
+class UnbalancedTagError(ValueError):
+    """Raised for the tags of a tagged template which are not closed in order."""
+
+
+class TaggedTemplate(NamedTuple):
+    solution: str
+    template: str
+
+
+SOLUTION_TAGS = ("sol", "solution")
+TEMPLATE_TAGS = ("los",)
+TAGGED_TEMPLATE_TAG_RE = re.compile(r"<(/?)(solution|sol|los)(?: [^>]*)?>")
+
+
+def get_tag_location(tagged_template: str, index: int) -> str:
+    """Returns the line and column of the tag with the index in the tagged template."""
+    tag = next(islice(TAGGED_TEMPLATE_TAG_RE.finditer(tagged_template), index, None))
+    line = tagged_template.count("\n", 0, tag.start()) + 1
+    column = tag.start() - tagged_template.rfind("\n", 0, tag.start())
+    return f"line {line}, column {column}"
+
+
+@lru_cache(maxsize=256)
+def split_tagged_template(tagged_template: str) -> TaggedTemplate:
+    """Splits the tagged template into the solution and the template in one scan.
+
+    The solution leaves out the text within `<los>` tags and the template
+    the text within `<sol>` or `<solution>` tags. Both leave out the tags.
+
+    Raises:
+        UnbalancedTagError: If a tag is closed before it is opened, closes
+            another tag or is not closed.
+    """
+    # The text before each tag and the closing slash and name of the tag.
+    parts = TAGGED_TEMPLATE_TAG_RE.split(tagged_template)
+    solution, template = [parts[0]], [parts[0]]
+    open_tags: list[tuple[str, int]] = []
+    n_solution_tags = n_template_tags = 0
+    tags = zip(parts[1::3], parts[2::3], parts[3::3])
+    for index, (is_closing, name, text) in enumerate(tags):
+        if is_closing:
+            if not open_tags or open_tags[-1][0] != name:
+                message = f"</{name}> at {get_tag_location(tagged_template, index)}"
+                if not open_tags:
+                    raise UnbalancedTagError(f"{message} is not opened.")
+                opening, opening_index = open_tags[-1]
+                raise UnbalancedTagError(
+                    f"{message} closes <{opening}> opened at "
+                    f"{get_tag_location(tagged_template, opening_index)}."
+                )
+            open_tags.pop()
+        else:
+            open_tags.append((name, index))
+        if name in SOLUTION_TAGS:
+            n_solution_tags += -1 if is_closing else 1
+        else:
+            n_template_tags += -1 if is_closing else 1
+        if not n_template_tags:
+            solution.append(text)
+        if not n_solution_tags:
+            template.append(text)
+    if open_tags:
+        opening, opening_index = open_tags[-1]
+        raise UnbalancedTagError(
+            f"<{opening}> opened at "
+            f"{get_tag_location(tagged_template, opening_index)} is not closed."
+        )
+    return TaggedTemplate("".join(solution), "".join(template))
+
+
+EXECUTE_CONFIG_OPTIONS = {
+    "build": ("-b", "--build"),
+    "run": ("-r", "--run"),
+    "timeout": ("-t", "--timeout"),
+    "cpu_time": ("-c", "--cpu-time"),
+    "memory_limit": ("-m", "--memory-limit"),
+    "output_limit": ("-o", "--output-limit"),
+    "executor": ("-x", "--executor"),
+}
+EXECUTE_CONFIG_TYPES = {"timeout": float, "cpu_time": float}
+EXECUTE_CONFIG_CHOICES = {"executor": ("subprocess", "fork", "batch")}
+EXECUTE_CONFIG_KEYS = ["source_filename", *EXECUTE_CONFIG_OPTIONS]
+NEGATIVE_NUMBER_RE = re.compile(r"^-\d+$|^-\d*\.\d+$")
+
+EXECUTE_CONFIG_DESTS = {
+    option: dest
+    for dest, options in EXECUTE_CONFIG_OPTIONS.items()
+    for option in options
+}
+
 
+def is_option(arg: str) -> bool:
+    return arg.startswith("-") and arg != "-" and not NEGATIVE_NUMBER_RE.match(arg)
 
-execute_config_parser = argparse.ArgumentParser()
-execute_config_parser.add_argument("source_filename", type=str, nargs="?")
-execute_config_parser.add_argument("-b", "--build", type=str, required=False)
-execute_config_parser.add_argument("-r", "--run", type=str, required=False)
+
+def get_option(arg: str) -> tuple[str, str | None]:
+    """Returns the dest of the option argument and the value attached to it.
+
+    Like argparse, long options can be abbreviated to a unique prefix and
+    the value can be attached as `--run=...`, `-r=...` or `-r...`.
+    """
+    if arg in EXECUTE_CONFIG_DESTS:
+        return EXECUTE_CONFIG_DESTS[arg], None
+    if arg.startswith("--"):
+        option, sep, value = arg.partition("=")
+        matches = [name for name in EXECUTE_CONFIG_DESTS if name.startswith(option)]
+        if len(matches) == 1 and matches[0].startswith("--"):
+            return EXECUTE_CONFIG_DESTS[matches[0]], value if sep else None
+        if len(matches) > 1:
+            raise ValueError(
+                f"ambiguous option: {option} could match {', '.join(matches)}"
+            )
+    elif arg[:2] in EXECUTE_CONFIG_DESTS:
+        return EXECUTE_CONFIG_DESTS[arg[:2]], arg[3:] if arg[2:3] == "=" else arg[2:]
+    raise ValueError(f"unrecognized arguments: {arg}")
 
 
 def parse_execute_config(config_string):
-    return dict(
-        execute_config_parser.parse_args(shlex.split(config_string))._get_kwargs()
-    )
+    """Parses the execute config in the info string of a code block.
+
+    Accepts the arguments an argparse parser of the options would, the
+    config has all the options with None for the ones not given.
+
+    Raises:
+        ValueError: If the config string is not a valid execute config.
+    """
+    config = dict.fromkeys(EXECUTE_CONFIG_KEYS)
+    args = shlex.split(config_string)
+    positionals = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        i += 1
+        if arg == "--":
+            positionals.extend(args[i:])
+            break
+        if not is_option(arg):
+            positionals.append(arg)
+            continue
+        dest, value = get_option(arg)
+        name = "/".join(EXECUTE_CONFIG_OPTIONS[dest])
+        if value is None:
+            if i == len(args) or is_option(args[i]):
+                raise ValueError(f"argument {name}: expected one argument")
+            value = args[i]
+            i += 1
+        if dest in EXECUTE_CONFIG_TYPES:
+            try:
+                value = EXECUTE_CONFIG_TYPES[dest](value)
+            except ValueError:
+                raise ValueError(
+                    f"argument {name}: invalid "
+                    f"{EXECUTE_CONFIG_TYPES[dest].__name__} value: {value!r}"
+                )
+        if dest in EXECUTE_CONFIG_CHOICES and value not in EXECUTE_CONFIG_CHOICES[dest]:
+            choices = ", ".join(map(repr, EXECUTE_CONFIG_CHOICES[dest]))
+            raise ValueError(
+                f"argument {name}: invalid choice: {value!r} (choose from {choices})"
+            )
+        config[dest] = value
+    if len(positionals) > 1:
+        raise ValueError(f"unrecognized arguments: {' '.join(positionals[1:])}")
+    if positionals:
+        config["source_filename"] = positionals[0]
+    return config
+
+
+class UnsupportedMarkdownError(ValueError):
+    """Raised for the markdown which is left to marko to parse."""
+
+
+class MarkdownHeading(NamedTuple):
+    level: int
+    text: str
+
+
+class MarkdownCode(NamedTuple):
+    lang: str
+    extra: str
+    code: str
+
+
+class MarkdownSection(NamedTuple):
+    heading: str | None
+    start: int
+    end: int
+    blocks: list | None
+
+
+# Blank lines are kept as the text they are rendered to.
+BLANK_LINE = "\n"
+
+# Characters which marko treats as line breaks or replaces.
+UNSUPPORTED_CHARS_RE = re.compile("[\r\0\x0b\x0c\x1c-\x1e\x85\u2028\u2029]")
+# The CJK ranges of the pangu extension of marko, kept here as it is not public.
+CJK_CHARS_RE = re.compile(
+    "[\u2e80-\u2eff\u2f00-\u2fdf\u3040-\u309f\u30a0-\u30ff\u3100-\u312f"
+    "\u3200-\u32ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]"
+)
+# Splits the info string of a fenced code block at the first spaces or tabs.
+CODE_INFO_RE = re.compile(r"([^ \t]*)[ \t]*(.*)", re.DOTALL)
+PLAIN_TEXT_RE = re.compile(r"[^\\`*_\[\]!<>&]+")
+# Starts at the line break before the line, which is several times faster to
+# search for than the start of a line.
+CLOSING_FENCE_RE = re.compile(r"\n {,3}(~+|`+)[^\n\S]*$", re.MULTILINE)
+BACKTICK_FENCE_RE = re.compile(r"^ {,3}`{3,}[^\n\S]*$", re.MULTILINE)
+# The lines which start a heading or a fenced code block.
+BLOCK_START_RE = re.compile(r"^[#`~]", re.MULTILINE)
+# Html blocks, link reference definitions, setext headings and indented
+# headings or fences, after which marko may find other headings or fences.
+UNSUPPORTED_LINE_RE = re.compile(
+    r"^(?: {1,3}[#`~<]|<| {,3}\[(?:[^\]\\]|\\.)*\]:| {,3}=+[^\n\S]*$)",
+    re.MULTILINE | re.DOTALL,
+)
+
+
+def has_unsupported_chars(text: str) -> bool:
+    if text.isascii():
+        return any(char in text for char in "\r\0\x0b\x0c\x1c\x1d\x1e")
+    return UNSUPPORTED_CHARS_RE.search(text) is not None
+
+
+def has_cjk_chars(text: str) -> bool:
+    """Whether the text has CJK characters, which marko spaces from latin ones."""
+    return not text.isascii() and CJK_CHARS_RE.search(text) is not None
 
 
-def extract_codeblock_content(text):
-    block = next(
-        iter(
-            block
-            for block in Markdown().parse(text).children
-            if (block.get_type() == "FencedCode" or block.get_type() == "CodeBlock")
+def scan_fenced_code(text: str, match: re.Match) -> tuple[MarkdownCode | None, int]:
+    """Returns the fenced code block opened by the match and the position after it.
+
+    The code block is None if rendering it back as marko does would not
+    give the same code block, eg. a `~~~` fence with a ```` ``` ```` line.
+    """
+    _, leading, info = match.groups()
+    body_start = min(match.end() + 1, len(text))
+    pos = match.end()
+    while closing := CLOSING_FENCE_RE.search(text, pos):
+        if leading in closing.group(1):
+            break
+        pos = closing.end()
+    if closing:
+        body_end, end = closing.start() + 1, min(closing.end() + 1, len(text))
+    else:
+        body_end = end = len(text)
+    if (
+        "\\" in info
+        or "`" in info
+        or (leading != "```" and BACKTICK_FENCE_RE.search(text, body_start, body_end))
+    ):
+        return None, end
+    lang, extra = CODE_INFO_RE.fullmatch(info).groups()
+    return MarkdownCode(lang, extra, text[body_start:body_end]), end
+
+
+def scan_markdown(text: str, level: int = 0) -> list[MarkdownSection]:
+    """Splits the markdown text into sections at the headings of the level.
+
+    Only the blank lines, headings and fenced code blocks at the start of a
+    line are scanned into the blocks of a section, the blocks of a section
+    with any other markdown are None. The first section is the text before
+    the first heading of the level, or the whole text if the level is 0.
+
+    Raises:
+        UnsupportedMarkdownError: If marko may find other headings or code blocks
+            than the scan, eg. with html blocks or indented headings.
+    """
+    if has_unsupported_chars(text):
+        raise UnsupportedMarkdownError("Line break characters other than \\n.")
+    sections = []
+    heading, start, blocks = None, 0, []
+    pos = 0
+    while pos < len(text):
+        match = BLOCK_START_RE.search(text, pos)
+        block_start = len(text) if match is None else match.start()
+        if block_start > pos:
+            # The lines up to the next heading or fence are blank or other lines.
+            if text[pos:block_start].isspace():
+                # Consecutive blank lines are a single block in marko.
+                if blocks is not None and (not blocks or blocks[-1] is not BLANK_LINE):
+                    blocks.append(BLANK_LINE)
+            elif line := UNSUPPORTED_LINE_RE.search(text, pos, block_start):
+                raise UnsupportedMarkdownError(f"Line starting with {line.group()!r}.")
+            else:
+                blocks = None
+            pos = block_start
+            continue
+        eol = text.find("\n", pos)
+        next_pos = len(text) if eol == -1 else eol + 1
+        block = None
+        if text[pos] == "#":
+            if match := Heading.pattern.match(text, pos):
+                heading_level = len(match.group(1))
+                heading_text = match.group(2).strip()
+                is_plain = PLAIN_TEXT_RE.fullmatch(heading_text) is not None
+                if heading_level == level:
+                    if not is_plain:
+                        raise UnsupportedMarkdownError(f"Heading {heading_text!r}.")
+                    sections.append(MarkdownSection(heading, start, pos, blocks))
+                    heading, start, blocks = heading_text, next_pos, []
+                    pos = next_pos
+                    continue
+                if is_plain:
+                    block = MarkdownHeading(heading_level, heading_text)
+        elif match := FencedCode.pattern.match(text, pos):
+            if match.group(2)[0] != "`" or "`" not in match.group(3):
+                block, next_pos = scan_fenced_code(text, match)
+        if block is None:
+            blocks = None
+        elif blocks is not None:
+            blocks.append(block)
+        pos = next_pos
+    sections.append(MarkdownSection(heading, start, len(text), blocks))
+    return sections
+
+
+def render_block(block) -> str:
+    """Renders the scanned block as the markdown renderer of marko does."""
+    if isinstance(block, MarkdownHeading):
+        return f"{'#' * block.level} {block.text}\n"
+    if isinstance(block, MarkdownCode):
+        extra = f" {block.extra}" if block.extra else ""
+        return f"```{block.lang}{extra}\n{block.code}```\n"
+    return block
+
+
+def render_section(md_string: str, start: int, end: int, next_end: int) -> str:
+    """Renders the section between start and end with marko.
+
+    The section is parsed up to the end of the next heading, at `next_end`,
+    for its blocks to end as they do in the whole document.
+    """
+    blocks = Markdown().parse(md_string[start:next_end]).children
+    if next_end > end:
+        blocks = blocks[:-1]
+    renderer = MarkdownRenderer()
+    return "".join(renderer.render(block) for block in blocks)
+
+
+def normalize_code(code: str) -> str:
+    """Returns the code as parsed back from the rendered code block."""
+    return code if not code or code.endswith("\n") else code + "\n"
+
+
+def scan_blocks(text: str) -> list | None:
+    """Returns the scanned blocks of the text, None if it has other markdown."""
+    try:
+        [(_, _, _, blocks)] = scan_markdown(text)
+    except UnsupportedMarkdownError:
+        return None
+    if blocks is None or has_cjk_chars(text):
+        return None
+    return blocks
+
+
+def fold_sections(md_string: str) -> dict[str, tuple[str, list | None]]:
+    """Folds the markdown at the first level headings as `md2json.fold_level` does.
+
+    The sections with only blank lines, headings and fenced code blocks are
+    scanned and rendered without marko, which is several times faster.
+
+    Returns:
+        sections (dict): The text of each section as rendered by marko and the
+            scanned blocks of the text, None for the sections with other markdown.
+    """
+    try:
+        scanned_sections = scan_markdown(md_string, level=1)[1:]
+    except UnsupportedMarkdownError:
+        return {
+            heading: (text, None)
+            for heading, text in fold_level(md_string, level=1).items()
+        }
+    has_cjk = has_cjk_chars(md_string)
+    sections = {}
+    next_ends = [section.start for section in scanned_sections[1:]] + [len(md_string)]
+    for (heading, start, end, blocks), next_end in zip(scanned_sections, next_ends):
+        if blocks is None or (has_cjk and CJK_CHARS_RE.search(md_string, start, end)):
+            text = render_section(md_string, start, end, next_end)
+            sections[heading] = (text, None)
+            continue
+        blocks = [
+            block._replace(code=normalize_code(block.code))
+            if isinstance(block, MarkdownCode)
+            else block
+            for block in blocks
+        ]
+        sections[heading] = ("".join(map(render_block, blocks)), blocks)
+    return sections
+
+
+def extract_codeblock_content(text, blocks=None):
+    """Extracts the first code block of the markdown text.
+
+    Args:
+        text (str): The markdown text.
+        blocks (list|None): The scanned blocks of the text if known.
+    """
+    if blocks is None:
+        blocks = scan_blocks(text)
+    if blocks is None:
+        block = next(
+            iter(
+                block
+                for block in Markdown().parse(text).children
+                if (block.get_type() == "FencedCode" or block.get_type() == "CodeBlock")
+            )
+        )
+        lang, extra, code = block.lang, block.extra, block.children[0].children
+    else:
+        lang, extra, code = next(
+            block for block in blocks if isinstance(block, MarkdownCode)
         )
-    )
     return {
-        "lang": block.lang,
-        "execute_config": parse_execute_config(block.extra),
-        "code": block.children[0].children,
+        "lang": lang,
+        "execute_config": parse_execute_config(extra),
+        "code": code,
     }
 
 
+TEMPLATE_OPENING_TAG = "<template>"
+TEMPLATE_CLOSING_TAG = "</template>"
+SUFFIX_INVISIBLE_TAG = "<suffix_invisible>"
+
+
 def extract_code_parts(code):
-    code_parts = re.match(
-        r"(?P<prefix>.*)<template>(?P<tagged_template>.*)</template>(?P<suffix>.*)",
-        code,
-        re.DOTALL,
-    )
+    # The last template tags, as a greedy match of the whole code would find.
+    template_start = template_end = code.rfind(TEMPLATE_CLOSING_TAG)
+    if template_end != -1:
+        template_start = code.rfind(TEMPLATE_OPENING_TAG, 0, template_end)
 
     # Assume the whole code as solution if to tags are there
-    if code_parts is None:
+    if template_start == -1:
         return {
             "prefix": "",
             "suffix": "",
@@ -93,15 +495,21 @@ def extract_code_parts(code):
             "</sol>\n",
         }
 
-    code_parts = code_parts.groupdict()
+    code_parts = {
+        "prefix": code[:template_start],
+        "tagged_template": code[
+            template_start + len(TEMPLATE_OPENING_TAG) : template_end
+        ],
+        "suffix": code[template_end + len(TEMPLATE_CLOSING_TAG) :],
+    }
 
     # removing existing tags for backwards compatibility
     code_parts["prefix"] = strip_tags(code_parts["prefix"], ["prefix"]).lstrip()
     code_parts["suffix"] = strip_tags(code_parts["suffix"], ["suffix"])
-    if "<suffix_invisible>" in code_parts["suffix"]:
+    if SUFFIX_INVISIBLE_TAG in code_parts["suffix"]:
         code_parts["suffix"], code_parts["suffix_invisible"] = code_parts[
             "suffix"
-        ].split("<suffix_invisible>")
+        ].split(SUFFIX_INVISIBLE_TAG)
         code_parts["suffix_invisible"] = strip_tags(
             code_parts["suffix_invisible"], ["suffix_invisible"]
         ).rstrip()
@@ -113,11 +521,13 @@ def extract_code_parts(code):
     elif not code_parts["suffix_invisible"]:
         code_parts["suffix"] = code_parts["suffix"].rstrip()
 
+    # Reports unbalanced tags while parsing, the split is cached for the solution.
+    split_tagged_template(code_parts["tagged_template"])
     return code_parts
 
 
-def extract_solution(solution_codeblock):
-    code_block_contents = extract_codeblock_content(solution_codeblock)
+def extract_solution(solution_codeblock, blocks=None):
+    code_block_contents = extract_codeblock_content(solution_codeblock, blocks)
     code_parts = extract_code_parts(code_block_contents.pop("code"))
     return code_block_contents | code_parts
 
@@ -131,3 +541,36 @@ def extract_testcases(testcase_blocks: tuple):
         }
         for input, output in zip(testcases_list[::2], testcases_list[1::2])
     ]
+
+
+def extract_test_cases(text, blocks=None):
+    """Extracts the test cases from the text of a test cases section.
+
+    Same as `extract_testcases(fold_level(text, level=2, return_type="list"))`.
+
+    Args:
+        text (str): The markdown text of the section.
+        blocks (list|None): The scanned blocks of the text if known.
+    """
+    if blocks is None:
+        blocks = scan_blocks(text)
+    if blocks is None:
+        return extract_testcases(fold_level(text, level=2, return_type="list"))
+    headings, codes = [], []
+    for block in blocks:
+        if isinstance(block, MarkdownHeading) and block.level == 2:
+            headings.append(block.text)
+            codes.append(None)
+        elif codes and codes[-1] is None and isinstance(block, MarkdownCode):
+            codes[-1] = block
+    # An unpaired last heading is ignored as in `extract_testcases`.
+    for i, (heading, code) in enumerate(zip(headings[: len(headings) // 2 * 2], codes)):
+        if code is None:
+            raise ValueError(f"Code block not found under the heading {heading!r}")
+        if code.extra:
+            parse_execute_config(code.extra)
+        codes[i] = normalize_code(code.code)
+    return [
+        {"input": input, "output": output}
+        for input, output in zip(codes[::2], codes[1::2])
+    ]
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_TRACE_FILE = "proq-trace.json"
+
+# Anchors the monotonic clock to the wall clock so that the spans recorded
+# in different processes line up in the timeline.
+_CLOCK_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+
+def now_us() -> float:
+    return (_CLOCK_OFFSET_NS + time.perf_counter_ns()) / 1000
+
+
+class Profiler:
+    """Records spans as Chrome trace events.
+
+    The spans of each asyncio task are shown in a lane of their own, so the
+    test cases run concurrently on an event loop do not overlap in a lane.
+    Nothing is recorded unless the profiler is enabled.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._events: list[dict] = []
+        self._lanes: set[int] = set()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def _get_lane(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            lane, lane_name = threading.get_ident(), threading.current_thread().name
+        else:
+            lane, lane_name = id(task), task.get_name()
+        if lane not in self._lanes:
+            self._lanes.add(lane)
+            self._events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": lane,
+                    "args": {"name": lane_name},
+                }
+            )
+        return lane
+
+    @contextmanager
+    def span(self, name: str, category: str = "proq", **args):
+        """Records the time spent within the context as a span."""
+        if not self.enabled:
+            yield
+            return
+        start = now_us()
+        try:
+            yield
+        finally:
+            end = now_us()
+            with self._lock:
+                self._events.append(
+                    {
+                        "name": name,
+                        "cat": category,
+                        "ph": "X",
+                        "ts": start,
+                        "dur": end - start,
+                        "pid": os.getpid(),
+                        "tid": self._get_lane(),
+                        "args": args,
+                    }
+                )
+
+    def add_events(self, events: list[dict]):
+        """Adds the events recorded by another process."""
+        with self._lock:
+            self._events.extend(events)
+
+    def pop_events(self) -> list[dict]:
+        """Returns and removes the recorded events."""
+        with self._lock:
+            events, self._events = self._events, []
+            self._lanes = set()
+        return events
+
+    def write(self, trace_file: str | os.PathLike) -> int:
+        """Writes the recorded events as a Chrome trace file.
+
+        The file can be opened in Perfetto or `chrome://tracing`.
+
+        Returns:
+            n_spans (int): The number of spans written.
+        """
+        events = self.pop_events()
+        with open(trace_file, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return sum(event["ph"] == "X" for event in events)
+
+
+profiler = Profiler()
+span = profiler.span
+
+
+@contextmanager
+def profiling(trace_file: str | os.PathLike | bool | None):
+    """Records the spans within the context into the trace file.
+
+    Args:
+        trace_file (str|PathLike|bool|None): The trace file to write. True
+            writes `proq-trace.json`, a falsy value does not profile.
+    """
+    if not trace_file:
+        yield
+        return
+    if trace_file is True:
+        trace_file = DEFAULT_TRACE_FILE
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        n_spans = profiler.write(trace_file)
+        print(f"Profile of {n_spans} spans written to {trace_file}")
@@ -0,0 +1,467 @@
+"""Runs a python source file for many test cases in a single interpreter.
+
+This file is not imported by the harness. Its source is run with `python -c`
+as `python [OPTIONS] -c SOURCE MODE FILENAME [IO_DIR]`, which mirrors
+`python [OPTIONS] FILENAME` run in the same directory. The code of the file
+is compiled once and the standard library modules it imports are imported
+once. Each test case executes the compiled code as a fresh `__main__` module
+with stdin, stdout and stderr redirected to files.
+
+Modes:
+    fork: Used by `proqtor.fork_server.ForkServer`. The harness is a zygote
+        forking a child for each test case. Test cases run concurrently.
+    batch: Used by `proqtor.batch_runner`. The test cases are run one after
+        another in the harness process itself. The stdin of a test case is
+        read from IO_DIR/stdin and the outputs are written to IO_DIR/stdout
+        and IO_DIR/stderr.
+
+Protocol (all integers are big endian unsigned 32 bit):
+    Harness -> Parent: a frame with the header {"ok": bool} after warming up.
+    fork:
+        Parent -> Harness: a frame with the header {"id", "timeout",
+            "cpu_time", "memory", "output"} and the stdin as the payload.
+        Harness -> Parent: a frame with the header {"id", "wait_status",
+            "timed_out", "stdout", "usage"} and stdout + stderr as the payload
+            where "stdout" is the length of the stdout part.
+    batch:
+        Parent -> Harness: a frame with the header {"cpu_time", "output"}.
+        Harness -> Parent: a frame with the header {"exit_code", "usage"}.
+
+The usage is the wall time and the cpu time in seconds and the peak
+resident set size in bytes of the run, or null when unknown.
+
+A frame is the length of the json header, the length of the payload, the
+json header and the payload.
+"""
+
+import ast
+import atexit
+import builtins
+import io
+import json
+import math
+import os
+import selectors
+import signal
+import struct
+import sys
+import tempfile
+import time
+import types
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+FRAME_HEADER = struct.Struct("!II")
+
+
+def read_exactly(fd, n):
+    chunks = []
+    while n:
+        chunk = os.read(fd, n)
+        if not chunk:
+            raise EOFError
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+def write_frame(fd, header, payload=b""):
+    header = json.dumps(header).encode()
+    data = FRAME_HEADER.pack(len(header), len(payload)) + header + payload
+    while data:
+        data = data[os.write(fd, data) :]
+
+
+def read_frame(fd):
+    header_size, payload_size = FRAME_HEADER.unpack(read_exactly(fd, FRAME_HEADER.size))
+    header = json.loads(read_exactly(fd, header_size))
+    return header, read_exactly(fd, payload_size)
+
+
+def warm_imports(tree):
+    """Imports the standard library modules imported at the top level."""
+    stdlib = getattr(sys, "stdlib_module_names", ())
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            if name.split(".")[0] in stdlib:
+                try:
+                    __import__(name)
+                except Exception:
+                    pass
+
+
+def kill(pid):
+    """Kills the child and the processes it started."""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        # The child has not yet started its own session.
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def set_limits(request):
+    if resource is None:
+        return
+    if request["cpu_time"] is not None:
+        cpu_time = math.ceil(request["cpu_time"])
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_time, cpu_time + 1))
+    if request["memory"] is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (request["memory"], request["memory"]))
+    set_output_limit(request["output"])
+
+
+def set_output_limit(output):
+    """Limits the size of the output files.
+
+    One byte over the limit can be written, so that the parent can tell that
+    the limit is exceeded.
+    """
+    if resource is None:
+        return
+    hard = resource.getrlimit(resource.RLIMIT_FSIZE)[1]
+    soft = hard if output is None else output + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_FSIZE, (soft, hard))
+
+
+def max_rss_bytes(max_rss):
+    """Converts `ru_maxrss` to bytes, it is in kilobytes except on macOS."""
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def cpu_time():
+    if resource is None:
+        return time.process_time()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def reset_peak_rss():
+    """Resets the peak resident set size of the process where supported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """The peak resident set size since the last reset in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    if resource is None:
+        return None
+    return max_rss_bytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def execute_main(code, path):
+    """Runs the code as `__main__` and returns the exit code of the interpreter."""
+    main = types.ModuleType("__main__")
+    main.__file__ = path
+    main.__builtins__ = builtins
+    main.__cached__ = None
+    sys.modules["__main__"] = main
+    sys.argv = [sys.argv[0]]
+    status = 0
+    try:
+        exec(code, main.__dict__)
+    except SystemExit as e:
+        if e.code is None:
+            status = 0
+        elif isinstance(e.code, int):
+            status = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException:
+        etype, value, tb = sys.exc_info()
+        # Skips the frame of this function.
+        value.__traceback__ = tb.tb_next
+        sys.excepthook(etype, value, tb.tb_next)
+        status = 1
+    try:
+        if "threading" in sys.modules:
+            sys.modules["threading"]._shutdown()
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BaseException:
+        status = 120
+    return status & 0xFF
+
+
+def redirect_to_devnull():
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.close(devnull)
+
+
+def reopen_std_streams():
+    """Replaces the std streams so no buffered data is left from a previous run."""
+    for fd, name in enumerate(["stdin", "stdout", "stderr"]):
+        # The original streams, the code may have replaced the current ones.
+        stream = getattr(sys, f"__{name}__")
+        raw = io.FileIO(fd, "r" if fd == 0 else "w", closefd=False)
+        setattr(
+            sys,
+            name,
+            io.TextIOWrapper(
+                io.BufferedReader(raw) if fd == 0 else io.BufferedWriter(raw),
+                encoding=stream.encoding,
+                errors=stream.errors,
+                newline="\n",
+                line_buffering=stream.line_buffering,
+                write_through=stream.write_through,
+            ),
+        )
+
+
+class Harness:
+    def __init__(self, filename):
+        self.path = os.path.abspath(filename)
+        self.proto_in = os.dup(0)
+        self.proto_out = os.dup(1)
+        redirect_to_devnull()
+        # Same as `python FILENAME`, the directory of the file is first.
+        sys.path[0] = os.path.dirname(self.path)
+        sys.argv = [filename]
+
+    def warm_up(self):
+        try:
+            with open(self.path, "rb") as f:
+                source = f.read()
+            self.code = compile(source, self.path, "exec", dont_inherit=True)
+            warm_imports(ast.parse(source))
+        except Exception:
+            # Errors are reported by running the file normally.
+            write_frame(self.proto_out, {"ok": False})
+            return False
+        write_frame(self.proto_out, {"ok": True})
+        return True
+
+
+class Batch(Harness):
+    def __init__(self, filename, io_dir):
+        super().__init__(filename)
+        self.io_paths = [
+            os.path.join(io_dir, name) for name in ["stdin", "stdout", "stderr"]
+        ]
+        self.cwd = os.getcwd()
+
+    def set_cpu_limit(self, cpu_time):
+        """Limits the cpu time of the next run, the harness process is reused."""
+        if resource is None:
+            return
+        hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+        if cpu_time is None:
+            soft = hard
+        else:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            soft = math.ceil(usage.ru_utime + usage.ru_stime + cpu_time)
+            if hard != resource.RLIM_INFINITY:
+                soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+    def run(self, request):
+        stdin_path, stdout_path, stderr_path = self.io_paths
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        for fd, (path, path_flags) in enumerate(
+            [(stdin_path, os.O_RDONLY), (stdout_path, flags), (stderr_path, flags)]
+        ):
+            file_fd = os.open(path, path_flags, 0o600)
+            os.dup2(file_fd, fd)
+            os.close(file_fd)
+        reset_peak_rss()
+        self.set_cpu_limit(request["cpu_time"])
+        set_output_limit(request["output"])
+        start, start_cpu = time.perf_counter(), cpu_time()
+        exit_code = execute_main(self.code, self.path)
+        for stream in [sys.__stdout__, sys.__stderr__]:
+            try:
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+        usage = [time.perf_counter() - start, cpu_time() - start_cpu, peak_rss()]
+        # Frees the globals of the code before the peak memory of the next run.
+        sys.modules["__main__"].__dict__.clear()
+        self.set_cpu_limit(None)
+        set_output_limit(None)
+        # Output left in the buffers of the streams is discarded.
+        redirect_to_devnull()
+        reopen_std_streams()
+        os.chdir(self.cwd)
+        return exit_code, usage
+
+    def serve(self):
+        while True:
+            try:
+                request, _ = read_frame(self.proto_in)
+            except EOFError:
+                return
+            exit_code, usage = self.run(request)
+            write_frame(self.proto_out, {"exit_code": exit_code, "usage": usage})
+
+
+class Zygote(Harness):
+    def __init__(self, filename):
+        super().__init__(filename)
+        self.selector = selectors.DefaultSelector()
+        self.children = {}
+        self.buffer = b""
+
+    def fork(self, request, stdin):
+        files = [tempfile.TemporaryFile() for _ in range(3)]
+        files[0].write(stdin)
+        files[0].seek(0)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.setsid()
+                self.selector.close()
+                os.close(self.proto_in)
+                os.close(self.proto_out)
+                for fd, f in enumerate(files):
+                    os.dup2(f.fileno(), fd)
+                    f.close()
+                set_limits(request)
+                os._exit(execute_main(self.code, self.path))
+            finally:
+                os._exit(1)
+        files[0].close()
+        timeout = request["timeout"]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pidfd = os.pidfd_open(pid) if hasattr(os, "pidfd_open") else None
+        child = {
+            "request": request,
+            "files": files[1:],
+            "start": time.monotonic(),
+            "deadline": deadline,
+            "pidfd": pidfd,
+            "timed_out": False,
+        }
+        self.children[pid] = child
+        if pidfd is not None:
+            self.selector.register(pidfd, selectors.EVENT_READ, pid)
+
+    def reap(self, pid, wait_status, rusage):
+        child = self.children.pop(pid)
+        usage = [
+            time.monotonic() - child["start"],
+            rusage.ru_utime + rusage.ru_stime,
+            max_rss_bytes(rusage.ru_maxrss),
+        ]
+        if child["pidfd"] is not None:
+            self.selector.unregister(child["pidfd"])
+            os.close(child["pidfd"])
+        outputs = []
+        for f in child["files"]:
+            f.seek(0)
+            outputs.append(f.read())
+            f.close()
+        write_frame(
+            self.proto_out,
+            {
+                "id": child["request"]["id"],
+                "wait_status": wait_status,
+                "timed_out": child["timed_out"],
+                "stdout": len(outputs[0]),
+                "usage": usage,
+            },
+            b"".join(outputs),
+        )
+
+    def try_reap(self, pid):
+        try:
+            waited_pid, wait_status, rusage = os.wait4(pid, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if waited_pid:
+            self.reap(pid, wait_status, rusage)
+
+    def kill_expired(self):
+        now = time.monotonic()
+        for pid, child in self.children.items():
+            if child["deadline"] is not None and child["deadline"] <= now:
+                child["deadline"] = None
+                child["timed_out"] = True
+                kill(pid)
+
+    def next_timeout(self):
+        deadlines = [
+            child["deadline"]
+            for child in self.children.values()
+            if child["deadline"] is not None
+        ]
+        timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+        if any(child["pidfd"] is None for child in self.children.values()):
+            # Without pidfds the children are polled.
+            timeout = 0.001 if timeout is None else min(timeout, 0.001)
+        return timeout
+
+    def read_requests(self):
+        chunk = os.read(self.proto_in, 1 << 16)
+        if not chunk:
+            return False
+        self.buffer += chunk
+        while len(self.buffer) >= FRAME_HEADER.size:
+            header_size, payload_size = FRAME_HEADER.unpack_from(self.buffer)
+            end = FRAME_HEADER.size + header_size + payload_size
+            if len(self.buffer) < end:
+                break
+            header = json.loads(
+                self.buffer[FRAME_HEADER.size : FRAME_HEADER.size + header_size]
+            )
+            self.fork(header, self.buffer[end - payload_size : end])
+            self.buffer = self.buffer[end:]
+        return True
+
+    def serve(self):
+        self.selector.register(self.proto_in, selectors.EVENT_READ, None)
+        running = True
+        while running or self.children:
+            for key, _ in self.selector.select(self.next_timeout()):
+                if key.data is None:
+                    if not self.read_requests():
+                        running = False
+                        self.selector.unregister(self.proto_in)
+                        for pid in self.children:
+                            kill(pid)
+                else:
+                    self.try_reap(key.data)
+            for pid, child in list(self.children.items()):
+                if child["pidfd"] is None:
+                    self.try_reap(pid)
+            self.kill_expired()
+
+
+def main():
+    mode, filename = sys.argv[1:3]
+    if mode == "fork":
+        harness = Zygote(filename)
+    else:
+        harness = Batch(filename, sys.argv[3])
+    if harness.warm_up():
+        harness.serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,39 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 from pathlib import Path
 
 import yaml
-from jinja2 import Environment, FunctionLoader, PackageLoader, select_autoescape
-from marko.ext.gfm import gfm
+from jinja2 import (
+    BaseLoader,
+    BytecodeCache,
+    Environment,
+    PackageLoader,
+    TemplateNotFound,
+    select_autoescape,
+)
+
+from .cache_utils import hash_key, template_cache
+
+# The number of directories of which the environments are kept, and the
+# number of compiled templates kept by each environment.
+RELATIVE_ENVS_SIZE = 64
+TEMPLATE_CACHE_SIZE = 128
 
 package_env = Environment(
     loader=PackageLoader("proqtor", "templates"), autoescape=select_autoescape()
 )
-package_env.filters["gfm"] = gfm.convert
+
+
+def gfm_convert(text: str) -> str:
+    # The gfm extension of marko is imported only when exporting html.
+    from marko.ext.gfm import gfm
+
+    return gfm.convert(text)
+
+
+package_env.filters["gfm"] = gfm_convert
 
 
 class YamlDumper(yaml.SafeDumper):
@@ -23,22 +49,165 @@ YamlDumper.add_representer(list, flow_style_list)
 package_env.filters["yaml"] = lambda x: yaml.dump(x, Dumper=YamlDumper, sort_keys=False)
 
 
+def read_relative_to(path, template) -> str:
+    """Reads the template file relative to the given file or directory."""
+    path = Path(path)
+    if not path.is_dir():
+        path = path.parent
+    return (path / template).read_text()
+
+
+def get_template_hash(path, template) -> str | None:
+    """Returns the hash of the template file relative to the path, None if missing."""
+    try:
+        return hash_key(read_relative_to(path, template))
+    except OSError:
+        return None
+
+
 def load_relative_to(path):
     """Loads the files relative to the given file or directory."""
 
     def inner(template):
-        nonlocal path
-        path = Path(path)
-        if not path.is_dir():
-            path = path.parent
-        return (path / template).read_text()
+        return read_relative_to(path, template)
 
     return inner
 
 
-def get_relative_env(filename):
-    return Environment(
-        loader=FunctionLoader(load_relative_to(filename)),
+# The hashes of the templates loaded by the relative environments are recorded
+# in this dict if set, see `recording_dependencies`.
+template_dependencies: ContextVar[dict | None] = ContextVar(
+    "template_dependencies", default=None
+)
+
+
+@contextmanager
+def recording_dependencies(dependencies: dict | None):
+    """Records the hash of each template loaded within the context by its name.
+
+    The templates missing are recorded as None.
+    """
+    token = template_dependencies.set(dependencies)
+    try:
+        yield
+    finally:
+        template_dependencies.reset(token)
+
+
+def get_file_version(path: Path) -> tuple[int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+class RelativeLoader(BaseLoader):
+    """Loads the templates relative to a directory.
+
+    The templates are reloaded when their modification time or size changes.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.hashes: dict[str, str] = {}
+
+    def get_source(self, environment, template):
+        path = self.path / template
+        try:
+            version = get_file_version(path)
+            source = path.read_text()
+        except OSError:
+            raise TemplateNotFound(template)
+        self.hashes[template] = hash_key(source)
+
+        def uptodate():
+            try:
+                return get_file_version(path) == version
+            except OSError:
+                return False
+
+        return source, str(path), uptodate
+
+
+class RelativeEnvironment(Environment):
+    """An environment of the templates relative to a directory.
+
+    Records the hashes of the templates it loads, including the ones found in
+    its template cache, while `recording_dependencies`.
+    """
+
+    def get_template(self, name, parent=None, globals=None):
+        dependencies = template_dependencies.get()
+        if dependencies is None:
+            return super().get_template(name, parent, globals)
+        try:
+            template = super().get_template(name, parent, globals)
+        except TemplateNotFound:
+            dependencies[name] = None
+            raise
+        dependencies[name] = self.loader.hashes.get(name)
+        return template
+
+
+class DiskBytecodeCache(BytecodeCache):
+    """Stores the compiled templates in the template cache of proqtor."""
+
+    def get_key(self, bucket) -> str:
+        # The source checksum is in the key so that changed templates do not
+        # replace the entries of the templates as they were.
+        return hash_key(bucket.key, bucket.checksum)
+
+    def load_bytecode(self, bucket):
+        entry = template_cache.get(self.get_key(bucket))
+        if entry is not None:
+            try:
+                bucket.bytecode_from_string((entry / "bytecode").read_bytes())
+            except (OSError, ValueError, EOFError):
+                bucket.reset()
+
+    def dump_bytecode(self, bucket):
+        template_cache.put(
+            self.get_key(bucket),
+            lambda entry: (entry / "bytecode").write_bytes(bucket.bytecode_to_string()),
+        )
+
+    def clear(self):
+        template_cache.clear()
+
+
+@lru_cache(maxsize=RELATIVE_ENVS_SIZE)
+def get_dir_env(path: str) -> RelativeEnvironment:
+    return RelativeEnvironment(
+        loader=RelativeLoader(path),
         autoescape=select_autoescape(),
-        cache_size=0,
+        cache_size=TEMPLATE_CACHE_SIZE,
+        bytecode_cache=DiskBytecodeCache(),
     )
+
+
+def get_relative_env(filename) -> RelativeEnvironment:
+    """Returns the environment of the templates relative to the file or directory.
+
+    The environment is shared by all the files in a directory, so that the
+    templates they include are compiled once.
+    """
+    path = Path(filename)
+    if not path.is_dir():
+        path = path.parent
+    return get_dir_env(os.path.abspath(path))
+
+
+TEMPLATE_SYNTAX = ("{{", "{%", "{#")
+
+
+def has_template_syntax(source: str) -> bool:
+    return any(syntax in source for syntax in TEMPLATE_SYNTAX)
+
+
+def render_template_string(env: Environment, source: str) -> str:
+    """Renders the source as a template of the environment.
+
+    Text without any template syntax is returned as jinja would render it,
+    without a trailing newline, instead of compiling a template for it.
+    """
+    if "\r" in source or has_template_syntax(source):
+        return env.from_string(source).render()
+    return source.removesuffix("\n")
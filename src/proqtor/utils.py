@@ -1,7 +1,44 @@
+import asyncio
 import difflib
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from termcolor import cprint
 
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+
+
+def parse_size(size: int | str) -> int:
+    """Parses a size like 4096, "64K", "256M" or "1G" into bytes."""
+    if isinstance(size, int):
+        return size
+    match = re.fullmatch(r"\s*(\d+)\s*([kmg]?)b?\s*", str(size), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Invalid size {size!r}. Use bytes or a K, M or G suffix.")
+    return int(match[1]) * SIZE_UNITS[match[2].lower()]
+
+
+def format_size(size: int) -> str:
+    """Formats a size in bytes in a human readable form."""
+    for unit in ["B", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def head_and_tail(text: str, n_lines: int) -> str:
+    """Keeps the first and the last `n_lines` lines of a long text."""
+    lines = text.splitlines(keepends=True)
+    if len(lines) <= 2 * n_lines:
+        return text
+    skipped = len(lines) - 2 * n_lines
+    return (
+        "".join(lines[:n_lines])
+        + f"... {skipped} lines truncated ...\n"
+        + "".join(lines[-n_lines:])
+    )
+
 
 def color_diff(old_text, new_text):
     """Generate a rich diff with colors using termcolor.
@@ -24,3 +61,42 @@ def color_diff(old_text, new_text):
             cprint(line, "yellow")
         else:  # Unchanged
             print(line)
+
+
+def bounded_imap_unordered(executor, func, iterable, max_pending):
+    """Maps func over iterable in the executor yielding results as they finish.
+
+    At most `max_pending` tasks are submitted at any time so that the memory
+    used by pending tasks and their results stays bounded for long iterables.
+
+    Args:
+        executor (Executor): The executor to submit the tasks to.
+        func (Callable): The function to apply to each item.
+        iterable (Iterable): The items to map over.
+        max_pending (int): The maximum number of tasks in flight.
+    """
+    pending = set()
+    for item in iterable:
+        if len(pending) >= max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        pending.add(executor.submit(func, item))
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def run_sync(coroutine):
+    """Runs the coroutine to completion and returns its result.
+
+    The coroutine is run in a new thread when called from a running event
+    loop, so that the synchronous api can be used from async code.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
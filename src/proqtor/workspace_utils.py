@@ -0,0 +1,140 @@
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing.util import Finalize
+from pathlib import Path
+
+WORKSPACE_ROOT_ENV = "PROQ_WORKSPACE_ROOT"
+SHARED_MEMORY_DIR = "/dev/shm"
+
+
+def get_workspace_root() -> Path:
+    """Returns the directory the workspaces are created in.
+
+    Uses `PROQ_WORKSPACE_ROOT` if set, else `/dev/shm` when it is a writable
+    tmpfs, else the temporary directory of the system.
+    """
+    if os.environ.get(WORKSPACE_ROOT_ENV):
+        return Path(os.environ[WORKSPACE_ROOT_ENV])
+    if os.path.isdir(SHARED_MEMORY_DIR) and os.access(SHARED_MEMORY_DIR, os.W_OK):
+        return Path(SHARED_MEMORY_DIR)
+    return Path(tempfile.gettempdir())
+
+
+def pid_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def remove_stale_pool_dirs(root):
+    """Removes the pool directories of the processes not running anymore."""
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name.isdigit() and not pid_exists(int(entry.name)):
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def clear_dir(path):
+    """Removes the contents of the directory keeping the directory itself."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+
+
+class WorkspacePool:
+    """A pool of empty directories the test cases are run in.
+
+    Creating and deleting a temporary directory for every run is replaced by
+    clearing and reusing the released workspaces. The workspaces of a process
+    are kept in a directory named by its pid under `<root>/proqtor-<uid>`,
+    the directories of processes which are not running anymore are removed
+    when a new pool directory is created.
+    """
+
+    def __init__(self, root: str | os.PathLike | None = None, max_idle: int = 64):
+        self.root = root
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: list[Path] = []
+        self._ids = itertools.count()
+        self._pid = None
+        self._path = None
+
+    @property
+    def path(self) -> Path:
+        """The directory of the workspaces of this process."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # The workspaces of the parent are not shared with a forked child.
+                self._pid = os.getpid()
+                self._idle = []
+                self._path = self._create_pool_dir()
+            return self._path
+
+    def _create_pool_dir(self) -> Path:
+        user = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+        root = Path(self.root or get_workspace_root()) / f"proqtor-{user}"
+        root.mkdir(mode=0o700, parents=True, exist_ok=True)
+        remove_stale_pool_dirs(root)
+        path = root / str(os.getpid())
+        shutil.rmtree(path, ignore_errors=True)
+        path.mkdir(mode=0o700)
+        # Unlike atexit, also run when a multiprocessing worker exits.
+        Finalize(
+            None,
+            shutil.rmtree,
+            args=(path,),
+            kwargs={"ignore_errors": True},
+            exitpriority=0,
+        )
+        return path
+
+    def acquire(self) -> Path:
+        """Returns an empty workspace."""
+        path = self.path
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        workspace = path / str(next(self._ids))
+        workspace.mkdir()
+        return workspace
+
+    def release(self, workspace: Path):
+        """Clears the workspace and keeps it for reuse."""
+        try:
+            clear_dir(workspace)
+        except OSError:
+            # Eg. the code made a directory read only.
+            shutil.rmtree(workspace, ignore_errors=True)
+            return
+        with self._lock:
+            if workspace.parent == self._path and len(self._idle) < self.max_idle:
+                self._idle.append(workspace)
+                return
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    @contextmanager
+    def workspace(self):
+        """An empty workspace within the context."""
+        workspace = self.acquire()
+        try:
+            yield workspace
+        finally:
+            self.release(workspace)
+
+
+workspace_pool = WorkspacePool()
@@ -0,0 +1,36 @@
+import sys
+
+import pytest
+
+from proqtor.cache_utils import CACHE_DIR_ENV, NO_CACHE_ENV
+
+# Python sources of which the output is the same with every executor.
+PYTHON_CODES = [
+    "print(input() * 2)",
+    "import sys\nprint('out')\nprint('err', file=sys.stderr)\nsys.exit(3)",
+    "raise ValueError(input())",
+    "import sys; sys.exit('message')",
+    "import atexit\natexit.register(lambda: print('at exit'))\nprint(__name__)",
+]
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keeps the caches written by each test in its temporary directory."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv(CACHE_DIR_ENV, str(cache_dir))
+    # Also undoes `set_caching(False)` in the test.
+    monkeypatch.delenv(NO_CACHE_ENV, raising=False)
+    return cache_dir
+
+
+@pytest.fixture
+def run_in(tmp_path, monkeypatch):
+    """Writes the code to test.py in the current directory and returns its command."""
+    monkeypatch.chdir(tmp_path)
+
+    def write_code(code):
+        (tmp_path / "test.py").write_text(code)
+        return f"{sys.executable} test.py"
+
+    return write_code
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+from conftest import PYTHON_CODES
+
+from proqtor.batch_runner import run_batch
+from proqtor.execute_utils import ExitStatus, ResourceLimits, run_command
+
+CODES = PYTHON_CODES + [
+    "import sys\nsys.stdout.write(sys.stdin.read())",
+]
+
+
+@pytest.mark.parametrize("code", CODES)
+def test_batch_output_same_as_subprocess(run_in, code):
+    command = run_in(code)
+    stdins = ["abc\n", "12\n", "x\ny\n"]
+    # The resource usage differs between the runs.
+    assert [result[:3] for result in run_batch(command, "test.py", stdins)] == [
+        run_command(command, stdin)[:3] for stdin in stdins
+    ]
+
+
+def test_batch_not_run_on_syntax_error(run_in):
+    assert run_batch(run_in("print("), "test.py", ["1\n"]) is None
+
+
+def test_batch_crash_fails_only_its_test_case(run_in):
+    command = run_in(
+        "import os\nn = input()\nprint(n)\nif n == 'crash':\n    os.abort()"
+    )
+    results = run_batch(command, "test.py", ["1", "crash", "2"])
+    assert [result.status for result in results] == [
+        ExitStatus.OK,
+        ExitStatus.ERROR,
+        ExitStatus.OK,
+    ]
+    assert results[2].output == "2\n"
+
+
+def test_batch_timeout_resumes(run_in):
+    command = run_in("n = input()\nwhile n == 'loop': pass\nprint(n)")
+    start = time.monotonic()
+    results = run_batch(
+        command, "test.py", ["1", "loop", "2"], limits=ResourceLimits(timeout=0.5)
+    )
+    assert time.monotonic() - start < 5
+    assert [result.status for result in results] == [
+        ExitStatus.OK,
+        ExitStatus.TIMEOUT,
+        ExitStatus.OK,
+    ]
+    assert results[2].output == "2\n"
+
+
+def test_batch_output_limit(run_in):
+    command = run_in("n = input()\nwhile n == 'flood': print('x' * 1000)\nprint(n)")
+    results = run_batch(
+        command, "test.py", ["1", "flood", "2"], limits=ResourceLimits(output=10**6)
+    )
+    assert [result.status for result in results] == [
+        ExitStatus.OK,
+        ExitStatus.OUTPUT,
+        ExitStatus.OK,
+    ]
+    assert results[2].output == "2\n"
+
+
+def test_batch_peak_memory_of_each_test_case(run_in):
+    command = run_in("n = int(input())\ndata = b'x' * (n * 1024**2)")
+    results = run_batch(command, "test.py", ["128", "1"])
+    assert results[0].usage.max_rss >= 128 * 1024**2
+    assert results[1].usage.max_rss < 128 * 1024**2
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from proqtor.cache_utils import DiskCache, hash_key
+
+
+def write_bytes(size):
+    def fill(entry):
+        (entry / "data").write_bytes(b"x" * size)
+
+    return fill
+
+
+def test_hash_key_part_boundaries():
+    assert hash_key("ab", "c") != hash_key("a", "bc")
+    assert hash_key("a", None) != hash_key("a", "")
+
+
+def test_disk_cache_get_put():
+    cache = DiskCache("test", max_size="1K")
+    assert cache.get("key") is None
+    entry = cache.put("key", write_bytes(10))
+    assert cache.get("key") == entry
+    assert (entry / "data").read_bytes() == b"x" * 10
+    assert cache.stats() == (1, 10)
+    cache.clear()
+    assert cache.get("key") is None
+
+
+def test_disk_cache_evicts_least_recently_used():
+    cache = DiskCache("test", max_size=300)
+    for i, key in enumerate(["a", "b", "c"]):
+        entry = cache.put(key, write_bytes(100))
+        os.utime(entry, (i, i))
+    # Reading "a" makes "b" the least recently used entry.
+    cache.get("a")
+    cache.put("d", write_bytes(100))
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in ["a", "c", "d"])
+
+
+def test_disk_cache_invalid_size_env(monkeypatch):
+    cache = DiskCache("test", max_size="1K", size_env="PROQ_TEST_CACHE_SIZE")
+    monkeypatch.setenv("PROQ_TEST_CACHE_SIZE", "2K")
+    assert cache.max_size == 2048
+    monkeypatch.setenv("PROQ_TEST_CACHE_SIZE", "lots")
+    with pytest.warns(UserWarning, match="PROQ_TEST_CACHE_SIZE"):
+        assert cache.max_size == 1024
+
+
+def test_disk_cache_keeps_size_across_processes(cache_dir, monkeypatch):
+    DiskCache("test", max_size="1K").put("a", write_bytes(100))
+    # Another process adds to the size kept in the cache instead of walking it.
+    cache = DiskCache("test", max_size="1K")
+    monkeypatch.setattr(cache, "stats", lambda: pytest.fail("walked the cache"))
+    cache.put("b", write_bytes(200))
+    assert (cache_dir / "test/.size").read_text() == "300"
+    cache.remove("a")
+    assert (cache_dir / "test/.size").read_text() == "200"
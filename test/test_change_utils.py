@@ -0,0 +1,83 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from proqtor.change_utils import ChangedFiles, parse_timestamp
+from proqtor.cli.cli import is_proq_changed
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "../examples/python")
+
+
+def git(*args, cwd):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@test", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+def test_parse_timestamp():
+    assert parse_timestamp(10) == 10.0
+    assert parse_timestamp("1.5") == 1.5
+    assert parse_timestamp("1970-01-01T00:00:10+00:00") == 10.0
+    assert parse_timestamp("HEAD~1") is None
+
+
+def test_proqs_changed_since_git_ref(tmp_path):
+    shutil.copytree(EXAMPLES_DIR, tmp_path / "python")
+    git("init", cwd=tmp_path)
+    git("add", ".", cwd=tmp_path)
+    git("commit", "-m", "proqs", cwd=tmp_path)
+    proqs_dir = tmp_path / "python/function_type_problems"
+    including = ["delete_first_three.md", "sum_of_squares_of_keys.md"]
+    proq_files = sorted(os.listdir(proqs_dir))
+    assert set(including) < set(proq_files)
+
+    changed_files = ChangedFiles("HEAD")
+    assert not any(is_proq_changed(proqs_dir / f, changed_files) for f in proq_files)
+
+    include = tmp_path / "python/function_type_and_modify_check_suffix.py.jinja"
+    include.write_text(include.read_text() + "\n")
+    changed_files = ChangedFiles("HEAD")
+    assert [f for f in proq_files if is_proq_changed(proqs_dir / f, changed_files)] == (
+        including
+    )
+
+    git("commit", "-am", "changed include", cwd=tmp_path)
+    (proqs_dir / "new.md").write_text("not a proq")
+    changed_files = ChangedFiles("HEAD~1")
+    assert [
+        f
+        for f in sorted(os.listdir(proqs_dir))
+        if is_proq_changed(proqs_dir / f, changed_files)
+    ] == sorted(including + ["new.md"])
+
+
+def test_proqs_changed_since_timestamp(tmp_path):
+    shutil.copytree(EXAMPLES_DIR, tmp_path / "python")
+    for path in (tmp_path / "python").rglob("*"):
+        os.utime(path, (0, 0))
+    proqs_dir = tmp_path / "python/function_type_problems"
+    changed_files = ChangedFiles("1970-01-02T00:00:00+00:00")
+    assert not is_proq_changed(proqs_dir / "delete_first_three.md", changed_files)
+    include = tmp_path / "python/function_type_and_modify_check_suffix.py.jinja"
+    os.utime(include)
+    assert is_proq_changed(proqs_dir / "delete_first_three.md", changed_files)
+
+
+def test_numeric_git_ref_not_taken_as_timestamp(tmp_path):
+    shutil.copytree(EXAMPLES_DIR, tmp_path / "python")
+    git("init", cwd=tmp_path)
+    git("add", ".", cwd=tmp_path)
+    git("commit", "-m", "proqs", cwd=tmp_path)
+    git("tag", "2024.1", cwd=tmp_path)
+    proq_file = tmp_path / "python/function_type_problems/delete_first_three.md"
+    for since in ["2024.1", 2024.1]:
+        assert not is_proq_changed(proq_file, ChangedFiles(since))
+    # Not a commit of the repository, taken as a timestamp.
+    assert is_proq_changed(proq_file, ChangedFiles(10))
+    with pytest.raises(ValueError, match="neither a git commit"):
+        proq_file in ChangedFiles("no-such-ref")
@@ -0,0 +1,54 @@
+import os
+import shutil
+import subprocess
+import sys
+
+from proqtor.cli.cli import evaluate_files
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "../examples/python")
+
+
+def split_evaluation_output(output: str) -> tuple[list[str], str]:
+    """Splits the output into the blocks of each proq and the summary."""
+    outputs, summary = output.split("Total of ")
+    return outputs.split("Evaluating ")[1:], summary
+
+
+def test_evaluate_jobs_same_as_serial(tmp_path, capsys):
+    shutil.copytree(EXAMPLES_DIR, tmp_path / "python")
+    (tmp_path / "python/invalid.md").write_text("No front matter")
+    files = sorted(map(str, (tmp_path / "python").rglob("*.md")))
+
+    outputs = {}
+    for jobs in [1, 2]:
+        evaluate_files(files, False, False, jobs, False, False)
+        outputs[jobs] = split_evaluation_output(capsys.readouterr().out)
+    serial_blocks, serial_summary = outputs[1]
+    blocks, summary = outputs[2]
+    assert summary == serial_summary
+    # The output of each proq is printed whole as it finishes.
+    assert sorted(blocks) == sorted(serial_blocks)
+    assert len(serial_blocks) == len(files)
+    assert any("Yaml header not found." in block for block in serial_blocks)
+
+
+def test_help_with_invalid_env():
+    env = {
+        **os.environ,
+        "PROQ_MAX_PROCS": "many",
+        "PROQ_RESULT_CACHE_SIZE": "lots",
+    }
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; sys.argv = ['proq', '--help']; "
+            "import proqtor.cache_utils, proqtor.execute_utils; "
+            "from proqtor.cli.cli import main; main()",
+        ],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "Traceback" not in result.stderr
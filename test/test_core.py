@@ -0,0 +1,195 @@
+import glob
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from proqtor.cache_utils import set_caching
+from proqtor.core import (
+    CorrectOutputsError,
+    ProQ,
+    ProqParseError,
+    load_nested_proq_from_file,
+)
+from proqtor.core_components import ExecuteConfig, Solution
+from proqtor.core_components import TestCase as ProqTestCase
+from proqtor.evaluate_utils import ProqCheck
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "../examples/python")
+
+
+def make_proq(k, executor=None):
+    """A proq whose solution adds k to the input after a roundtrip through a file."""
+    solution = (
+        "n = int(input())\n"
+        "with open('value.txt', 'w') as f:\n"
+        f"    f.write(str(n + {k}))\n"
+        "with open('value.txt') as f:\n"
+        "    print(f.read())\n"
+    )
+    return ProQ(
+        title=f"Add {k}",
+        statement="Add to the input.",
+        public_test_cases=[
+            ProqTestCase(input=f"{i}\n", output=f"{i + k}\n") for i in range(3)
+        ],
+        private_test_cases=[
+            ProqTestCase(input=f"{i}\n", output=f"{i + k}\n") for i in range(3, 6)
+        ],
+        solution=Solution(
+            tagged_template=f"<sol>{solution}</sol><los>print(input())</los>",
+            execute_config=ExecuteConfig(
+                source_filename="test.py",
+                run=f"{sys.executable} test.py",
+                executor=executor,
+            ),
+        ),
+    )
+
+
+@pytest.fixture
+def no_cache():
+    set_caching(False)
+
+
+@pytest.mark.parametrize("executor", [None, "fork", "batch"])
+def test_concurrent_evaluate_from_threads(no_cache, executor):
+    cwd = os.getcwd()
+    proqs = [make_proq(k, executor) for k in range(1, 17)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        checks = list(pool.map(ProQ.evaluate, proqs))
+    assert checks == [ProqCheck(solution_check=True, template_check=True)] * 16
+    assert os.getcwd() == cwd
+
+
+def test_correct_outputs_does_not_change_cwd(no_cache):
+    cwd = os.getcwd()
+    proq = make_proq(7)
+    for test_case in proq.public_test_cases:
+        test_case.output = ""
+    corrected = proq.correct_outputs()
+    assert [test_case.output for test_case in corrected.public_test_cases] == [
+        "7\n",
+        "8\n",
+        "9\n",
+    ]
+    assert os.getcwd() == cwd
+    assert not os.path.exists(os.path.join(cwd, "value.txt"))
+
+
+def test_correct_outputs_over_output_limit(no_cache):
+    proq = make_proq(7)
+    proq.solution.execute_config.output_limit = "1K"
+    proq.private_test_cases[1].input = "20000\n"
+    proq.solution.tagged_template = "<sol>print('x' * int(input()))</sol>"
+    outputs = [test_case.output for test_case in proq.private_test_cases]
+    with pytest.raises(CorrectOutputsError, match="private test case 2"):
+        proq.correct_outputs(inplace=True)
+    assert [test_case.output for test_case in proq.private_test_cases] == outputs
+
+
+def test_correct_outputs_copies_only_the_test_cases(no_cache):
+    proq = make_proq(7)
+    proq.public_test_cases[0].output = ""
+    corrected = proq.correct_outputs()
+    assert corrected.public_test_cases[0].output == "7\n"
+    assert proq.public_test_cases[0].output == ""
+    assert corrected.model_dump() == proq.model_dump() | {
+        "public_test_cases": [
+            {"input": f"{i}\n", "output": f"{i + 7}\n"} for i in range(3)
+        ]
+    }
+    assert corrected.solution is not proq.solution
+    assert corrected.private_test_cases[0] is not proq.private_test_cases[0]
+    assert proq.correct_outputs(inplace=True) is proq
+    assert proq.model_dump() == corrected.model_dump()
+
+
+def test_parse_cache_invalidated_by_changed_include(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROQ_PARSE_CACHE", "1")
+    shutil.copytree(EXAMPLES_DIR, tmp_path / "python")
+    proq_file = tmp_path / "python/function_type_problems/delete_first_three.md"
+    include = tmp_path / "python/function_type_and_modify_check_suffix.py.jinja"
+    parsed = ProQ.from_file(proq_file)
+    from_str = ProQ.from_str
+    monkeypatch.setattr(ProQ, "from_str", None)
+    cached = ProQ.from_file(proq_file)
+    assert cached.model_dump() == parsed.model_dump()
+    assert cached.model_fields_set == parsed.model_fields_set
+    assert cached.execute_config == parsed.execute_config
+
+    include.write_text(include.read_text() + "\nprint('changed')\n")
+    monkeypatch.setattr(ProQ, "from_str", from_str)
+    reparsed = ProQ.from_file(proq_file)
+    assert "print('changed')" in reparsed.solution.suffix_invisible
+    monkeypatch.setattr(ProQ, "from_str", None)
+    assert ProQ.from_file(proq_file).model_dump() == reparsed.model_dump()
+
+
+@pytest.mark.parametrize(
+    "proq_file",
+    sorted(glob.glob(os.path.join(EXAMPLES_DIR, "**/*.md"), recursive=True)),
+)
+def test_lazy_proq_counts_test_cases_without_parsing(proq_file):
+    lazy_proq = ProQ.lazy_from_file(proq_file)
+    assert lazy_proq.title and isinstance(lazy_proq.tags, list)
+    n_public, n_private = lazy_proq.count_test_cases()
+    proq = ProQ.from_file(proq_file)
+    assert (n_public, n_private) == (
+        len(proq.public_test_cases),
+        len(proq.private_test_cases),
+    )
+    assert lazy_proq.title == proq.title
+    assert lazy_proq.solution == proq.solution
+
+
+def test_lazy_proq_parses_only_when_needed(tmp_path):
+    proq_file = tmp_path / "proq.md"
+    proq_file.write_text(ProQ.default_proq(n_public=2, n_private=3).to_str())
+    lazy_proq = ProQ.lazy_from_file(proq_file)
+    assert lazy_proq.count_test_cases() == (2, 3)
+    assert "proq" not in lazy_proq.__dict__
+    assert len(lazy_proq.private_test_cases) == 3
+    assert "proq" in lazy_proq.__dict__
+
+
+def test_load_nested_proq_parses_each_file_once(tmp_path, monkeypatch):
+    shutil.copytree(EXAMPLES_DIR, tmp_path / "python")
+    yaml_file = tmp_path / "python/assessment.yaml"
+    expected = load_nested_proq_from_file(yaml_file)
+    yaml_file.write_text(
+        yaml_file.read_text()
+        + "  - title: Section 3\n"
+        + "    content:\n"
+        + "      - title: Problem 5\n"
+        + "        content: ./function_type_problems/sum_even_indices.md\n"
+    )
+    parsed = []
+    from_file = ProQ.from_file
+
+    def recording_from_file(proq_file, *args, **kwargs):
+        parsed.append(os.path.basename(proq_file))
+        return from_file(proq_file, *args, **kwargs)
+
+    monkeypatch.setattr(ProQ, "from_file", recording_from_file)
+    nested_proq = load_nested_proq_from_file(yaml_file)
+    assert len(parsed) == len(set(parsed)) == 4
+    assert nested_proq.content[:2] == expected.content
+    assert nested_proq.content[2].content[0].content is (
+        nested_proq.content[1].content[1].content
+    )
+
+
+def test_load_nested_proq_in_processes(tmp_path):
+    shutil.copytree(EXAMPLES_DIR, tmp_path / "python")
+    yaml_file = tmp_path / "python/assessment.yaml"
+    assert load_nested_proq_from_file(yaml_file, jobs=2) == (
+        load_nested_proq_from_file(yaml_file)
+    )
+    (tmp_path / "python/function_type_problems/sum_even_indices.md").write_text(
+        "No front matter"
+    )
+    with pytest.raises(ProqParseError, match="Yaml header not found."):
+        load_nested_proq_from_file(yaml_file, jobs=2)
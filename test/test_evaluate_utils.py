@@ -0,0 +1,92 @@
+import asyncio
+import sys
+import time
+
+from proqtor.cache_utils import set_caching
+from proqtor.core_components import TestCase as ProqTestCase
+from proqtor.evaluate_utils import (
+    Verdict,
+    aget_test_case_results,
+    get_test_case_results,
+)
+
+RUN_COMMAND = f"{sys.executable} test.py"
+TEST_CASES = [
+    ProqTestCase(input="1\n", output="1\n"),
+    ProqTestCase(input="2\n", output="3\n"),
+]
+
+
+def test_get_test_case_results():
+    results = get_test_case_results(
+        "print(input())", TEST_CASES, "test.py", RUN_COMMAND
+    )
+    assert [result.verdict for result in results] == [Verdict.PASSED, Verdict.FAILED]
+    assert [result.actual_output for result in results] == ["1\n", "2\n"]
+
+
+def test_get_test_case_results_cached():
+    code = "print(input())"
+    results = get_test_case_results(code, TEST_CASES[:1], "test.py", RUN_COMMAND)
+    assert not any(result.cached for result in results)
+
+    results = get_test_case_results(code, TEST_CASES, "test.py", RUN_COMMAND)
+    assert [result.cached for result in results] == [True, False]
+    assert [result.passed for result in results] == [True, False]
+
+    set_caching(False)
+    results = get_test_case_results(code, TEST_CASES, "test.py", RUN_COMMAND)
+    assert not any(result.cached for result in results)
+
+
+def test_aget_test_case_results_concurrently():
+    set_caching(False)
+
+    async def main():
+        return await asyncio.gather(
+            *(
+                aget_test_case_results(
+                    f"print(int(input()) + {i})", TEST_CASES, "test.py", RUN_COMMAND
+                )
+                for i in range(20)
+            )
+        )
+
+    for i, results in enumerate(asyncio.run(main())):
+        assert [result.actual_output for result in results] == [
+            f"{1 + i}\n",
+            f"{2 + i}\n",
+        ]
+
+
+def test_get_test_case_results_stop_on():
+    set_caching(False)
+    test_cases = TEST_CASES + [ProqTestCase(input="3\n", output="3\n")]
+    results = get_test_case_results(
+        "print(input())",
+        test_cases,
+        "test.py",
+        RUN_COMMAND,
+        executor="batch",
+        stop_on=lambda result: not result.passed,
+    )
+    assert [result.verdict for result in results] == [
+        Verdict.PASSED,
+        Verdict.FAILED,
+        Verdict.SKIPPED,
+    ]
+
+
+def test_get_test_case_results_stop_on_cancels_runs():
+    set_caching(False)
+    code = "import time\nn = input()\nif n != '1':\n    time.sleep(30)\nprint(n)"
+    start = time.monotonic()
+    results = get_test_case_results(
+        code,
+        TEST_CASES,
+        "test.py",
+        RUN_COMMAND,
+        stop_on=lambda result: result.passed,
+    )
+    assert time.monotonic() - start < 10
+    assert [result.verdict for result in results] == [Verdict.PASSED, Verdict.SKIPPED]
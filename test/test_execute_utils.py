@@ -0,0 +1,302 @@
+import asyncio
+import signal
+import sys
+import threading
+import time
+
+import pytest
+
+from proqtor.execute_utils import (
+    OUTPUT_KEEP_SIZE,
+    ExecutionScheduler,
+    ExitStatus,
+    ResourceLimits,
+    ResourceUsage,
+    arun_command,
+    default_max_concurrency,
+    get_exit_status,
+    run_command,
+    spawn_process,
+)
+
+
+def run_concurrently(scheduler, requests):
+    """Runs the (weight, group) requests in threads and returns the peak usage."""
+    lock = threading.Lock()
+    usage = {"current": 0, "peak": 0}
+
+    def work(weight, group):
+        with scheduler.slot(weight, group):
+            with lock:
+                usage["current"] += weight
+                usage["peak"] = max(usage["peak"], usage["current"])
+            time.sleep(0.01)
+            with lock:
+                usage["current"] -= weight
+
+    threads = [threading.Thread(target=work, args=request) for request in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return usage["peak"]
+
+
+def test_scheduler_limits_concurrency():
+    scheduler = ExecutionScheduler(max_concurrency=3)
+    assert run_concurrently(scheduler, [(1, None)] * 20) == 3
+
+
+def test_scheduler_respects_weights():
+    scheduler = ExecutionScheduler(max_concurrency=4)
+    assert run_concurrently(scheduler, [(2, None)] * 10) == 4
+
+
+def test_scheduler_runs_overweight_requests_alone():
+    scheduler = ExecutionScheduler(max_concurrency=2)
+    assert run_concurrently(scheduler, [(5, None)] * 3) == 5
+
+
+def test_scheduler_serves_groups_round_robin():
+    scheduler = ExecutionScheduler(max_concurrency=1)
+    order = []
+    scheduler.acquire()
+    threads = []
+    for group, n in (("a", 3), ("b", 2)):
+        for i in range(n):
+            thread = threading.Thread(
+                target=lambda group=group, i=i: (
+                    scheduler.acquire(group=group),
+                    order.append((group, i)),
+                    scheduler.release(),
+                )
+            )
+            thread.start()
+            # Keeps the arrival order deterministic.
+            time.sleep(0.01)
+            threads.append(thread)
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+    assert [group for group, _ in order] == ["a", "b", "a", "b", "a"]
+
+
+def test_scheduler_limits_async_waiters():
+    scheduler = ExecutionScheduler(max_concurrency=2)
+    usage = {"current": 0, "peak": 0}
+
+    async def work():
+        async with scheduler.aslot():
+            usage["current"] += 1
+            usage["peak"] = max(usage["peak"], usage["current"])
+            await asyncio.sleep(0.01)
+            usage["current"] -= 1
+
+    async def main():
+        await asyncio.gather(*(work() for _ in range(10)))
+
+    asyncio.run(main())
+    assert usage["peak"] == 2
+
+
+def test_scheduler_cancelled_async_waiter():
+    scheduler = ExecutionScheduler(max_concurrency=1)
+
+    async def main():
+        scheduler.acquire()
+        waiter = asyncio.create_task(scheduler.aacquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release()
+        # Nothing is left queued or acquired by the cancelled waiter.
+        await asyncio.wait_for(scheduler.aacquire(), 1)
+
+    asyncio.run(main())
+
+
+def python_command(tmp_path, code):
+    path = tmp_path / "test.py"
+    path.write_text(code)
+    return f"{sys.executable} {path}"
+
+
+def test_run_command_wall_time_limit(tmp_path):
+    start = time.monotonic()
+    result = run_command(
+        python_command(tmp_path, "while True: pass"), limits=ResourceLimits(timeout=0.5)
+    )
+    assert result.status == ExitStatus.TIMEOUT
+    assert time.monotonic() - start < 5
+
+
+def test_run_command_kills_process_tree_on_timeout(tmp_path):
+    code = (
+        "import subprocess, sys\n"
+        "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+        "while True: pass\n"
+    )
+    start = time.monotonic()
+    result = run_command(
+        python_command(tmp_path, code), limits=ResourceLimits(timeout=0.5)
+    )
+    assert result.status == ExitStatus.TIMEOUT
+    # The sleeping grandchild keeps the pipes open unless it is killed.
+    assert time.monotonic() - start < 5
+
+
+def test_run_command_cpu_time_limit(tmp_path):
+    result = run_command(
+        python_command(tmp_path, "while True: pass"), limits=ResourceLimits(cpu_time=1)
+    )
+    assert result.status == ExitStatus.TIMEOUT
+
+
+def test_run_command_memory_limit(tmp_path):
+    result = run_command(
+        python_command(tmp_path, "x = bytearray(1024 ** 3)"),
+        limits=ResourceLimits(memory=256 * 1024**2),
+    )
+    assert result.status == ExitStatus.MEMORY
+
+
+def test_run_command_killed_is_not_timeout(tmp_path):
+    code = "import os, signal\nos.kill(os.getpid(), signal.SIGKILL)"
+    result = run_command(
+        python_command(tmp_path, code), limits=ResourceLimits(cpu_time=5)
+    )
+    assert result.returncode == -signal.SIGKILL
+    assert result.status == ExitStatus.ERROR
+
+
+def test_run_command_out_of_memory_message(tmp_path):
+    limits = ResourceLimits(memory=256 * 1024**2)
+    code = "import sys\nprint('out of memory', file=sys.stderr)"
+    result = run_command(python_command(tmp_path, code), limits=limits)
+    assert result.status == ExitStatus.OK
+    result = run_command(python_command(tmp_path, code + "\nexit(1)"), limits=limits)
+    assert result.status == ExitStatus.MEMORY
+
+
+def test_get_exit_status_sigkill():
+    limits = ResourceLimits(cpu_time=1)
+    status = get_exit_status(-signal.SIGKILL, "", limits, ResourceUsage(3, 0.1))
+    assert status == ExitStatus.ERROR
+    status = get_exit_status(-signal.SIGKILL, "", limits, ResourceUsage(3, 2.0))
+    assert status == ExitStatus.TIMEOUT
+
+
+def test_run_command_limits_from_threads(tmp_path):
+    code = (
+        "import resource\n"
+        "print(resource.getrlimit(resource.RLIMIT_CPU))\n"
+        "print(resource.getrlimit(resource.RLIMIT_AS))\n"
+    )
+    command = python_command(tmp_path, code)
+    limits = ResourceLimits(cpu_time=1.5, memory=512 * 1024**2)
+    expected = f"(2, 3)\n({limits.memory}, {limits.memory})\n"
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(run_command(command, limits=limits))
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [result.output for result in results] == [expected] * 4
+
+
+def test_run_command_status(tmp_path):
+    assert run_command(python_command(tmp_path, "print(1)"))[:3] == (
+        "1\n",
+        0,
+        ExitStatus.OK,
+    )
+    assert run_command(python_command(tmp_path, "exit(3)")).status == ExitStatus.ERROR
+
+
+def test_arun_command_keeps_output_on_timeout(tmp_path):
+    code = "print('started', flush=True)\nwhile True: pass"
+    result = asyncio.run(
+        arun_command(python_command(tmp_path, code), limits=ResourceLimits(timeout=0.5))
+    )
+    assert result.status == ExitStatus.TIMEOUT
+    assert result.output == "started\n"
+
+
+def test_arun_command_cancelled(tmp_path, monkeypatch):
+    processes = []
+
+    def recording_spawn_process(*args):
+        processes.append(spawn_process(*args))
+        return processes[-1]
+
+    monkeypatch.setattr("proqtor.execute_utils.spawn_process", recording_spawn_process)
+    errors = []
+
+    async def main():
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: errors.append(context)
+        )
+        task = asyncio.create_task(
+            arun_command(python_command(tmp_path, "while True: pass"))
+        )
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    # No future is left with an exception never retrieved.
+    assert errors == []
+    # The killed process is reaped.
+    assert processes[0].returncode == -signal.SIGKILL
+
+
+def test_run_command_in_running_loop(tmp_path):
+    async def main():
+        return run_command(python_command(tmp_path, "print(1)"))
+
+    assert asyncio.run(main()).output == "1\n"
+
+
+def test_run_command_output_limit(tmp_path):
+    code = "while True: print('x' * 1000)"
+    result = run_command(
+        python_command(tmp_path, code), limits=ResourceLimits(output=1024**2)
+    )
+    assert result.status == ExitStatus.OUTPUT
+    assert "bytes truncated" in result.output
+    assert len(result.output) < 3 * OUTPUT_KEEP_SIZE
+
+
+def test_run_command_under_output_limit(tmp_path):
+    code = "print('x' * 1000)"
+    result = run_command(
+        python_command(tmp_path, code), limits=ResourceLimits(output=1001)
+    )
+    assert result[:3] == ("x" * 1000 + "\n", 0, ExitStatus.OK)
+
+
+def test_run_command_resource_usage(tmp_path):
+    code = (
+        "import time\n"
+        "data = b'x' * (256 * 1024**2)\n"
+        "start = time.process_time()\n"
+        "while time.process_time() - start < 0.3: pass\n"
+    )
+    usage = run_command(python_command(tmp_path, code)).usage
+    assert usage.cpu_time >= 0.3
+    assert usage.wall_time >= usage.cpu_time * 0.5
+    assert usage.max_rss >= 256 * 1024**2
+
+
+def test_default_max_concurrency_invalid_env(monkeypatch):
+    monkeypatch.setenv("PROQ_MAX_PROCS", "3")
+    assert default_max_concurrency() == 3
+    monkeypatch.setenv("PROQ_MAX_PROCS", "many")
+    with pytest.warns(UserWarning, match="PROQ_MAX_PROCS"):
+        assert default_max_concurrency() >= 1
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+from conftest import PYTHON_CODES
+
+from proqtor.execute_utils import ExitStatus, ResourceLimits, run_command
+from proqtor.fork_server import ForkServer, get_interpreter_args
+
+CODES = PYTHON_CODES + [
+    "import os\nprint(__file__ == os.path.abspath('test.py'))",
+]
+
+
+def test_get_interpreter_args():
+    assert get_interpreter_args("python test.py", "test.py") == ["python"]
+    assert get_interpreter_args("python3 -u test.py", "test.py") == ["python3", "-u"]
+    assert get_interpreter_args("./test", "test.c") is None
+    assert get_interpreter_args("python -m test.py", "test.py") is None
+    assert get_interpreter_args("python test.py arg", "test.py") is None
+
+
+@pytest.mark.parametrize("code", CODES)
+def test_fork_server_output_same_as_subprocess(run_in, code):
+    command = run_in(code)
+    with ForkServer.start(command, "test.py") as fork_server:
+        for stdin in ["abc\n", "12\n"]:
+            # The resource usage differs between the runs.
+            assert (
+                fork_server.run_command(command, stdin)[:3]
+                == run_command(command, stdin)[:3]
+            )
+
+
+def test_fork_server_not_started_on_syntax_error(run_in):
+    assert ForkServer.start(run_in("print("), "test.py") is None
+
+
+def test_fork_server_timeout(run_in):
+    command = run_in("while True: pass")
+    with ForkServer.start(command, "test.py") as fork_server:
+        start = time.monotonic()
+        result = fork_server.run_command(command, limits=ResourceLimits(timeout=0.5))
+        assert result.status == ExitStatus.TIMEOUT
+        assert time.monotonic() - start < 5
+
+
+def test_fork_server_output_limit(run_in):
+    command = run_in("while True: print('x' * 1000)")
+    with ForkServer.start(command, "test.py") as fork_server:
+        result = fork_server.run_command(command, limits=ResourceLimits(output=10**6))
+        assert result.status == ExitStatus.OUTPUT
+
+
+def test_fork_server_resource_usage(run_in):
+    command = run_in("data = b'x' * (128 * 1024**2)")
+    with ForkServer.start(command, "test.py") as fork_server:
+        usage = fork_server.run_command(command).usage
+        assert usage.max_rss >= 128 * 1024**2
+        assert usage.cpu_time <= usage.wall_time + 0.1
@@ -0,0 +1,48 @@
+import json
+import subprocess
+import sys
+
+# Imported by the commands which use them rather than at startup.
+LAZY_MODULES = [
+    "proqtor.core",
+    "pydantic",
+    "jinja2",
+    "marko",
+    "yaml",
+    "importlib.metadata",
+    "concurrent.futures.process",
+    "langchain",
+]
+
+IMPORT_TIMES = """
+import json, sys, time
+start = time.perf_counter()
+import fire
+fire_time = time.perf_counter() - start
+start = time.perf_counter()
+import proqtor.cli.cli
+cli_time = time.perf_counter() - start
+print(json.dumps({"fire": fire_time, "cli": cli_time, "modules": list(sys.modules)}))
+"""
+
+
+def measure_imports():
+    return json.loads(
+        subprocess.run(
+            [sys.executable, "-c", IMPORT_TIMES],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    )
+
+
+def test_cli_startup_imports():
+    results = [measure_imports() for _ in range(5)]
+    modules = results[0]["modules"]
+    assert [module for module in LAZY_MODULES if module in modules] == []
+    # The startup is dominated by fire, which imports asyncio as well. The best
+    # of several runs is compared, as single runs are noisy on a loaded machine.
+    fire_time = min(result["fire"] for result in results)
+    cli_time = min(result["cli"] for result in results)
+    assert cli_time < 2 * fire_time
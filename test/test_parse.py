@@ -0,0 +1,151 @@
+import glob
+import os
+
+import pytest
+from marko import Markdown
+
+from md2json import fold_level
+from proqtor.parse import (
+    UnbalancedTagError,
+    extract_code_parts,
+    extract_codeblock_content,
+    extract_test_cases,
+    extract_testcases,
+    fold_sections,
+    parse_execute_config,
+    split_tagged_template,
+)
+
+EXAMPLES = sorted(
+    glob.glob(
+        os.path.join(os.path.dirname(__file__), "../examples/**/*.md"), recursive=True
+    )
+)
+
+MARKDOWN = [
+    # Only blank lines, headings and fenced code blocks are scanned.
+    "\n# Solution\n\n```python test.py -r 'python test.py'\nprint(1)\n```\n\n\n"
+    "# Public Test Cases\n\n## Input 1\n\n```\n1\n```\n\n## Output 1 ##\n\n"
+    "~~~\n```\n~~~\n## Input 2\n\n````\n2",
+    # Sections with other markdown are rendered with marko.
+    "# Problem Statement\n\nSome *text*\n- a list\n\n\n# Solution\n\n```\nx\n```\n",
+    "# Solution\n\n    indented code\n\n# Public Test Cases\n\n## Input 1\n\n"
+    "Text\n```\n1\n```\n## Output 1\n```\n1\n```\n",
+    # An unclosed fence runs to the end of the document.
+    "# Solution\n\n```python\n# Public Test Cases\n## Input 1\n",
+    # Html blocks and setext headings can hide the headings from the scan.
+    "# Solution\n\n<div>\n# Public Test Cases\n</div>\n\n```\nx\n```\n",
+    "# Solution\n\nTitle\n===\n\n```\nx\n```\n",
+    "# Solution\n\n```\n中文abc\n```\n",
+]
+
+
+def get_markdown(path):
+    with open(path) as f:
+        return f.read().split("---", 2)[2]
+
+
+@pytest.mark.parametrize("md_string", MARKDOWN + [get_markdown(p) for p in EXAMPLES])
+def test_fold_sections_same_as_marko(md_string):
+    sections = fold_sections(md_string)
+    assert {heading: text for heading, (text, _) in sections.items()} == fold_level(
+        md_string, level=1
+    )
+    for text, blocks in sections.values():
+        code_blocks = [
+            block
+            for block in Markdown().parse(text).children
+            if block.get_type() in ("FencedCode", "CodeBlock")
+        ]
+        if code_blocks:
+            assert extract_codeblock_content(text, blocks)["code"] == (
+                code_blocks[0].children[0].children
+            )
+        assert extract_test_cases(text, blocks) == extract_testcases(
+            fold_level(text, level=2, return_type="list")
+        )
+
+
+@pytest.mark.parametrize(
+    "config_string,expected",
+    [
+        ("", {}),
+        (
+            "test.py -r 'python test.py'",
+            {"source_filename": "test.py", "run": "python test.py"},
+        ),
+        ("-rpython --time=2 -c .5", {"run": "python", "timeout": 2.0, "cpu_time": 0.5}),
+        (
+            "-b='gcc a.c' -x fork -- -a.c",
+            {"build": "gcc a.c", "executor": "fork", "source_filename": "-a.c"},
+        ),
+    ],
+)
+def test_parse_execute_config(config_string, expected):
+    config = parse_execute_config(config_string)
+    assert list(config) == [
+        "source_filename",
+        "build",
+        "run",
+        "timeout",
+        "cpu_time",
+        "memory_limit",
+        "output_limit",
+        "executor",
+    ]
+    assert {key: value for key, value in config.items() if value is not None} == (
+        expected
+    )
+
+
+@pytest.mark.parametrize(
+    "config_string", ["-t abc", "-x thread", "-r", "a.py b.py", "--unknown 1"]
+)
+def test_parse_execute_config_errors(config_string):
+    with pytest.raises(ValueError):
+        parse_execute_config(config_string)
+
+
+@pytest.mark.parametrize(
+    "tagged_template,solution,template",
+    [
+        ("a\n<sol>b\n</sol><los>c\n</los>", "a\nb\n", "a\nc\n"),
+        ("<solution>a</solution>b<los x>c</los>", "ab", "bc"),
+        ("<sol>a<los>b</los>c</sol>d", "acd", "d"),
+        ("List<Integer> <los>x</los>", "List<Integer> ", "List<Integer> x"),
+    ],
+)
+def test_split_tagged_template(tagged_template, solution, template):
+    assert split_tagged_template(tagged_template) == (solution, template)
+
+
+@pytest.mark.parametrize(
+    "tagged_template,message",
+    [
+        ("a\n</sol>", "</sol> at line 2, column 1 is not opened."),
+        (
+            "<sol>\n  a</los>",
+            "</los> at line 2, column 4 closes <sol> opened at line 1, column 1.",
+        ),
+        ("<los></los>\n<los>", "<los> opened at line 2, column 1 is not closed."),
+    ],
+)
+def test_split_tagged_template_errors(tagged_template, message):
+    with pytest.raises(UnbalancedTagError) as e:
+        split_tagged_template(tagged_template)
+    assert str(e.value) == message
+
+
+def test_extract_code_parts():
+    code = (
+        "<prefix>import sys\n</prefix><template>\n<sol>a = 1</sol>\n</template>\n"
+        "print(a)\n<suffix_invisible>\nprint(2)\n</suffix_invisible>\n"
+    )
+    assert extract_code_parts(code) == {
+        "prefix": "import sys\n",
+        "tagged_template": "\n<sol>a = 1</sol>\n",
+        "suffix": "\nprint(a)\n",
+        "suffix_invisible": "\nprint(2)",
+    }
+    with pytest.raises(UnbalancedTagError):
+        extract_code_parts("<template>\n<los>\n</template>\n")
@@ -0,0 +1,35 @@
+import json
+import os
+
+from proqtor.cache_utils import set_caching
+from proqtor.core import ProQ
+from proqtor.profile_utils import Profiler, profiler, profiling
+
+EXAMPLE = os.path.join(
+    os.path.dirname(__file__), "../examples/python/io_type_problems/sum_even_numbers.md"
+)
+
+
+def test_profiler_disabled_records_nothing():
+    profiler = Profiler()
+    with profiler.span("read"):
+        pass
+    assert profiler.pop_events() == []
+
+
+def test_profiling_writes_chrome_trace(tmp_path):
+    set_caching(False)
+    trace_file = tmp_path / "trace.json"
+    with profiling(trace_file):
+        ProQ.from_file(EXAMPLE).evaluate()
+    assert not profiler.enabled
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    spans = [event for event in events if event["ph"] == "X"]
+    names = {event["name"] for event in spans}
+    assert {"read", "fold", "render", "extract", "validate"} <= names
+    assert {"spawn", "run", "compare"} <= names
+    assert all(event["dur"] >= 0 for event in spans)
+    # Each test case runs in an asyncio task of its own with a named lane.
+    lanes = {event["tid"] for event in events if event["ph"] == "M"}
+    assert {event["tid"] for event in spans} <= lanes
+    assert len({event["tid"] for event in spans if event["name"] == "run"}) > 1
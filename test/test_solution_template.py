@@ -19,6 +19,7 @@ def get_solution_template(name):
         "with_prefix_and_suffix",
         "with_invisible_suffix",
         "with_suffix_and_invisible_suffix",
+        "with_limits",
     ),
 )
 def test_parse_render(file_name):
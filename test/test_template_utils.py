@@ -0,0 +1,36 @@
+import os
+
+from proqtor.template_utils import (
+    RelativeLoader,
+    get_relative_env,
+    recording_dependencies,
+    render_template_string,
+)
+
+
+def test_relative_env_compiles_shared_include_once(tmp_path, monkeypatch, cache_dir):
+    loaded = []
+    get_source = RelativeLoader.get_source
+
+    def counting_get_source(self, environment, template):
+        loaded.append(template)
+        return get_source(self, environment, template)
+
+    monkeypatch.setattr(RelativeLoader, "get_source", counting_get_source)
+    (tmp_path / "suffix.jinja").write_text("suffix")
+    for name in ["a.md", "b.md"]:
+        env = get_relative_env(tmp_path / name)
+        assert render_template_string(env, f"{name} {{% include 'suffix.jinja' %}}")
+    assert get_relative_env(tmp_path / "a.md") is env
+    assert loaded == ["suffix.jinja"]
+
+    # Changed includes are loaded again, along with their recorded hashes.
+    (tmp_path / "suffix.jinja").write_text("changed suffix")
+    os.utime(tmp_path / "suffix.jinja", ns=(0, 0))
+    dependencies = {}
+    with recording_dependencies(dependencies):
+        rendered = render_template_string(env, "{% include 'suffix.jinja' %}")
+    assert rendered == "changed suffix"
+    assert loaded == ["suffix.jinja"] * 2
+    assert dependencies == {"suffix.jinja": env.loader.hashes["suffix.jinja"]}
+    assert list(os.scandir(cache_dir / "templates"))
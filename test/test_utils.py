@@ -0,0 +1,37 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from proqtor.utils import bounded_imap_unordered
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Records the most futures submitted and not yet yielded at any time."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.n_submitted = 0
+        self.n_yielded = 0
+        self.max_outstanding = 0
+
+    def submit(self, *args, **kwargs):
+        self.n_submitted += 1
+        self.max_outstanding = max(
+            self.max_outstanding, self.n_submitted - self.n_yielded
+        )
+        return super().submit(*args, **kwargs)
+
+
+def test_bounded_imap_unordered_bounds_pending_futures():
+    def slow_square(n):
+        time.sleep(0.001 * (n % 3))
+        return n * n
+
+    with CountingExecutor(max_workers=4) as executor:
+        results = []
+        for result in bounded_imap_unordered(
+            executor, slow_square, range(50), max_pending=3
+        ):
+            executor.n_yielded += 1
+            results.append(result)
+    assert sorted(results) == [n * n for n in range(50)]
+    assert executor.max_outstanding == 3
@@ -0,0 +1,32 @@
+import os
+import shutil
+
+from proqtor.cli.watch import ProqWatcher
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), "../examples/python")
+
+
+def test_watch_evaluates_changed_proqs(tmp_path, monkeypatch):
+    shutil.copytree(EXAMPLES_DIR, tmp_path / "python")
+    proqs_dir = tmp_path / "python/function_type_problems"
+    watcher = ProqWatcher([proqs_dir])
+    evaluated = []
+    evaluate = watcher.evaluate
+
+    def recording_evaluate(proq_file):
+        evaluated.append(os.path.basename(proq_file))
+        evaluate(proq_file)
+
+    monkeypatch.setattr(watcher, "evaluate", recording_evaluate)
+    assert watcher.evaluate_changed()
+    assert sorted(evaluated) == sorted(os.listdir(proqs_dir))
+    assert all(watcher.checks.values())
+    evaluated.clear()
+    assert not watcher.evaluate_changed()
+
+    include = tmp_path / "python/function_type_and_modify_check_suffix.py.jinja"
+    include.write_text(include.read_text() + "\n")
+    (proqs_dir / "check_two_digit_even.md").unlink()
+    assert watcher.evaluate_changed()
+    assert sorted(evaluated) == ["delete_first_three.md", "sum_of_squares_of_keys.md"]
+    assert len(watcher.checks) == len(os.listdir(proqs_dir))
@@ -0,0 +1,60 @@
+import os
+import sys
+
+from proqtor.cache_utils import result_cache
+from proqtor.core_components import TestCase as ProqTestCase
+from proqtor.evaluate_utils import get_test_case_results
+from proqtor.workspace_utils import WorkspacePool
+
+
+def test_workspace_pool_reuses_cleared_workspaces(tmp_path):
+    pool = WorkspacePool(root=tmp_path)
+    with pool.workspace() as workspace:
+        (workspace / "file").write_text("x")
+        (workspace / "dir").mkdir()
+        (workspace / "dir" / "file").write_text("x")
+    with pool.workspace() as reused:
+        assert reused == workspace
+        assert not any(reused.iterdir())
+        with pool.workspace() as other:
+            assert other != reused
+
+
+def test_workspace_pool_removes_stale_pool_dirs(tmp_path):
+    stale = tmp_path / f"proqtor-{os.getuid()}" / "999999999"
+    stale.mkdir(parents=True)
+    pool = WorkspacePool(root=tmp_path)
+    with pool.workspace() as workspace:
+        assert workspace.parent.name == str(os.getpid())
+    assert not stale.exists()
+
+
+def test_cached_build_artifacts_not_changed_by_runs(tmp_path, monkeypatch):
+    # The workspaces are on the same file system as the cache.
+    monkeypatch.setattr(
+        "proqtor.evaluate_utils.workspace_pool", WorkspacePool(root=tmp_path)
+    )
+    code = (
+        "import os, sys\n"
+        "if sys.argv[1:] == ['build']:\n"
+        "    with open('data.txt', 'w') as f:\n"
+        "        f.write('built')\n"
+        "else:\n"
+        "    print(open('data.txt').read())\n"
+        "    os.chmod('data.txt', 0o644)\n"
+        "    with open('data.txt', 'w') as f:\n"
+        "        f.write('changed')\n"
+    )
+    test_cases = [ProqTestCase(input="", output="built\n")]
+    args = (
+        code,
+        test_cases,
+        "test.py",
+        f"{sys.executable} test.py",
+        f"{sys.executable} test.py build",
+    )
+    # Built in the workspace and then restored from the build cache twice,
+    # after runs which changed the restored files.
+    for _ in range(3):
+        assert get_test_case_results(*args)[0].passed
+        result_cache.clear()